@@ -0,0 +1,70 @@
+"""
+Статичні ресурси сайту: мінімізація власних CSS/JS під час collectstatic та
+підрахунок вбудованого (inline) коду в шаблонах для системної перевірки.
+
+Мінімізація навмисно консервативна і не потребує сторонніх пакетів: у CSS
+прибираються коментарі та зайві пробіли (рядки в лапках і url() лишаються
+як є), у JS — відступи, порожні рядки та
+рядки-коментарі (переноси рядків зберігаються, тож автоматична вставка крапок
+з комою не ламається). Багаторядкові шаблонні рядки в JS не підтримуються.
+"""
+import re
+
+# Мінімізуються лише власні ресурси; сторонні (admin, tailwind) вже зібрані
+MINIFY_PREFIXES = ("home/",)
+
+# Коментарі, рядки в лапках та url() без лапок: вміст рядків і url() не змінюється,
+# а "/*" у рядку чи лапка в коментарі не плутають розбір
+_CSS_PRESERVED_RE = re.compile(
+    r"""/\*.*?\*/|"(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'|\burl\(\s*[^\s"')][^)]*\)""", re.S | re.I,
+)
+_CSS_SPACE_RE = re.compile(r"\s+")
+_CSS_PUNCTUATION_RE = re.compile(r"\s*([{};,>])\s*")
+
+# <style> та <script> без src разом із вмістом; HTML-коментарі не рахуються
+_HTML_COMMENT_RE = re.compile(r"<!--.*?-->", re.S)
+_INLINE_ASSET_RE = re.compile(
+    r"<(style|script)\b(?![^>]*\bsrc=)[^>]*>(.*?)</\1\s*>", re.S | re.I,
+)
+
+
+def minify_css(source):
+    parts, code, position = [], [], 0
+    for match in _CSS_PRESERVED_RE.finditer(source):
+        code.append(source[position:match.start()])
+        position = match.end()
+        if not match.group().startswith("/*"):
+            parts += [_minify_css_code("".join(code)), match.group()]
+            code = []
+    code.append(source[position:])
+    parts.append(_minify_css_code("".join(code)))
+    return "".join(parts).strip() + "\n"
+
+
+def _minify_css_code(source):
+    """Мінімізує CSS між рядками в лапках і url() (коментарі вже вирізані)."""
+    source = _CSS_SPACE_RE.sub(" ", source)
+    source = _CSS_PUNCTUATION_RE.sub(r"\1", source)
+    return source.replace(": ", ":").replace(";}", "}")
+
+
+def minify_js(source):
+    lines = (line.strip() for line in source.splitlines())
+    return "\n".join(line for line in lines if line and not line.startswith("//")) + "\n"
+
+
+def minify_asset(name, source):
+    """Мінімізований вміст ресурсу name або None, якщо його не треба мінімізувати."""
+    if not name.startswith(MINIFY_PREFIXES):
+        return None
+    if name.endswith(".css"):
+        return minify_css(source)
+    if name.endswith(".js"):
+        return minify_js(source)
+    return None
+
+
+def inline_asset_size(template_source):
+    """Скільки байтів CSS/JS вбудовано в шаблон тегами <style> та <script> без src."""
+    source = _HTML_COMMENT_RE.sub("", template_source)
+    return sum(len(match.group(2).strip().encode()) for match in _INLINE_ASSET_RE.finditer(source))
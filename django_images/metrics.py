@@ -0,0 +1,395 @@
+"""
+Метрики запитів у форматі Prometheus та заголовок Server-Timing.
+
+MetricsMiddleware для кожного запиту збирає:
+
+* тривалість обробки (гістограма за view та методом) і кількість відповідей за статусом;
+* кількість і сумарний час SQL-запитів (обгортка execute_wrappers на кожному з'єднанні);
+* час рендерингу шаблонів (бекенд InstrumentedDjangoTemplates);
+* час викликів сховища (декоратор instrument("storage") на методах home.storage).
+
+Кожен процес Gunicorn тримає метрики в пам'яті і не частіше ніж раз на
+METRICS_FLUSH_INTERVAL секунд записує їх у METRICS_DIR/<pid>.json. Ендпоінт
+/metrics підсумовує файли всіх процесів, тож значення не залежать від того,
+який воркер обслужив запит. Файли завершених воркерів (max_requests) зливаються
+в archive.json, щоб лічильники залишались монотонними. run.py очищає METRICS_DIR
+під час старту сервера.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+try:
+    import fcntl
+except ImportError:  # Windows: лише для локальної розробки з одним процесом
+    fcntl = None
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+from django.template.backends.django import DjangoTemplates
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    "django_http_request_duration_seconds": ("histogram", "Час обробки запиту за view."),
+    "django_http_responses_total": ("counter", "Кількість відповідей за view та статусом."),
+    "django_db_queries_total": ("counter", "Кількість SQL-запитів за view."),
+    "django_db_query_duration_seconds_total": ("counter", "Сумарний час SQL-запитів за view."),
+    "django_template_render_seconds_total": ("counter", "Сумарний час рендерингу шаблонів за view."),
+    "django_storage_call_duration_seconds": ("histogram", "Час викликів сховища зображень за операцією."),
+}
+
+ARCHIVE_FILE = "archive.json"
+
+
+class Registry:
+    """Лічильники та гістограми одного процесу; ключ — (назва метрики, мітки)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = defaultdict(float)
+        # [лічильники за кошиками..., сума, кількість]
+        self.histograms = {}
+        self.last_flush = 0.0
+
+    def inc(self, name, labels, value=1.0):
+        with self.lock:
+            self.counters[(name, tuple(sorted(labels.items())))] += value
+
+    def observe(self, name, labels, value):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.setdefault(key, [0] * (len(LATENCY_BUCKETS) + 2))
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    histogram[index] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def clear(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "counters": [[name, dict(labels), value] for (name, labels), value in self.counters.items()],
+                "histograms": [[name, dict(labels), list(values)] for (name, labels), values in self.histograms.items()],
+            }
+
+
+registry = Registry()
+
+
+class RequestMetrics:
+    """Час по категоріях (db, template, storage) у межах одного запиту."""
+
+    def __init__(self):
+        self.durations = defaultdict(float)
+        self.counts = defaultdict(int)
+        self.active = set()
+
+
+_current = ContextVar("request_metrics", default=None)
+
+
+@contextmanager
+def timed(category, operation=None):
+    """
+    Вимірює блок коду. Вкладені виміри тієї ж категорії (шаблон, що рендерить
+    інший шаблон) не рахуються двічі.
+    """
+    current = _current.get()
+    if current is not None and category in current.active:
+        yield
+        return
+    if current is not None:
+        current.active.add(category)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        if current is not None:
+            current.active.discard(category)
+            current.durations[category] += elapsed
+            current.counts[category] += 1
+        if operation:
+            registry.observe(f"django_{category}_call_duration_seconds", {"operation": operation}, elapsed)
+
+
+def instrument(category):
+    """Декоратор для методів, час яких потрібно враховувати (наприклад, виклики Cloudinary)."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(category, func.__name__):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_query(execute, sql, params, many, context):
+    current = _current.get()
+    if current is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        current.durations["db"] += time.perf_counter() - start
+        current.counts["db"] += 1
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    # Обгортка лишається на з'єднанні весь його час життя (зокрема з CONN_MAX_AGE);
+    # поза запитом вона нічого не робить
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(install_query_recorder)
+
+
+class InstrumentedTemplate:
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        with timed("template"):
+            return self.template.render(context, request)
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """Бекенд шаблонів Django, що враховує час рендерингу в метриках запиту."""
+
+    def from_string(self, template_code):
+        return InstrumentedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return InstrumentedTemplate(super().get_template(template_name))
+
+
+def view_label(request):
+    match = getattr(request, "resolver_match", None)
+    return match.view_name if match else "<unresolved>"
+
+
+def server_timing(current, total):
+    parts = [
+        f'db;dur={current.durations["db"] * 1000:.1f};desc="{current.counts["db"]} queries"',
+        f"tpl;dur={current.durations['template'] * 1000:.1f}",
+        f"storage;dur={current.durations['storage'] * 1000:.1f}",
+        f"total;dur={total * 1000:.1f}",
+    ]
+    return ", ".join(parts)
+
+
+class MetricsMiddleware:
+    """Має стояти першим у MIDDLEWARE, щоб вимірювати повний час обробки."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        current, token, start = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, current, start)
+
+    async def __acall__(self, request):
+        current, token, start = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, current, start)
+
+    def start(self):
+        current = RequestMetrics()
+        return current, _current.set(current), time.perf_counter()
+
+    def finish(self, request, response, current, start):
+        total = time.perf_counter() - start
+        labels = {"view": view_label(request), "method": request.method}
+        registry.observe("django_http_request_duration_seconds", labels, total)
+        registry.inc("django_http_responses_total", {**labels, "status": str(response.status_code)})
+        view = {"view": labels["view"]}
+        registry.inc("django_db_queries_total", view, current.counts["db"])
+        registry.inc("django_db_query_duration_seconds_total", view, current.durations["db"])
+        registry.inc("django_template_render_seconds_total", view, current.durations["template"])
+
+        if settings.SERVER_TIMING:
+            response["Server-Timing"] = server_timing(current, total)
+        flush()
+        return response
+
+
+def flush(force=False):
+    """Записує метрики процесу у METRICS_DIR/<pid>.json (атомарно, через os.replace)."""
+    now = time.monotonic()
+    if not force and now - registry.last_flush < settings.METRICS_FLUSH_INTERVAL:
+        return
+    registry.last_flush = now
+    try:
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        path = os.path.join(settings.METRICS_DIR, f"{os.getpid()}.json")
+        temporary = f"{path}.{threading.get_ident()}.tmp"
+        with open(temporary, "w") as output:
+            json.dump(registry.snapshot(), output)
+        os.replace(temporary, path)
+    except OSError:
+        logger.exception("Не вдалося записати метрики у %s", settings.METRICS_DIR)
+
+
+def merge(total, snapshot):
+    for name, labels, value in snapshot["counters"]:
+        key = (name, tuple(sorted(labels.items())))
+        total["counters"][key] = total["counters"].get(key, 0) + value
+    for name, labels, values in snapshot["histograms"]:
+        key = (name, tuple(sorted(labels.items())))
+        current = total["histograms"].setdefault(key, [0] * len(values))
+        for index, value in enumerate(values):
+            current[index] += value
+
+
+def _read(path):
+    try:
+        with open(path) as source:
+            return json.load(source)
+    except (OSError, ValueError):
+        return None
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+@contextmanager
+def _directory_lock(directory):
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(directory, ".lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def collect():
+    """Підсумовує метрики всіх процесів; файли завершених процесів переносить в архів."""
+    flush(force=True)
+    directory = settings.METRICS_DIR
+    archive_path = os.path.join(directory, ARCHIVE_FILE)
+    total = {"counters": {}, "histograms": {}}
+
+    # Блокування не дає двом одночасним /metrics злити той самий файл в архів двічі
+    with _directory_lock(directory):
+        archive = {"counters": {}, "histograms": {}}
+        previous = _read(archive_path)
+        if previous:
+            merge(total, previous)
+            merge(archive, previous)
+
+        archived = []
+        for name in os.listdir(directory):
+            stem, extension = os.path.splitext(name)
+            if extension != ".json" or not stem.isdigit():
+                continue
+            snapshot = _read(os.path.join(directory, name))
+            if snapshot is None:
+                continue
+            merge(total, snapshot)
+            if not _pid_alive(int(stem)):
+                merge(archive, snapshot)
+                archived.append(name)
+
+        if archived:
+            temporary = f"{archive_path}.tmp"
+            with open(temporary, "w") as output:
+                json.dump(_serializable(archive), output)
+            os.replace(temporary, archive_path)
+            for name in archived:
+                os.remove(os.path.join(directory, name))
+    return total
+
+
+def _serializable(merged):
+    return {
+        "counters": [[name, dict(labels), value] for (name, labels), value in merged["counters"].items()],
+        "histograms": [[name, dict(labels), values] for (name, labels), values in merged["histograms"].items()],
+    }
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def render_prometheus(merged):
+    lines = []
+    families = defaultdict(list)
+    for (name, labels), value in merged["counters"].items():
+        families[name].append((labels, value))
+    for (name, labels), values in merged["histograms"].items():
+        families[name].append((labels, values))
+
+    for name in sorted(families):
+        kind, help_text = HELP.get(name, ("untyped", ""))
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in sorted(families[name]):
+            if kind != "histogram":
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+                continue
+            # Кошики зберігаються вже накопичувальними (value <= bound)
+            for bound, count in zip(LATENCY_BUCKETS, value):
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', str(bound)),))} {count}")
+            lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {value[-1]}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {value[-2]}")
+            lines.append(f"{name}_count{_format_labels(labels)} {value[-1]}")
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view(request):
+    """Метрики всіх воркерів у текстовому форматі Prometheus."""
+    token = settings.METRICS_TOKEN
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        return HttpResponseForbidden()
+    return HttpResponse(render_prometheus(collect()), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -19,8 +19,11 @@ from django.contrib import admin
 from django.urls import include, path
 from django.conf import settings
 
+from .metrics import metrics_view
+
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("metrics", metrics_view, name="metrics"),
     path("__reload__/", include("django_browser_reload.urls")),
     path("", include("home.urls")),
 ]
@@ -1,10 +1,37 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from .deletion import delete_images
+from .exports import export_response
 from .models import *
 
 
 # Register your models here.
 class ImageAdmin(admin.ModelAdmin):
-    list_display = ["title", "image", "uploaded_at"]
+    list_display = ["title", "image", "status", "owner", "duplicate_of", "created_at"]
+    list_filter = ["status", ("duplicate_of", admin.EmptyFieldListFilter)]
+    list_select_related = ["owner", "duplicate_of"]
+    raw_id_fields = ["duplicate_of"]
+    search_fields = ["title"]
+    # Перегляд за датами працює через індекс created_at
+    date_hierarchy = "created_at"
+    actions = ["export_zip"]
+
+    @admin.action(description="Експортувати вибрані у ZIP")
+    def export_zip(self, request, queryset):
+        return export_response(request, queryset.ready())
+
+    # Видалення з адмінки (і дія "Видалити вибрані") прибирає також файли у сховищі
+    def delete_model(self, request, obj):
+        self.delete_queryset(request, [obj])
+
+    def delete_queryset(self, request, queryset):
+        _, failures = delete_images(queryset)
+        if failures:
+            self.message_user(
+                request,
+                f"Не вдалося видалити зі сховища {len(failures)} файл(ів), ці зображення залишено: "
+                + ", ".join(str(image.pk) for image, _ in failures),
+                messages.WARNING,
+            )
 
 
 admin.site.register(Image, ImageAdmin)
@@ -0,0 +1,188 @@
+"""
+JSON API галереї для клієнтського рендерингу та зовнішніх споживачів.
+
+* GET /api/images/ — список готових зображень з keyset-пагінацією (?before=<id>,
+  ?limit=N); курсор наступної сторінки повертається в полі next_cursor.
+* GET /api/images/<id>/ — одне зображення.
+* ?fields=id,title,renditions — лише потрібні поля; з бази вибираються лише
+  стовпці, потрібні для цих полів (QuerySet.only).
+
+URL рендишенів обчислюються на сервері, тож клієнту не треба знати про сховище.
+Відповіді не залежать від користувача: список кешується для всіх за версією
+галереї, а ETag дає 304 без серіалізації. Серіалізація — orjson, якщо він
+встановлений, інакше стандартний json.
+"""
+import hashlib
+import json
+
+try:
+    import orjson
+except ImportError:  # необов'язкова залежність: без неї просто повільніше
+    orjson = None
+
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.urls import reverse
+from django.views.decorators.http import condition, require_safe
+
+from .cache import cached_response, gallery_version, page_cache_key
+from .conditional import cache_control_for, gallery_state, get_ready_image
+from .models import Image
+from .pagination import parse_cursor
+from .storage import FORMAT_MIME_TYPES, get_image_storage
+
+# Найбільший розмір сторінки, який може запросити клієнт
+API_MAX_PAGE_SIZE = 100
+
+
+def _renditions(image, storage):
+    return [
+        {"width": rendition["width"], "format": rendition["format"],
+         "type": FORMAT_MIME_TYPES[rendition["format"]],
+         "url": storage.image_url(image.image, width=rendition["width"], format=rendition["format"])}
+        for rendition in sorted(image.renditions, key=lambda r: (r["format"], r["width"]))
+    ]
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+# Поле відповіді: (стовпці моделі, які воно читає, функція (image, storage) -> значення)
+API_FIELDS = {
+    "id": ((), lambda image, storage: image.id),
+    "title": (("title",), lambda image, storage: image.title),
+    "url": (("image",), lambda image, storage: storage.image_url(image.image)),
+    "renditions": (("image", "renditions"), _renditions),
+    "width": (("width",), lambda image, storage: image.width),
+    "height": (("height",), lambda image, storage: image.height),
+    "bytes": (("bytes",), lambda image, storage: image.bytes),
+    "format": (("format",), lambda image, storage: image.format),
+    "dominant_color": (("dominant_color",), lambda image, storage: image.dominant_color or None),
+    "placeholder": (("placeholder",), lambda image, storage: image.placeholder or None),
+    "duplicate_of": (("duplicate_of",), lambda image, storage: image.duplicate_of_id),
+    "created_at": (("created_at",), lambda image, storage: _isoformat(image.created_at)),
+    "uploaded_at": (("uploaded_at",), lambda image, storage: _isoformat(image.uploaded_at)),
+    "download_url": ((), lambda image, storage: reverse("download_image", args=[image.id])),
+}
+
+# Поля за замовчуванням: усе, крім плейсхолдера (data URI — найбільша частина відповіді)
+DEFAULT_API_FIELDS = tuple(name for name in API_FIELDS if name != "placeholder")
+
+
+class FieldsError(ValueError):
+    pass
+
+
+def parse_fields(value):
+    """Список полів з ?fields=a,b (у порядку API_FIELDS); FieldsError для невідомих."""
+    if not value:
+        return DEFAULT_API_FIELDS
+    requested = {name.strip() for name in value.split(",") if name.strip()}
+    unknown = requested - API_FIELDS.keys()
+    if unknown:
+        raise FieldsError(f"Невідомі поля: {', '.join(sorted(unknown))}.")
+    return tuple(name for name in API_FIELDS if name in requested)
+
+
+def parse_limit(value):
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        return settings.GALLERY_PAGE_SIZE
+    return min(max(limit, 1), API_MAX_PAGE_SIZE)
+
+
+def columns_for(fields):
+    # id потрібен завжди (курсор), uploaded_at — для ETag окремого зображення
+    return {"id", "uploaded_at"}.union(*(API_FIELDS[name][0] for name in fields))
+
+
+def serialize(image, fields, storage):
+    return {name: API_FIELDS[name][1](image, storage) for name in fields}
+
+
+def json_response(data, status=200):
+    if orjson is not None:
+        return HttpResponse(orjson.dumps(data), status=status, content_type="application/json")
+    return HttpResponse(json.dumps(data, ensure_ascii=False, separators=(",", ":")), status=status,
+                        content_type="application/json")
+
+
+def _fields_or_none(request):
+    try:
+        return parse_fields(request.GET.get("fields"))
+    except FieldsError:
+        return None
+
+
+def list_etag(request):
+    fields = _fields_or_none(request)
+    if fields is None:
+        return None
+    state = gallery_state(request)
+    last_modified = state["last_modified"].timestamp() if state["last_modified"] else 0
+    parts = [settings.GALLERY_ETAG_VERSION, "api", gallery_version(), state["count"], state["max_id"], last_modified,
+             parse_cursor(request.GET.get("before")) or 0, parse_limit(request.GET.get("limit")), *fields]
+    return hashlib.md5(":".join(map(str, parts)).encode()).hexdigest()
+
+
+def list_last_modified(request):
+    return gallery_state(request)["last_modified"]
+
+
+@require_safe
+@cache_control_for("api")
+@condition(etag_func=list_etag, last_modified_func=list_last_modified)
+def image_list(request):
+    try:
+        fields = parse_fields(request.GET.get("fields"))
+    except FieldsError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+    cursor = parse_cursor(request.GET.get("before"))
+    limit = parse_limit(request.GET.get("limit"))
+
+    def build_response():
+        queryset = Image.objects.ready().only(*columns_for(fields)).order_by("-id")
+        if cursor is not None:
+            queryset = queryset.filter(id__lt=cursor)
+        # Як у keyset_page: зайвий запис показує, чи є наступна сторінка
+        images = list(queryset[:limit + 1])
+        next_cursor = images[limit - 1].id if len(images) > limit else None
+        storage = get_image_storage()
+        return json_response({
+            "results": [serialize(image, fields, storage) for image in images[:limit]],
+            "next_cursor": next_cursor,
+        })
+
+    # Відповідь однакова для всіх користувачів, тож кешується без перевірки сесії
+    return cached_response(page_cache_key("api", cursor, f"{limit}:{','.join(fields)}"), build_response)
+
+
+def detail_etag(request, image_id):
+    fields = _fields_or_none(request)
+    image = get_ready_image(request, image_id)
+    if fields is None or image is None:
+        return None
+    parts = [settings.GALLERY_ETAG_VERSION, "api", gallery_version(), image.image.get_prep_value(),
+             image.uploaded_at.timestamp(), *fields]
+    return hashlib.md5(":".join(map(str, parts)).encode()).hexdigest()
+
+
+def detail_last_modified(request, image_id):
+    image = get_ready_image(request, image_id)
+    return image.uploaded_at if image else None
+
+
+@require_safe
+@cache_control_for("api")
+@condition(etag_func=detail_etag, last_modified_func=detail_last_modified)
+def image_detail(request, image_id):
+    try:
+        fields = parse_fields(request.GET.get("fields"))
+    except FieldsError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+    image = get_ready_image(request, image_id)
+    if image is None:
+        return JsonResponse({"error": "Зображення не знайдено."}, status=404)
+    return json_response(serialize(image, fields, get_image_storage()))
@@ -0,0 +1,129 @@
+"""
+Асинхронні версії найнавантаженіших view для запуску під ASGI (run.py --asgi).
+
+Під WSGI кожен повільний клієнт чи мережевий виклик Cloudinary тримає цілий
+воркер; тут вони лише очікують у циклі подій. Робота з базою та шаблонами
+виконується через sync_to_async у спільному потоці (thread_sensitive=True),
+а блокуючий мережевий і дисковий ввід-вивід сховища — у пулі потоків
+(thread_sensitive=False), щоб не чекати в черзі до потоку бази.
+
+Маршрути перемикаються на ці view в home/urls.py, коли settings.ASYNC_VIEWS увімкнено
+(django_images/asgi.py робить це автоматично).
+"""
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.http import Http404
+from django.shortcuts import aget_object_or_404, redirect, render
+from django.utils.cache import get_conditional_response
+
+from .conditional import acondition, cache_control_for, gallery_last_modified
+from .deletion import delete_images
+from .downloads import file_download_response, image_etag
+from .models import Image
+from .storage import get_image_storage
+from .uploads import enqueue_spooled, spool_upload
+from .views import download_filename, index_etag, index_response
+
+logger = logging.getLogger(__name__)
+
+
+# Шаблони звертаються до request.user та сесії, тож рендеримо в потоці бази
+arender = sync_to_async(render)
+
+
+def offload(func):
+    """Виконує блокуючий виклик сховища в пулі потоків, не займаючи потік бази."""
+    return sync_to_async(func, thread_sensitive=False)
+
+
+@cache_control_for("index")
+@acondition(etag_func=index_etag, last_modified_func=gallery_last_modified)
+async def index(request):
+    return await sync_to_async(index_response)(request)
+
+
+async def upload(request):
+    if request.method != "POST":
+        return await arender(request, "upload.html")
+
+    # Розбір multipart може записувати великі файли у тимчасові файли на диску
+    files = await offload(lambda: request.FILES)()
+    image_file = files.get("image")
+    if not image_file:
+        messages.error(request, "No image file provided.")
+        return await arender(request, "upload.html")
+
+    logger.debug("Upload received: %s (%d bytes)", image_file.name, image_file.size)
+    user = await request.auser()
+    spool_path, sha256 = await offload(spool_upload)(image_file)
+    image = await sync_to_async(enqueue_spooled)(
+        request.POST.get("title"), spool_path, image_file.name, user if user.is_authenticated else None, sha256,
+    )
+    if image.deduplicated:
+        messages.info(request, "Таке зображення вже є в галереї.")
+    elif image.status == Image.Status.READY:
+        messages.success(request, "Uploaded Successfully!")
+    else:
+        messages.info(request, "Зображення прийнято, воно з'явиться в галереї після обробки.")
+    return redirect("index")
+
+
+@login_required
+async def delete_image(request, image_id):
+    image_instance = await aget_object_or_404(Image, id=image_id)
+
+    user = await request.auser()
+    if not user.is_superuser:
+        messages.error(request, "У вас немає дозволу на видалення цього зображення.")
+        return redirect("index")
+
+    try:
+        # Як у синхронному view: рядок лишається, якщо сховище не підтвердило видалення
+        _, failures = await sync_to_async(delete_images)([image_instance])
+    except Exception as e:
+        messages.error(request, f"Виникла непередбачена помилка: {e}")
+    else:
+        if failures:
+            messages.error(request, f"Не вдалося видалити файл зі сховища, зображення залишено: {failures[0][1]}")
+        else:
+            messages.success(request, "Зображення видалено.")
+
+    return redirect("index")
+
+
+@cache_control_for("download_image")
+async def download_image(request, image_id):
+    image_obj = await aget_object_or_404(Image.objects.ready(), id=image_id)
+    storage = get_image_storage()
+    client_filename = download_filename(request, image_obj)
+
+    if settings.IMAGE_DOWNLOAD_MODE == "redirect":
+        # Підписаний URL будується локально, без мережевого запиту
+        cdn_url = storage.download_url(image_obj.image, client_filename)
+        if cdn_url:
+            return redirect(cdn_url)
+
+    etag = image_etag(image_obj)
+    conditional = get_conditional_response(request, etag=etag, last_modified=int(image_obj.uploaded_at.timestamp()))
+    if conditional is not None:
+        return conditional
+
+    try:
+        size = image_obj.bytes or await offload(storage.original_size)(image_obj.image)
+        # Відкриття потоку (HTTP-запит до Cloudinary чи файл на диску) — теж у пулі потоків,
+        # а тіло віддається асинхронним ітератором шматками
+        return await offload(file_download_response)(
+            request,
+            lambda offset: storage.open_original(image_obj.image, offset),
+            size=size,
+            filename=client_filename,
+            etag=etag,
+            last_modified=image_obj.uploaded_at,
+            asynchronous=True,
+        )
+    except FileNotFoundError:
+        raise Http404("Файл не знайдено.")
@@ -0,0 +1,94 @@
+"""
+Кешування галереї через фреймворк кешу Django.
+
+* Кожна картка зображення кешується окремо; ключ містить id та uploaded_at,
+  тож змінена картка автоматично отримує новий ключ.
+* Зібрана сторінка (та фрагменти нескінченної прокрутки) кешується для анонімних
+  відвідувачів за ключем з лічильником версії галереї. Сигнали моделі Image
+  змінюють версію після кожного збереження чи видалення — старі сторінки просто
+  перестають запитуватися і витісняються з кешу за таймаутом.
+"""
+import time
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+
+GALLERY_VERSION_KEY = "gallery:version"
+
+
+def gallery_version():
+    version = cache.get(GALLERY_VERSION_KEY)
+    if version is None:
+        # add() не перезапише значення, якщо інший процес встиг раніше
+        cache.add(GALLERY_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(GALLERY_VERSION_KEY)
+    return version
+
+
+def bump_gallery_version():
+    # Нове унікальне значення замість incr(): не залежить від атомарності бекенду
+    # і не може випадково збігтися з версією, що вже була витіснена з кешу
+    cache.set(GALLERY_VERSION_KEY, time.time_ns(), None)
+
+
+def page_cache_key(kind, cursor, variant):
+    return f"gallery:{kind}:{gallery_version()}:{cursor or 0}:{variant}"
+
+
+def card_cache_key(image, is_superuser):
+    # Версія розмітки: після деплою зі зміненим шаблоном картки перерендерюються
+    return (f"gallery:card:{settings.GALLERY_ETAG_VERSION}:{image.pk}:"
+            f"{image.uploaded_at.timestamp()}:{int(is_superuser)}")
+
+
+def invalidate_image(image):
+    """Прибирає з кешу картки зображення та інвалідовує всі зібрані сторінки."""
+    cache.delete_many([card_cache_key(image, is_superuser) for is_superuser in (False, True)])
+    bump_gallery_version()
+
+
+def can_cache_page(request):
+    """
+    Сторінку можна віддати з кешу лише анонімному відвідувачу без
+    непоказаних повідомлень (len() не позначає повідомлення прочитаними).
+    """
+    return not request.user.is_authenticated and not len(messages.get_messages(request))
+
+
+def cached_response(cache_key, build_response):
+    """Повертає відповідь з кешу або будує її і зберігає тіло разом із заголовками view."""
+    cached = cache.get(cache_key)
+    if cached is not None:
+        content, headers = cached
+        return HttpResponse(content, headers=headers)
+
+    response = build_response()
+    if response.status_code == 200:
+        cache.set(cache_key, (response.content, dict(response.items())), settings.GALLERY_CACHE_TIMEOUT)
+    return response
+
+
+def render_cards(images, request):
+    """
+    Повертає HTML карток, беручи готові фрагменти з кешу одним get_many
+    і рендерячи лише відсутні.
+    """
+    is_superuser = request.user.is_superuser
+    keys = [card_cache_key(image, is_superuser) for image in images]
+    cached = cache.get_many(keys)
+
+    missing = {}
+    cards = []
+    for image, key in zip(images, keys):
+        html = cached.get(key)
+        if html is None:
+            html = render_to_string("partials/image_card.html", {"img": image}, request=request)
+            missing[key] = html
+        cards.append(html)
+
+    if missing:
+        cache.set_many(missing, settings.GALLERY_CACHE_TIMEOUT)
+    return "".join(cards)
@@ -0,0 +1,38 @@
+"""
+Системні перевірки застосунку (manage.py check, запуск тестів і сервера).
+"""
+from pathlib import Path
+
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+from django.template.utils import get_app_template_dirs
+
+from django_images.assets import inline_asset_size
+
+
+def project_template_dirs():
+    """Каталоги шаблонів проєкту та його застосунків (сторонні пакети не перевіряються)."""
+    base_dir = Path(settings.BASE_DIR).resolve()
+    directories = [Path(directory) for config in settings.TEMPLATES for directory in config.get("DIRS", [])]
+    directories += [Path(directory) for directory in get_app_template_dirs("templates")]
+    return [directory for directory in directories if directory.resolve().is_relative_to(base_dir)]
+
+
+@register(Tags.templates)
+def check_inline_assets(app_configs, **kwargs):
+    """
+    Вбудовані <style>/<script> передаються заново з кожною сторінкою і не кешуються
+    браузером; усе, що більше INLINE_ASSET_BUDGET байтів, має бути у статичних файлах.
+    """
+    errors = []
+    for directory in project_template_dirs():
+        for path in sorted(directory.rglob("*.html")):
+            size = inline_asset_size(path.read_text(encoding="utf-8"))
+            if size > settings.INLINE_ASSET_BUDGET:
+                errors.append(Error(
+                    f"Шаблон вбудовує {size} байтів CSS/JS (ліміт INLINE_ASSET_BUDGET={settings.INLINE_ASSET_BUDGET}).",
+                    hint="Перенесіть стилі та скрипти у home/static/home/ і підключіть через {% static %}.",
+                    obj=str(path),
+                    id="home.E001",
+                ))
+    return errors
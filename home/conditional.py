@@ -0,0 +1,140 @@
+"""
+Умовні GET-запити (ETag / Last-Modified / 304 Not Modified) та Cache-Control.
+
+Стан галереї визначається одним агрегатним запитом (кількість, максимальний id
+та останній uploaded_at готових зображень) та версією галереї в кеші; з них
+будується сильний ETag, тож для незміненої сторінки відповідь 304 повертається
+без рендерингу шаблону. Версія потрібна для змін, що не зсувають агрегат
+(backfill_image_metadata, find_duplicates --mark пишуть повз uploaded_at).
+"""
+import hashlib
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .cache import gallery_version
+from .models import Image
+
+
+def gallery_state(request):
+    """Агрегат стану галереї; обчислюється один раз на запит."""
+    if not hasattr(request, "_gallery_state"):
+        request._gallery_state = Image.objects.ready().aggregate(
+            count=Count("id"), max_id=Max("id"), last_modified=Max("uploaded_at"),
+        )
+    return request._gallery_state
+
+
+def has_pending_messages(request):
+    # len() не позначає повідомлення прочитаними
+    return bool(len(messages.get_messages(request)))
+
+
+def gallery_etag(request, *variant):
+    """
+    ETag сторінки галереї. Враховує користувача (кнопки видалення, навігація)
+    та варіант сторінки (наприклад, desktop/mobile). None — якщо є непоказані
+    повідомлення: таку сторінку треба віддати повністю.
+    """
+    if has_pending_messages(request):
+        return None
+    state = gallery_state(request)
+    last_modified = state["last_modified"].timestamp() if state["last_modified"] else 0
+    user = request.user
+    parts = [settings.GALLERY_ETAG_VERSION, gallery_version(), state["count"], state["max_id"], last_modified,
+             user.pk or 0, int(user.is_superuser), *variant]
+    return hashlib.md5(":".join(map(str, parts)).encode()).hexdigest()
+
+
+def gallery_last_modified(request, *args, **kwargs):
+    # Для авторизованих сторінка персональна, тож покладаємося лише на ETag
+    if request.user.is_authenticated or has_pending_messages(request):
+        return None
+    return gallery_state(request)["last_modified"]
+
+
+def get_ready_image(request, image_id):
+    """Зображення для view з умовною обробкою; запит до бази — один на весь запит."""
+    cache = request.__dict__.setdefault("_ready_images", {})
+    if image_id not in cache:
+        cache[image_id] = Image.objects.ready().filter(pk=image_id).first()
+    return cache[image_id]
+
+
+def single_image_etag(request, image_id, *args, **kwargs):
+    image = get_ready_image(request, image_id)
+    if image is None:
+        return None
+    parts = [settings.GALLERY_ETAG_VERSION, gallery_version(), image.image.get_prep_value(),
+             image.uploaded_at.timestamp()]
+    return hashlib.md5(":".join(map(str, parts)).encode()).hexdigest()
+
+
+def single_image_last_modified(request, image_id, *args, **kwargs):
+    image = get_ready_image(request, image_id)
+    return image.uploaded_at if image else None
+
+
+def cache_control_for(view_name):
+    """
+    Додає Cache-Control з settings.VIEW_CACHE_CONTROL[view_name] — так політику
+    кешування кожного view можна змінити без правок коду. Сторінки авторизованих
+    користувачів завжди позначаються як private. Працює і з async view.
+    """
+    def apply(response, user):
+        options = settings.VIEW_CACHE_CONTROL.get(view_name)
+        if options:
+            patch_cache_control(response, **options)
+        if user.is_authenticated:
+            patch_cache_control(response, private=True)
+        return response
+
+    def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def async_wrapper(request, *args, **kwargs):
+                response = await view_func(request, *args, **kwargs)
+                return apply(response, await request.auser())
+            return async_wrapper
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            response = view_func(request, *args, **kwargs)
+            return apply(response, request.user)
+        return wrapper
+    return decorator
+
+
+def acondition(etag_func=None, last_modified_func=None):
+    """
+    Аналог django.views.decorators.http.condition для async view. Django викликає
+    etag_func і last_modified_func прямо в циклі подій, а наші звертаються до бази,
+    тож тут вони виконуються через sync_to_async.
+    """
+    def resolve(request, *args, **kwargs):
+        etag = etag_func(request, *args, **kwargs) if etag_func else None
+        last_modified = last_modified_func(request, *args, **kwargs) if last_modified_func else None
+        return (quote_etag(etag) if etag is not None else None,
+                int(last_modified.timestamp()) if last_modified else None)
+
+    def decorator(view_func):
+        @wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            etag, last_modified = await sync_to_async(resolve)(request, *args, **kwargs)
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = await view_func(request, *args, **kwargs)
+            if request.method in ("GET", "HEAD"):
+                if last_modified and not response.has_header("Last-Modified"):
+                    response.headers["Last-Modified"] = http_date(last_modified)
+                if etag:
+                    response.headers.setdefault("ETag", etag)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,46 @@
+"""
+Видалення зображень разом з файлами у сховищі.
+
+Рядок у базі видаляється лише тоді, коли сховище підтвердило видалення файлу
+("ok" або "not found"). Якщо виклик сховища не вдався, зображення лишається в
+галереї і видалення можна повторити — база та сховище не розходяться. Файли без
+рядків (наприклад, після збою між завантаженням і збереженням) прибирає
+manage.py reconcile_storage.
+"""
+import logging
+
+from .models import Image
+from .storage import get_image_storage
+from .uploads import discard_pending_upload
+
+logger = logging.getLogger(__name__)
+
+DELETED_RESULTS = ("ok", "not found")
+
+
+def delete_images(images):
+    """
+    Видаляє зображення пакетом: файли — одним destroy_many (у Cloudinary —
+    пакети по 100 у кількох потоках), рядки — одним запитом.
+    Повертає (кількість видалених, [(зображення, помилка), ...]).
+    """
+    images = list(images)
+    pending = [image for image in images if not image.image]
+    stored = {image.image.public_id: image for image in images if image.image}
+
+    for image in pending:
+        discard_pending_upload(image)
+
+    results = get_image_storage().destroy_many(stored) if stored else {}
+    deleted, failures = [], []
+    for public_id, image in stored.items():
+        result = results.get(public_id, "no result")
+        if result in DELETED_RESULTS:
+            deleted.append(image.pk)
+        else:
+            logger.warning("Could not delete %s from storage: %s", public_id, result)
+            failures.append((image, result))
+
+    # QuerySet.delete() надсилає post_delete для кожного рядка, тож кеш галереї скидається
+    Image.objects.filter(pk__in=deleted).delete()
+    return len(pending) + len(deleted), failures
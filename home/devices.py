@@ -0,0 +1,87 @@
+"""
+Визначення типу пристрою (mobile / desktop) для варіантів сторінок галереї.
+
+Якщо браузер надсилає Client Hint Sec-CH-UA-Mobile (Chromium робить це за
+замовчуванням), рішення береться з нього. Інакше User-Agent перевіряється одним
+скомпільованим регулярним виразом, а результат запам'ятовується в LRU-кеші за
+рядком User-Agent — різних значень небагато, тож майже кожен запит обходиться
+без сканування.
+
+Відповідь, яка залежала від типу пристрою, отримує Vary: Sec-CH-UA-Mobile,
+User-Agent (DeviceMiddleware). Варіантів лише два, тож кеш галереї зберігає
+сторінки за типом пристрою, а не за User-Agent, і ділить їх між усіма клієнтами.
+"""
+import re
+from functools import lru_cache
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.utils.cache import patch_vary_headers
+from django.utils.functional import SimpleLazyObject
+
+MOBILE = "mobile"
+DESKTOP = "desktop"
+
+DEVICE_VARY_HEADERS = ("Sec-CH-UA-Mobile", "User-Agent")
+
+_MOBILE_USER_AGENT_RE = re.compile(r"android|iphone|ipad|ipod|mobile|windows phone", re.IGNORECASE)
+
+# Довші User-Agent обрізаються: ключі кешу не ростуть через довільні заголовки
+_MAX_USER_AGENT_LENGTH = 512
+
+
+@lru_cache(maxsize=1024)
+def is_mobile_user_agent(user_agent):
+    return _MOBILE_USER_AGENT_RE.search(user_agent) is not None
+
+
+def device_type(request):
+    """
+    MOBILE або DESKTOP для запиту. Обчислюється один раз на запит і позначає
+    відповідь як залежну від пристрою (див. DeviceMiddleware).
+    """
+    request._device_dependent = True
+    if not hasattr(request, "_device_type"):
+        hint = request.headers.get("Sec-CH-UA-Mobile")
+        if hint in ("?0", "?1"):
+            request._device_type = MOBILE if hint == "?1" else DESKTOP
+        else:
+            user_agent = request.headers.get("User-Agent", "")[:_MAX_USER_AGENT_LENGTH]
+            request._device_type = MOBILE if is_mobile_user_agent(user_agent) else DESKTOP
+    return request._device_type
+
+
+def is_desktop_request(request):
+    return device_type(request) == DESKTOP
+
+
+def device(request):
+    """
+    Контекстний процесор: is_desktop у шаблонах. Значення ліниве, тож Vary
+    додається лише до сторінок, шаблони яких справді його використали.
+    """
+    return {"is_desktop": SimpleLazyObject(lambda: is_desktop_request(request))}
+
+
+class DeviceMiddleware:
+    """Додає Vary до відповідей, вміст яких залежав від device_type()."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.finish(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.finish(request, await self.get_response(request))
+
+    def finish(self, request, response):
+        if getattr(request, "_device_dependent", False):
+            patch_vary_headers(response, DEVICE_VARY_HEADERS)
+        return response
@@ -0,0 +1,118 @@
+"""
+Віддача оригіналів зображень: потокова передача з постійним споживанням
+пам'яті, підтримка HTTP Range (докачування) та умовних запитів (304).
+"""
+import hashlib
+import re
+
+from asgiref.sync import sync_to_async
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header, http_date, quote_etag
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def image_etag(image):
+    """Сильний валідатор: значення поля image містить public_id та версію файлу."""
+    return quote_etag(hashlib.md5(image.image.get_prep_value().encode()).hexdigest())
+
+
+def parse_range(header, size):
+    """
+    Розбирає заголовок Range для одного діапазону і повертає (start, end) включно.
+    None означає "віддати весь файл" (заголовка немає, кілька діапазонів тощо).
+    """
+    match = _RANGE_RE.match(header.strip()) if header else None
+    if not match or match.groups() == ("", ""):
+        return None
+
+    start, end = match.groups()
+    if start == "":
+        # bytes=-500: останні 500 байтів
+        length = int(end)
+        if length == 0:
+            raise RangeNotSatisfiable
+        return max(size - length, 0), size - 1
+
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise RangeNotSatisfiable
+    return start, end
+
+
+def iter_stream(stream, length):
+    """Читає рівно length байтів шматками і закриває потік."""
+    try:
+        while length > 0:
+            chunk = stream.read(min(DOWNLOAD_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        stream.close()
+
+
+async def aiter_stream(stream, length):
+    """
+    Асинхронний варіант iter_stream для ASGI: кожне читання виконується в пулі
+    потоків, тож повільне сховище не блокує цикл подій.
+    """
+    read = sync_to_async(stream.read, thread_sensitive=False)
+    try:
+        while length > 0:
+            chunk = await read(min(DOWNLOAD_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        await sync_to_async(stream.close, thread_sensitive=False)()
+
+
+def file_download_response(request, open_stream, size, filename, etag, last_modified, asynchronous=False):
+    """
+    Будує відповідь для завантаження файлу. open_stream(offset) повертає потік,
+    розташований на потрібному байті, і викликається лише тоді, коли тіло справді потрібне.
+
+    asynchronous=True віддає тіло асинхронним ітератором: під ASGI синхронний
+    ітератор (зокрема FileResponse) Django спершу повністю вичитує в пам'ять.
+    """
+    byte_range = None
+    # If-Range: діапазон віддаємо лише якщо клієнт докачує ту саму версію файлу
+    if request.headers.get("If-Range", etag) == etag:
+        try:
+            byte_range = parse_range(request.headers.get("Range"), size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+
+    if byte_range is None and not asynchronous:
+        # FileResponse використовує wsgi.file_wrapper (sendfile) для локальних файлів
+        response = FileResponse(open_stream(0), as_attachment=True, filename=filename)
+        response["Content-Length"] = str(size)
+    else:
+        start, end = byte_range or (0, size - 1)
+        length = end - start + 1
+        stream = open_stream(start)
+        body = aiter_stream(stream, length) if asynchronous else iter_stream(stream, length)
+        response = StreamingHttpResponse(body, status=200 if byte_range is None else 206)
+        response["Content-Length"] = str(length)
+        if byte_range is not None:
+            response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Disposition"] = content_disposition_header(True, filename)
+
+    # Загальний тип примушує браузер (зокрема на Android) показати вікно збереження
+    response["Content-Type"] = "application/octet-stream"
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified.timestamp())
+    return response
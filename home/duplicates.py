@@ -0,0 +1,153 @@
+"""
+Пошук дублікатів зображень.
+
+* Точні дублікати — однаковий sha256 вмісту. Хеш рахується під час запису в
+  спул-каталог (uploads.spool_upload), і повторне завантаження того самого
+  файлу взагалі не доходить до сховища: повертається вже наявне зображення.
+* Майже дублікати — близький перцептивний хеш (dHash, 64 біти): той самий кадр
+  після перестиснення, зміни розміру чи формату. Хеш зберігається в індексованому
+  полі Image.phash; при завантаженні шукаються хеші на відстані Геммінга до
+  NEAR_DUPLICATE_DISTANCE перебором змінених бітів через індекс, а для всієї
+  бібліотеки (manage.py find_duplicates) — BK-деревом, без порівняння кожного з кожним.
+"""
+from itertools import combinations
+
+from django.conf import settings
+from PIL import Image as PILImage
+
+from .models import Image
+
+HASH_BITS = 64
+_SIGN_BIT = 1 << (HASH_BITS - 1)
+
+
+def to_signed(value):
+    """64-бітний хеш у діапазон BigIntegerField (знакове ціле)."""
+    value = to_unsigned(value)
+    return value - (1 << HASH_BITS) if value & _SIGN_BIT else value
+
+
+def to_unsigned(value):
+    return value & ((1 << HASH_BITS) - 1)
+
+
+def dhash(picture):
+    """
+    Різницевий хеш: зображення в градаціях сірого 9x8, кожен біт — чи яскравіший
+    піксель за правого сусіда. Стійкий до масштабу, стиснення та зміни формату.
+    Повертає знакове 64-бітне ціле, готове для Image.phash.
+    """
+    small = picture.convert("L").resize((9, 8), PILImage.Resampling.LANCZOS)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(8):
+        for column in range(8):
+            left, right = pixels[row * 9 + column], pixels[row * 9 + column + 1]
+            value = (value << 1) | (left > right)
+    return to_signed(value)
+
+
+def hamming(first, second):
+    return (to_unsigned(first) ^ to_unsigned(second)).bit_count()
+
+
+def neighbours(phash, distance):
+    """Усі хеші на відстані Геммінга не більше distance (1 + 64 + 2016 для distance=2)."""
+    value = to_unsigned(phash)
+    result = []
+    for flipped in range(distance + 1):
+        for bits in combinations(range(HASH_BITS), flipped):
+            mask = 0
+            for bit in bits:
+                mask |= 1 << bit
+            result.append(to_signed(value ^ mask))
+    return result
+
+
+def find_exact_duplicates(digests):
+    """{sha256: Image} для вже наявних (не failed) зображень з таким вмістом."""
+    queryset = Image.objects.exclude(status=Image.Status.FAILED).filter(sha256__in=set(digests))
+    return {image.sha256: image for image in queryset}
+
+
+def find_near_duplicate(phash, before=None):
+    """
+    Найстаріше готове зображення з близьким перцептивним хешем (з id < before,
+    якщо задано) або None. Кожен кандидат — точний пошук в індексі за phash,
+    тож вартість не залежить від розміру галереї.
+    """
+    if phash is None:
+        return None
+    queryset = Image.objects.ready().filter(phash__in=neighbours(phash, settings.NEAR_DUPLICATE_DISTANCE))
+    if before is not None:
+        queryset = queryset.filter(id__lt=before)
+    return queryset.order_by("id").first()
+
+
+class BKTree:
+    """
+    BK-дерево за метрикою Геммінга: пошук у радіусі r відсікає піддерева,
+    відстань до яких за нерівністю трикутника більша за r.
+    Вузол — [хеш, список значень, {відстань: дочірній вузол}].
+    """
+
+    def __init__(self):
+        self.root = None
+
+    def add(self, phash, value):
+        if self.root is None:
+            self.root = [phash, [value], {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming(phash, node[0])
+            if distance == 0:
+                node[1].append(value)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [phash, [value], {}]
+                return
+            node = child
+
+    def search(self, phash, radius):
+        """Повертає значення всіх хешів на відстані не більше radius."""
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(phash, node[0])
+            if distance <= radius:
+                found.extend(node[1])
+            for child_distance, child in node[2].items():
+                if distance - radius <= child_distance <= distance + radius:
+                    stack.append(child)
+        return found
+
+
+def cluster(items, radius):
+    """
+    Групує пари (id, phash) у кластери майже дублікатів (транзитивно, через
+    union-find). Повертає список відсортованих списків id, лише кластери з 2+ елементів.
+    """
+    tree = BKTree()
+    parent = {}
+
+    def root(key):
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    for pk, phash in items:
+        parent[pk] = pk
+        tree.add(phash, pk)
+        for other in tree.search(phash, radius):
+            first, second = root(pk), root(other)
+            if first != second:
+                parent[max(first, second)] = min(first, second)
+
+    groups = {}
+    for pk in parent:
+        groups.setdefault(root(pk), []).append(pk)
+    return sorted(sorted(group) for group in groups.values() if len(group) > 1)
@@ -0,0 +1,158 @@
+"""
+Потоковий ZIP-експорт зображень.
+
+Архів пишеться у "сток" без seek (zipfile тоді ставить розміри та CRC у
+дескриптор після даних), і кожен записаний шматок одразу віддається клієнту,
+тож архів ніде не накопичується — ні в пам'яті, ні на диску. Оригінали
+відкриваються у сховищі наперед у кілька потоків із ковзним вікном на
+EXPORT_WORKERS файлів, а копіюються в архів шматками по CHUNK_SIZE: пам'ять
+не залежить ні від кількості зображень, ні від їхнього розміру. Вже стиснені
+формати (JPEG, PNG, WebP, AVIF...) записуються без стиснення (ZIP_STORED).
+"""
+import logging
+import zipfile
+from collections import deque
+from contextlib import suppress
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.http import content_disposition_header
+from django.utils.text import slugify
+
+from .storage import get_image_storage, iter_chunks
+
+logger = logging.getLogger(__name__)
+
+# Формати, які deflate майже не зменшує — лише витрачає процесор
+STORED_FORMATS = {"jpg", "jpeg", "png", "gif", "webp", "avif", "heic", "heif"}
+
+# Скільки байтів оригіналу копіюється в архів за раз (і віддається клієнту одним шматком)
+CHUNK_SIZE = 64 * 1024
+
+# ZIP зберігає час лише з 1980 року
+_ZIP_EPOCH_YEAR = 1980
+
+
+class _Sink:
+    """Файлоподібний об'єкт без seek/tell: накопичує записане до наступного drain()."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def entry_name(image):
+    # id робить імена унікальними навіть для однакових назв
+    return f"{slugify(image.title) or 'image'}-{image.id}.{image.image.format or image.format or 'jpg'}"
+
+
+def _entry_info(image):
+    info = zipfile.ZipInfo(entry_name(image))
+    created = timezone.localtime(image.created_at)
+    info.date_time = created.timetuple()[:6] if created.year >= _ZIP_EPOCH_YEAR else (1980, 1, 1, 0, 0, 0)
+    extension = info.filename.rsplit(".", 1)[-1].lower()
+    info.compress_type = zipfile.ZIP_STORED if extension in STORED_FORMATS else zipfile.ZIP_DEFLATED
+    info.external_attr = 0o644 << 16
+    return info
+
+
+def _open_original(storage, image):
+    return storage.open_original(image.image)
+
+
+def _prefetched(images, storage, workers):
+    """
+    Пари (зображення, future з відкритим оригіналом) у порядку images; наперед
+    відкрито щонайбільше workers + 1 файлів. Закриває їх споживач.
+    """
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="export") as pool:
+        window = deque()
+        try:
+            for image in images:
+                window.append((image, pool.submit(_open_original, storage, image)))
+                if len(window) > workers:
+                    yield window.popleft()
+            while window:
+                yield window.popleft()
+        finally:
+            # Експорт перервано (клієнт відключився): закриваємо відкриті наперед файли
+            for _, future in window:
+                with suppress(Exception):
+                    future.result().close()
+
+
+def zip_stream(images, workers=None):
+    """
+    Генератор байтів ZIP-архіву з оригіналами images (ітерований queryset або список).
+    Файли, які не вдалося відкрити, пропускаються, а обірвані під час читання лишаються
+    обрізаними; ті й інші перелічуються в export-errors.txt.
+    """
+    storage = get_image_storage()
+    sink = _Sink()
+    errors = []
+    with zipfile.ZipFile(sink, "w", allowZip64=True) as archive:
+        for image, future in _prefetched(images, storage, workers or settings.EXPORT_WORKERS):
+            try:
+                original = future.result()
+            except Exception as exc:
+                logger.warning("Export skipped image %s: %s", image.pk, exc)
+                errors.append(f"{image.pk}\t{image.title}\t{type(exc).__name__}: {exc}")
+                continue
+            force_zip64 = (image.bytes or 0) >= zipfile.ZIP64_LIMIT
+            with original, archive.open(_entry_info(image), "w", force_zip64=force_zip64) as entry:
+                try:
+                    for chunk in iter_chunks(original, CHUNK_SIZE):
+                        entry.write(chunk)
+                        yield sink.drain()
+                except Exception as exc:
+                    # Частину вже віддано клієнту: запис лишається обрізаним, але архів цілим
+                    logger.warning("Export truncated image %s: %s", image.pk, exc)
+                    errors.append(f"{image.pk}\t{image.title}\tобрізано: {type(exc).__name__}: {exc}")
+            yield sink.drain()
+        if errors:
+            archive.writestr("export-errors.txt", "\n".join(errors) + "\n")
+    # Центральний каталог пишеться при закритті архіву
+    yield sink.drain()
+
+
+def export_queryset(queryset):
+    """Queryset для експорту: лише потрібні стовпці, читання з бази порціями."""
+    return (queryset.only("id", "title", "image", "format", "bytes", "created_at")
+            .order_by("id").iterator(chunk_size=500))
+
+
+async def aiter_sync(iterator):
+    """
+    Асинхронна обгортка для ASGI: синхронний ітератор StreamingHttpResponse Django
+    спершу повністю вичитує в пам'ять. Кожен крок читає базу, тож виконується в
+    потоці бази (thread_sensitive=True).
+    """
+    step = sync_to_async(next, thread_sensitive=True)
+    while (chunk := await step(iterator, None)) is not None:
+        yield chunk
+
+
+def export_response(request, queryset, filename=None):
+    """StreamingHttpResponse з ZIP-архівом зображень queryset (без Content-Length — розмір наперед невідомий)."""
+    stream = zip_stream(export_queryset(queryset))
+    if isinstance(request, ASGIRequest):
+        stream = aiter_sync(stream)
+    response = StreamingHttpResponse(stream, content_type="application/zip")
+    filename = filename or f"gallery-{timezone.localdate():%Y-%m-%d}.zip"
+    response["Content-Disposition"] = content_disposition_header(True, filename)
+    return response
@@ -0,0 +1,138 @@
+"""
+Обробка зображень Pillow: метадані, плейсхолдери та похідні версії (рендишени) для srcset.
+"""
+import base64
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image as PILImage
+from PIL import ImageOps, features
+
+from .duplicates import dhash
+from .storage import FORMAT_EXTENSIONS, get_image_storage
+
+# Значення EXIF Orientation, за яких зображення повернуте на 90°
+_ROTATED_ORIENTATIONS = {5, 6, 7, 8}
+
+# Pillow називає формати по-своєму
+_PIL_FORMATS = {"avif": "AVIF", "webp": "WEBP", "jpeg": "JPEG"}
+
+
+# Ширина крихітного превʼю (LQIP), яке вбудовується в сторінку як data URI
+PLACEHOLDER_WIDTH = 16
+
+
+def rendition_formats():
+    """Формати з налаштувань, які вміє кодувати встановлений Pillow (jpeg є завжди)."""
+    return [
+        fmt for fmt in settings.IMAGE_RENDITION_FORMATS
+        if fmt == "jpeg" or features.check(fmt)
+    ]
+
+
+def rendition_widths(original_width):
+    """
+    Ширини рендишенів, менші за оригінал. Якщо оригінал менший за найменшу
+    ширину, єдиним "рендишеном" буде сам оригінальний розмір.
+    """
+    widths = [width for width in settings.IMAGE_RENDITION_WIDTHS if width < original_width]
+    return widths or [original_width]
+
+
+def oriented_size(picture):
+    """Розмір з урахуванням EXIF-повороту, без декодування пікселів."""
+    width, height = picture.size
+    if picture.getexif().get(0x0112) in _ROTATED_ORIENTATIONS:
+        return height, width
+    return width, height
+
+
+def dominant_color(picture):
+    """Найпоширеніший колір зменшеної копії у форматі #rrggbb."""
+    small = picture.convert("RGB")
+    small.thumbnail((64, 64))
+    quantized = small.quantize(colors=8)
+    _, index = max(quantized.getcolors())
+    red, green, blue = quantized.getpalette()[index * 3:index * 3 + 3]
+    return f"#{red:02x}{green:02x}{blue:02x}"
+
+
+def placeholder_data_uri(picture):
+    """Розмите превʼю ~16 px у WebP, достатньо мале, щоб вбудувати його прямо в HTML."""
+    tiny = picture.convert("RGB")
+    tiny.thumbnail((PLACEHOLDER_WIDTH, PLACEHOLDER_WIDTH))
+    buffer = BytesIO()
+    tiny.save(buffer, "WEBP", quality=30)
+    return "data:image/webp;base64," + base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+def extract_metadata(content):
+    """
+    Розміри, розмір файлу, формат, домінантний колір, плейсхолдер та перцептивний хеш зображення.
+    Повертає словник з назвами полів моделі Image.
+    """
+    content.seek(0, 2)
+    size = content.tell()
+    content.seek(0)
+    with PILImage.open(content) as picture:
+        fmt = (picture.format or "").lower()
+        width, height = oriented_size(picture)
+        # Для JPEG декодуємо одразу зменшену версію — це в рази швидше
+        picture.draft("RGB", (PLACEHOLDER_WIDTH * 8, PLACEHOLDER_WIDTH * 8))
+        picture = ImageOps.exif_transpose(picture)
+        return {
+            "width": width,
+            "height": height,
+            "bytes": size,
+            "format": fmt,
+            "dominant_color": dominant_color(picture),
+            "placeholder": placeholder_data_uri(picture),
+            "phash": dhash(picture),
+        }
+
+
+def resize_to_width(picture, width):
+    """Зменшує копію зображення до заданої ширини зі збереженням пропорцій."""
+    resized = picture.copy()
+    resized.thumbnail((width, resized.height), PILImage.LANCZOS)
+    return resized
+
+
+def encode_rendition(picture, width, fmt):
+    """Кодує вже зменшене зображення у потрібний формат."""
+    if fmt == "jpeg" and picture.mode not in ("RGB", "L"):
+        picture = picture.convert("RGB")
+
+    buffer = BytesIO()
+    picture.save(
+        buffer,
+        _PIL_FORMATS[fmt],
+        quality=settings.IMAGE_RENDITION_QUALITY.get(fmt, 80),
+        **({"optimize": True, "progressive": True} if fmt == "jpeg" else {}),
+    )
+    return ContentFile(buffer.getvalue(), name=f"{width}.{FORMAT_EXTENSIONS[fmt]}")
+
+
+def build_renditions(resource, content, storage=None):
+    """
+    Визначає набір рендишенів для щойно завантаженого зображення.
+    Якщо бекенд сам не вміє їх будувати (локальне сховище), генерує файли Pillow.
+
+    Повертає список словників {"width": ..., "format": ...} для поля Image.renditions.
+    """
+    storage = storage or get_image_storage()
+    formats = rendition_formats()
+
+    content.seek(0)
+    with PILImage.open(content) as picture:
+        widths = rendition_widths(oriented_size(picture)[0])
+
+        if storage.generates_renditions:
+            picture = ImageOps.exif_transpose(picture)
+            for width in widths:
+                resized = resize_to_width(picture, width)
+                for fmt in formats:
+                    storage.save_rendition(resource, width, fmt, encode_rendition(resized, width, fmt))
+
+    return [{"width": width, "format": fmt} for width in widths for fmt in formats]
@@ -0,0 +1,101 @@
+import hashlib
+import tempfile
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from home.cache import invalidate_image
+from home.duplicates import find_exact_duplicates
+from home.images import build_renditions, extract_metadata
+from home.models import Image
+from home.storage import get_image_storage, iter_chunks
+
+METADATA_FIELDS = ["width", "height", "bytes", "format", "dominant_color", "placeholder", "phash"]
+
+# Оригінали до цього розміру тримаємо в пам'яті, більші — у тимчасовому файлі
+SPOOL_MAX_SIZE = 10 * 1024 * 1024
+
+
+class Command(BaseCommand):
+    help = (
+        "Заповнює метадані (розміри, колір, плейсхолдер, перцептивний хеш), sha256 вмісту "
+        "та рендишени для вже завантажених зображень. Точні дублікати позначаються duplicate_of."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100,
+                            help="Кількість записів в одному bulk_update.")
+        parser.add_argument("--force", action="store_true",
+                            help="Переобчислити метадані навіть для заповнених записів.")
+
+    def handle(self, *args, batch_size, force, **options):
+        storage = get_image_storage()
+        queryset = Image.objects.order_by("id")
+        if not force:
+            queryset = queryset.filter(
+                Q(width__isnull=True) | Q(renditions=[]) | Q(phash__isnull=True)
+                | Q(sha256__isnull=True, duplicate_of__isnull=True)
+            )
+        # sha256, вже призначені в цьому запуску: bulk_update ще не записав їх у базу
+        self.assigned = {}
+
+        processed = failed = 0
+        batch = []
+        for image in queryset.iterator(chunk_size=batch_size):
+            try:
+                self.fill(image, storage, force)
+            except Exception as exc:
+                failed += 1
+                self.stderr.write(f"#{image.id} {image.image}: {exc}")
+                continue
+
+            batch.append(image)
+            if len(batch) >= batch_size:
+                processed += self.flush(batch, batch_size)
+
+        processed += self.flush(batch, batch_size)
+        self.stdout.write(self.style.SUCCESS(f"Оновлено: {processed}, помилок: {failed}."))
+
+    def fill(self, image, storage, force):
+        # Pillow потребує seek(), тому потік зі сховища копіюємо в тимчасовий файл
+        digest = hashlib.sha256()
+        with storage.open_original(image.image) as original, \
+                tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as content:
+            for chunk in iter_chunks(original):
+                digest.update(chunk)
+                content.write(chunk)
+            if force or image.width is None or image.phash is None:
+                for field, value in extract_metadata(content).items():
+                    setattr(image, field, value)
+            if image.sha256 is None and image.duplicate_of_id is None:
+                self.assign_sha256(image, digest.hexdigest())
+            if force or not image.renditions:
+                image.renditions = build_renditions(image.image, content, storage)
+
+    def assign_sha256(self, image, sha256):
+        """
+        sha256 унікальний, тож у копії вже наявного файлу (завантаженої до появи
+        дедуплікації) замість хешу записується посилання на оригінал.
+        """
+        original_id = self.assigned.get(sha256)
+        if original_id is None:
+            original = find_exact_duplicates([sha256]).get(sha256)
+            original_id = original.id if original else None
+        if original_id is not None and original_id != image.id:
+            image.duplicate_of_id = original_id
+        else:
+            image.sha256 = sha256
+            self.assigned[sha256] = image.id
+
+    def flush(self, batch, batch_size):
+        count = len(batch)
+        if batch:
+            # bulk_update не чіпає auto_now, тож uploaded_at залишається без змін
+            Image.objects.bulk_update(
+                batch, METADATA_FIELDS + ["renditions", "sha256", "duplicate_of"], batch_size=batch_size,
+            )
+            # bulk_update не надсилає сигналів, тож кеш карток скидаємо вручну
+            for image in batch:
+                invalidate_image(image)
+            batch.clear()
+        return count
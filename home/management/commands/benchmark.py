@@ -0,0 +1,420 @@
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from io import BytesIO
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from PIL import Image as PILImage
+
+from home.models import Image
+
+SUITES = ("index", "upload", "download")
+
+WORDS = ("кіт", "море", "гори", "захід", "місто", "ліс", "портрет", "квіти", "зима", "осінь",
+         "sunset", "beach", "street", "macro", "night", "river", "bridge", "forest")
+
+# Метрики, за якими порівнюються два прогони, і чи "більше — краще"
+COMPARED_METRICS = {"p50": False, "p95": False, "bytes": False, "queries": False, "per_second": True}
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize(seconds):
+    """Статистика латентності в мілісекундах."""
+    ms = [value * 1000 for value in seconds]
+    return {
+        "n": len(ms),
+        "min": round(min(ms), 3),
+        "p50": round(percentile(ms, 0.5), 3),
+        "p95": round(percentile(ms, 0.95), 3),
+        "max": round(max(ms), 3),
+        "mean": round(sum(ms) / len(ms), 3),
+    }
+
+
+def synthetic_photo(rng, width, height):
+    """
+    Плавні кольорові плями з легким шумом: за розміром JPEG і вартістю кодування
+    схоже на фото (однотонне стискається до кілобайтів, чистий шум — надто дороге).
+    """
+    blotches = PILImage.frombytes("RGB", (32, 20), rng.randbytes(32 * 20 * 3)).resize(
+        (width, height), PILImage.Resampling.BICUBIC)
+    noise = PILImage.frombytes("RGB", (width, height), rng.randbytes(width * height * 3))
+    picture = PILImage.blend(blotches, noise, 0.12)
+    buffer = BytesIO()
+    picture.save(buffer, "JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, timeout=5,
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def flatten(results, prefix=""):
+    """{"index": {"1000": {"cold_ms": {"p50": 1.2}}}} -> {"index.1000.cold_ms.p50": 1.2}"""
+    flat = {}
+    for key, value in results.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, path + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+    return flat
+
+
+def compare(baseline, current):
+    """
+    Повертає рядки (метрика, було, стало, зміна у % з урахуванням напрямку):
+    додатна зміна — погіршення, від'ємна — покращення.
+    """
+    before, after = flatten(baseline["results"]), flatten(current["results"])
+    rows = []
+    for path, value in after.items():
+        leaf = path.rsplit(".", 1)[-1]
+        higher_is_better = next(
+            (better for name, better in COMPARED_METRICS.items() if leaf.endswith(name)), None
+        )
+        if higher_is_better is None or path not in before or not before[path]:
+            continue
+        change = (value - before[path]) / before[path] * 100
+        rows.append((path, before[path], value, -change if higher_is_better else change))
+    return rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Відтворюваний бенчмарк галереї без мережі: окрема тимчасова база та локальне "
+        "сховище, N синтетичних зображень; латентність і розмір сторінки index, "
+        "пропускна здатність upload під конкуренцією та потокове скачування. "
+        "Результат у JSON можна порівняти з попереднім прогоном (--compare)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000],
+                            help="Кількість зображень у галереї для вимірів index.")
+        parser.add_argument("--suites", nargs="+", choices=SUITES, default=list(SUITES))
+        parser.add_argument("--requests", type=int, default=30, help="Запитів index на кожен розмір.")
+        parser.add_argument("--uploads", type=int, default=12)
+        parser.add_argument("--concurrency", type=int, default=4, help="Паралельних завантажень.")
+        parser.add_argument("--downloads", type=int, default=20)
+        parser.add_argument("--photo-size", default="1600x1000", help="Розмір синтетичного фото, ШxВ.")
+        parser.add_argument("--seed", type=int, default=1, help="Зерно генератора даних.")
+        parser.add_argument("--output", help="Записати JSON у файл.")
+        parser.add_argument("--json", action="store_true", dest="as_json", help="Вивести результат у JSON.")
+        parser.add_argument("--compare", metavar="BASELINE", dest="baseline_path", help="JSON попереднього прогону для порівняння.")
+        parser.add_argument("--max-regression", type=float, metavar="PERCENT",
+                            help="Завершитися з помилкою, якщо метрика погіршилась більше ніж на PERCENT%%.")
+
+    def handle(self, *args, sizes, suites, photo_size, seed, output, as_json, baseline_path, max_regression, **options):
+        try:
+            width, height = (int(side) for side in photo_size.lower().split("x"))
+        except ValueError:
+            raise CommandError(f"Невірний --photo-size: {photo_size}")
+
+        baseline = None
+        if baseline_path:
+            with open(baseline_path, encoding="utf-8") as baseline_file:
+                baseline = json.load(baseline_file)
+
+        self.rng = random.Random(seed)
+        self.photo = (width, height)
+        directory = tempfile.mkdtemp(prefix="gallery-benchmark-")
+        try:
+            with self.isolated_environment(directory):
+                results = self.run_suites(sorted(set(sizes)), suites, options)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+        report = {
+            "meta": {
+                "commit": git_commit(),
+                "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "database": connection.vendor,
+                "async_views": settings.ASYNC_VIEWS,
+                "params": {"sizes": sorted(set(sizes)), "suites": suites, "photo_size": photo_size,
+                           "seed": seed, **{name: options[name] for name in
+                                            ("requests", "uploads", "concurrency", "downloads")}},
+            },
+            "results": results,
+        }
+
+        if output:
+            with open(output, "w", encoding="utf-8") as output_file:
+                json.dump(report, output_file, indent=2, ensure_ascii=False)
+        if as_json:
+            self.stdout.write(json.dumps(report, indent=2, ensure_ascii=False))
+        else:
+            self.print_results(results)
+
+        if baseline is not None:
+            rows = compare(baseline, report)
+            self.print_comparison(baseline, rows)
+            regressions = [row for row in rows if max_regression is not None and row[3] > max_regression]
+            if regressions:
+                raise CommandError(
+                    f"Погіршення понад {max_regression}%: " + ", ".join(row[0] for row in regressions)
+                )
+
+    # --- оточення ---
+
+    @contextmanager
+    def isolated_environment(self, directory):
+        """
+        Тимчасова база (файл, а не :memory:, щоб діяли ті ж PRAGMA та WAL, що й у
+        продакшні, і потоки завантажень бачили одну базу), локальне сховище,
+        кеш у пам'яті та синхронна обробка черги. Робоча база й кеш не змінюються.
+        """
+        with override_settings(
+            DEBUG=False,
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"],
+            MEDIA_ROOT=os.path.join(directory, "media"),
+            UPLOAD_SPOOL_DIR=os.path.join(directory, "spool"),
+            UPLOAD_QUEUE_EAGER=True,
+            METRICS_DIR=os.path.join(directory, "metrics"),
+            IMAGE_DOWNLOAD_MODE="proxy",
+            STORAGES={**settings.STORAGES, "images": {"BACKEND": "home.storage.LocalImageStorage"}},
+            CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                                "OPTIONS": {"MAX_ENTRIES": 5000}},
+                    "sessions": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                                 "LOCATION": "benchmark-sessions"}},
+            SESSION_FILE_PATH=os.path.join(directory, "sessions"),
+        ):
+            os.makedirs(settings.SESSION_FILE_PATH, exist_ok=True)
+            test_settings = connection.settings_dict["TEST"]
+            previous_test_name = test_settings.get("NAME")
+            if connection.vendor == "sqlite":
+                test_settings["NAME"] = os.path.join(directory, "benchmark.sqlite3")
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                yield
+            finally:
+                connections.close_all()
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                test_settings["NAME"] = previous_test_name
+
+    def run_suites(self, sizes, suites, options):
+        results = {}
+        if "index" in suites:
+            results["index"] = {str(size): self.bench_index(size, options["requests"]) for size in sizes}
+        if "upload" in suites:
+            results["upload"] = self.bench_upload(options["uploads"], options["concurrency"])
+        if "download" in suites:
+            results["download"] = self.bench_download(options["downloads"])
+        return results
+
+    # --- index ---
+
+    def seed(self, total):
+        """Доводить кількість готових зображень до total (розміри перевіряються за зростанням)."""
+        existing = Image.objects.count()
+        renditions = [{"width": width, "format": fmt}
+                      for width in settings.IMAGE_RENDITION_WIDTHS for fmt in settings.IMAGE_RENDITION_FORMATS]
+        width, height = self.photo
+        Image.objects.bulk_create(
+            (
+                Image(
+                    title=" ".join(self.rng.sample(WORDS, 2)) + f" {number}",
+                    image=f"image/upload/v1/benchmark/{number:06d}.jpg",
+                    status=Image.Status.READY,
+                    renditions=renditions,
+                    width=width,
+                    height=height,
+                    bytes=width * height // 4,
+                    format="jpg",
+                    dominant_color="#%06x" % self.rng.randrange(1 << 24),
+                )
+                for number in range(existing, total)
+            ),
+            batch_size=500,
+        )
+
+    def bench_index(self, size, requests):
+        self.seed(size)
+        client = Client()
+        url = reverse("index")
+        # Прогрів: компіляція шаблонів та перше з'єднання з базою не входять у вимір
+        client.get(url)
+
+        cold = []
+        for _ in range(requests):
+            # Без кешу вимірюється повний шлях: запит до бази та рендер шаблону
+            cache.clear()
+            started = time.perf_counter()
+            response = client.get(url)
+            cold.append(time.perf_counter() - started)
+
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        # Журнал запитів очищується на початку кожного наступного запиту
+        query_count = len(queries)
+        if response.status_code != 200:
+            raise CommandError(f"index повернув {response.status_code}")
+
+        warm = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            client.get(url)
+            warm.append(time.perf_counter() - started)
+
+        return {
+            "cold_ms": summarize(cold),
+            "warm_ms": summarize(warm),
+            "bytes": len(response.content),
+            "queries": query_count,
+            "session_queries": self.count_session_queries(url),
+        }
+
+    def count_session_queries(self, url):
+        """
+        Запитів до бази на один перегляд index авторизованим користувачем для кожного
+        SESSION_BACKEND: показує, скільки коштує читання сесії з бази.
+        """
+        user = User.objects.filter(username="benchmark").first() or User.objects.create_user("benchmark")
+        counts = {}
+        for backend, engine in settings.SESSION_BACKENDS.items():
+            with override_settings(SESSION_ENGINE=engine):
+                client = Client()
+                client.force_login(user)
+                client.get(url)
+                with CaptureQueriesContext(connection) as queries:
+                    client.get(url)
+                counts[backend] = len(queries)
+        return counts
+
+    # --- upload ---
+
+    def bench_upload(self, uploads, concurrency):
+        width, height = self.photo
+        # Кожне завантаження — окреме зображення: однакові файли відсіює дедуплікація
+        # за sha256, і вони не доходили б до сховища
+        payloads = [synthetic_photo(self.rng, width, height) for _ in range(uploads)]
+        existing = Image.objects.count()
+        latencies = []
+        failures = 0
+        lock = threading.Lock()
+        url = reverse("upload")
+
+        def upload(number):
+            nonlocal failures
+            payload = payloads[number]
+            photo = SimpleUploadedFile(f"bench{number}.jpg", payload, content_type="image/jpeg")
+            try:
+                started = time.perf_counter()
+                response = Client().post(url, {"title": f"Upload {number}", "image": photo})
+                elapsed = time.perf_counter() - started
+            finally:
+                # Кожен потік пула відкриває власне з'єднання з базою
+                connections.close_all()
+            with lock:
+                if response.status_code == 302:
+                    latencies.append(elapsed)
+                else:
+                    failures += 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(upload, range(uploads)))
+        wall = time.perf_counter() - started
+
+        if not latencies:
+            raise CommandError("Жодне завантаження не вдалося.")
+        return {
+            "latency_ms": summarize(latencies),
+            "uploads_per_second": round(len(latencies) / wall, 3),
+            "failures": failures,
+            # Завантаження, для яких не з'явилося нового запису (має бути 0)
+            "skipped": len(latencies) - (Image.objects.count() - existing),
+            "payload_bytes": sum(map(len, payloads)) // len(payloads),
+        }
+
+    # --- download ---
+
+    def bench_download(self, downloads):
+        # Завжди той самий файл: перше синтетичне фото, незалежно від порядку завершення завантажень
+        image = Image.objects.ready().filter(title="Upload 0").first()
+        if image is None:
+            # Сюїту download запущено без upload: одне справжнє завантаження
+            self.bench_upload(1, 1)
+            image = Image.objects.ready().get(title="Upload 0")
+
+        client = Client()
+        url = reverse("download_image", args=[image.id])
+        b"".join(client.get(url).streaming_content)
+        first_byte, total, size = [], [], 0
+        for _ in range(downloads):
+            started = time.perf_counter()
+            response = client.get(url)
+            chunks = iter(response.streaming_content)
+            size = len(next(chunks, b""))
+            first_byte.append(time.perf_counter() - started)
+            size += sum(len(chunk) for chunk in chunks)
+            total.append(time.perf_counter() - started)
+            response.close()
+
+        return {
+            "first_byte_ms": summarize(first_byte),
+            "total_ms": summarize(total),
+            "bytes": size,
+            "mb_per_second": round(size * len(total) / sum(total) / 1_000_000, 3),
+        }
+
+    # --- вивід ---
+
+    def print_results(self, results):
+        for size, result in results.get("index", {}).items():
+            self.stdout.write(
+                f"index  {size:>7} зобр.  cold p50 {result['cold_ms']['p50']:>8.2f} мс  "
+                f"p95 {result['cold_ms']['p95']:>8.2f} мс  warm p50 {result['warm_ms']['p50']:>7.2f} мс  "
+                f"{result['bytes']:>8} Б  {result['queries']} запитів"
+            )
+            sessions = ", ".join(f"{backend} {count}" for backend, count in result.get("session_queries", {}).items())
+            if sessions:
+                self.stdout.write(f"       авторизований index, запитів за SESSION_BACKEND: {sessions}")
+        if "upload" in results:
+            upload = results["upload"]
+            self.stdout.write(
+                f"upload {upload['uploads_per_second']:>8.2f} /с  p50 {upload['latency_ms']['p50']:.1f} мс  "
+                f"p95 {upload['latency_ms']['p95']:.1f} мс  помилок {upload['failures']}  пропущено {upload['skipped']}"
+            )
+        if "download" in results:
+            download = results["download"]
+            self.stdout.write(
+                f"download {download['mb_per_second']:>6.1f} МБ/с  перший байт p50 "
+                f"{download['first_byte_ms']['p50']:.2f} мс  {download['bytes']} Б"
+            )
+
+    def print_comparison(self, baseline, rows):
+        self.stdout.write(f"\nПорівняння з {baseline['meta'].get('commit') or 'baseline'}:")
+        for path, before, after, change in rows:
+            style = self.style.ERROR if change > 5 else self.style.SUCCESS if change < -5 else str
+            self.stdout.write(style(f"{path:<40} {before:>12.3f} {after:>12.3f} {change:>+8.1f}%"))
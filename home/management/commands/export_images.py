@@ -0,0 +1,37 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from home.exports import export_queryset, zip_stream
+from home.models import Image
+
+
+class Command(BaseCommand):
+    help = (
+        "Експортує оригінали готових зображень у ZIP-архів. Архів пишеться потоком, "
+        "тож споживання пам'яті не залежить від кількості зображень."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", help="Шлях до ZIP-файлу або '-' для stdout.")
+        parser.add_argument("--ids", type=int, nargs="+", help="Лише зображення з цими id.")
+        parser.add_argument("--workers", type=int,
+                            help="Скільки файлів завантажувати одночасно (за замовчуванням EXPORT_WORKERS).")
+
+    def handle(self, *args, output, ids, workers, **options):
+        queryset = Image.objects.ready()
+        if ids:
+            queryset = queryset.filter(id__in=ids)
+
+        target = sys.stdout.buffer if output == "-" else open(output, "wb")
+        written = 0
+        try:
+            for chunk in zip_stream(export_queryset(queryset), workers=workers):
+                target.write(chunk)
+                written += len(chunk)
+        finally:
+            if target is not sys.stdout.buffer:
+                target.close()
+
+        if output != "-":
+            self.stdout.write(self.style.SUCCESS(f"Записано {written} байтів у {output}."))
@@ -0,0 +1,52 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from home.cache import bump_gallery_version
+from home.duplicates import cluster
+from home.models import Image
+
+
+class Command(BaseCommand):
+    help = (
+        "Знаходить кластери майже дублікатів серед готових зображень за перцептивним "
+        "хешем (BK-дерево, без порівняння кожного з кожним). Зображення без phash "
+        "спершу заповніть командою backfill_image_metadata."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--distance", type=int, default=6,
+                            help="Максимальна відстань Геммінга між хешами (з 64 бітів).")
+        parser.add_argument("--mark", action="store_true",
+                            help="Позначити в кожному кластері новіші зображення як duplicate_of найстарішого.")
+        parser.add_argument("--json", action="store_true", dest="as_json", help="Вивести кластери у JSON.")
+
+    def handle(self, *args, distance, mark, as_json, **options):
+        items = (
+            Image.objects.ready().filter(phash__isnull=False).order_by("id")
+            .values_list("id", "phash").iterator(chunk_size=2000)
+        )
+        clusters = cluster(items, distance)
+
+        marked = 0
+        if mark:
+            for original_id, *copies in clusters:
+                marked += (
+                    Image.objects.filter(id__in=copies).exclude(duplicate_of_id=original_id)
+                    .update(duplicate_of_id=original_id)
+                )
+            # update() не надсилає сигналів, а duplicate_of віддає API, тож кеш і ETag скидаємо вручну
+            if marked:
+                bump_gallery_version()
+
+        if as_json:
+            self.stdout.write(json.dumps({"clusters": clusters, "marked": marked}))
+            return
+
+        titles = dict(Image.objects.filter(id__in={pk for group in clusters for pk in group})
+                      .values_list("id", "title"))
+        for group in clusters:
+            self.stdout.write(", ".join(f"#{pk} {titles[pk]}" for pk in group))
+        self.stdout.write(self.style.SUCCESS(
+            f"Кластерів: {len(clusters)}, зображень у них: {sum(map(len, clusters))}, позначено: {marked}."
+        ))
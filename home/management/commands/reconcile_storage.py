@@ -0,0 +1,95 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from home.models import Image
+from home.storage import DELETE_BATCH_SIZE, get_image_storage
+
+# Скільки прикладів кожного виду розбіжностей показувати у звіті
+SAMPLE_SIZE = 20
+
+
+class Command(BaseCommand):
+    help = (
+        "Звіряє файли у сховищі з записами Image: файли без записів (сироти у сховищі) "
+        "та готові зображення, файлів яких у сховищі немає. Сховище читається посторінково. "
+        "Без --apply лише показує розбіжності."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--apply", action="store_true",
+                            help="Видалити файли-сироти та записи без файлів.")
+        parser.add_argument("--prefix",
+                            help="Звіряти лише public_id з цим префіксом (за замовчуванням — папку "
+                                 "галереї). Порожній префікс з --apply заборонено: сховище може "
+                                 "містити файли, що не належать галереї.")
+        parser.add_argument("--min-age", type=float, default=24,
+                            help="Не чіпати файли та записи, новіші за стільки годин "
+                                 "(завантаження, що саме обробляються).")
+
+    def handle(self, *args, apply, prefix, min_age, **options):
+        storage = get_image_storage()
+        if prefix is None:
+            prefix = f"{storage.folder}/"
+        elif not prefix and apply:
+            raise CommandError("--apply потребує непорожнього --prefix: інакше будуть видалені "
+                               "всі файли сховища, на які не посилається галерея.")
+        cutoff = timezone.now() - timedelta(hours=min_age)
+
+        # Знімок бази до читання сховища: записи, створені пізніше, не вважаються зниклими
+        image_field = Image._meta.get_field("image")
+        known = {}
+        for pk, value, created_at in (
+            Image.objects.exclude(image="").values_list("id", "image", "created_at").iterator(chunk_size=2000)
+        ):
+            public_id = image_field.to_python(value).public_id
+            if public_id.startswith(prefix):
+                known[public_id] = (pk, created_at)
+
+        seen = set()
+        orphans, batch = [], []
+        deleted_files = 0
+        for public_id, stored_at in storage.list_resources(prefix=prefix or None):
+            seen.add(public_id)
+            if public_id in known or stored_at > cutoff:
+                continue
+            orphans.append(public_id)
+            batch.append(public_id)
+            if apply and len(batch) >= DELETE_BATCH_SIZE:
+                deleted_files += self.destroy(storage, batch)
+        if apply and batch:
+            deleted_files += self.destroy(storage, batch)
+
+        missing = [
+            pk for public_id, (pk, created_at) in known.items()
+            if public_id not in seen and created_at <= cutoff
+        ]
+        deleted_rows = 0
+        if apply and missing:
+            # post_delete для кожного рядка скидає кеш галереї
+            deleted_rows, _ = Image.objects.filter(pk__in=missing).delete()
+
+        self.report("Файли без записів Image", orphans)
+        self.report("Записи Image без файлів у сховищі", [f"#{pk}" for pk in missing])
+        if apply:
+            self.stdout.write(self.style.SUCCESS(
+                f"Видалено файлів: {deleted_files}, записів: {deleted_rows}."
+            ))
+        elif orphans or missing:
+            self.stdout.write("Запустіть з --apply, щоб прибрати розбіжності.")
+
+    def destroy(self, storage, batch):
+        results = storage.destroy_many(batch)
+        for public_id, result in results.items():
+            if result not in ("ok", "not found"):
+                self.stderr.write(f"{public_id}: {result}")
+        batch.clear()
+        return sum(result == "ok" for result in results.values())
+
+    def report(self, title, items):
+        self.stdout.write(f"{title}: {len(items)}")
+        for item in items[:SAMPLE_SIZE]:
+            self.stdout.write(f"  {item}")
+        if len(items) > SAMPLE_SIZE:
+            self.stdout.write(f"  ... та ще {len(items) - SAMPLE_SIZE}")
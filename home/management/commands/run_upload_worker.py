@@ -0,0 +1,32 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from home.uploads import requeue_failed_jobs, run_worker
+
+
+class Command(BaseCommand):
+    help = "Запускає пул воркерів, що обробляють чергу завантажень (UploadJob)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=settings.UPLOAD_QUEUE_WORKERS,
+                            help="Кількість задач, що обробляються одночасно.")
+        parser.add_argument("--once", action="store_true",
+                            help="Обробити всі готові задачі та завершитися.")
+        parser.add_argument("--retry-failed", action="store_true",
+                            help="Повернути в чергу задачі, що вичерпали всі спроби (якщо спул-файл ще є).")
+
+    def handle(self, *args, workers, once, retry_failed, **options):
+        if retry_failed:
+            self.stdout.write(f"Повернуто в чергу задач: {requeue_failed_jobs()}.")
+
+        stop_event = threading.Event()
+        # Після SIGTERM/Ctrl+C нові задачі не беремо, а поточні доробляємо
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stop_event.set())
+
+        self.stdout.write(f"Воркер черги завантажень запущено ({workers} потоків).")
+        run_worker(workers=workers, once=once, stop_event=stop_event)
+        self.stdout.write("Воркер зупинено.")
@@ -0,0 +1,128 @@
+import json
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Налаштування SQLite "з коробки", як у Django до тюнінгу
+DEFAULT_PROFILE = {"pragmas": {}, "timeout": 5.0, "begin": "BEGIN"}
+
+
+def tuned_profile():
+    return {
+        "pragmas": settings.SQLITE_PRAGMAS,
+        "timeout": settings.SQLITE_PRAGMAS["busy_timeout"] / 1000,
+        "begin": "BEGIN IMMEDIATE",
+    }
+
+
+def connect(path, profile):
+    connection = sqlite3.connect(path, timeout=profile["timeout"], isolation_level=None,
+                                 check_same_thread=False)
+    for name, value in profile["pragmas"].items():
+        connection.execute(f"PRAGMA {name}={value}")
+    return connection
+
+
+class Command(BaseCommand):
+    help = (
+        "Навантажувальний тест SQLite: паралельні читачі (вибірка сторінки галереї) "
+        "та записувачі (вставка зображень) для стандартного та налаштованого профілю."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--readers", type=int, default=8)
+        parser.add_argument("--writers", type=int, default=4)
+        parser.add_argument("--duration", type=float, default=5.0, help="Секунд на кожен профіль.")
+        parser.add_argument("--rows", type=int, default=5000, help="Початкова кількість рядків.")
+        parser.add_argument("--json", action="store_true", dest="as_json", help="Вивести результат у JSON.")
+
+    def handle(self, *args, readers, writers, duration, rows, as_json, **options):
+        results = {}
+        with tempfile.TemporaryDirectory() as directory:
+            for name, profile in (("default", DEFAULT_PROFILE), ("tuned", tuned_profile())):
+                path = str(Path(directory) / f"{name}.sqlite3")
+                self.seed(path, profile, rows)
+                results[name] = self.run_profile(path, profile, readers, writers, duration)
+
+        if as_json:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        self.stdout.write(f"{'профіль':<10}{'читань/с':>12}{'записів/с':>12}{'locked':>10}")
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<10}{result['reads_per_second']:>12.0f}"
+                f"{result['writes_per_second']:>12.0f}{result['lock_errors']:>10}"
+            )
+
+    def seed(self, path, profile, rows):
+        connection = connect(path, profile)
+        connection.execute(
+            "CREATE TABLE image (id INTEGER PRIMARY KEY, title TEXT, image TEXT, uploaded_at REAL)"
+        )
+        connection.execute("BEGIN")
+        connection.executemany(
+            "INSERT INTO image (title, image, uploaded_at) VALUES (?, ?, ?)",
+            ((f"Image {i}", f"image/upload/v1/gallery/{i}.jpg", time.time()) for i in range(rows)),
+        )
+        connection.execute("COMMIT")
+        connection.close()
+
+    def run_profile(self, path, profile, readers, writers, duration):
+        counters = {"reads": 0, "writes": 0, "lock_errors": 0}
+        lock = threading.Lock()
+        deadline = time.monotonic() + duration
+
+        def count(key):
+            with lock:
+                counters[key] += 1
+
+        def reader():
+            connection = connect(path, profile)
+            while time.monotonic() < deadline:
+                try:
+                    # Та сама форма запиту, що й у keyset-пагінації галереї
+                    connection.execute(
+                        "SELECT id, title, image FROM image WHERE id < ? ORDER BY id DESC LIMIT 25",
+                        (1 << 62,),
+                    ).fetchall()
+                    count("reads")
+                except sqlite3.OperationalError:
+                    count("lock_errors")
+            connection.close()
+
+        def writer():
+            connection = connect(path, profile)
+            while time.monotonic() < deadline:
+                try:
+                    connection.execute(profile["begin"])
+                    connection.execute(
+                        "INSERT INTO image (title, image, uploaded_at) VALUES (?, ?, ?)",
+                        ("Load test", "image/upload/v1/gallery/load.jpg", time.time()),
+                    )
+                    connection.execute("COMMIT")
+                    count("writes")
+                except sqlite3.OperationalError:
+                    if connection.in_transaction:
+                        connection.execute("ROLLBACK")
+                    count("lock_errors")
+            connection.close()
+
+        threads = [threading.Thread(target=reader) for _ in range(readers)]
+        threads += [threading.Thread(target=writer) for _ in range(writers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return {
+            "reads_per_second": counters["reads"] / duration,
+            "writes_per_second": counters["writes"] / duration,
+            "lock_errors": counters["lock_errors"],
+        }
+
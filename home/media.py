@@ -0,0 +1,50 @@
+"""
+Віддача локальних медіафайлів (IMAGE_STORAGE=local) у продакшні.
+
+django.conf.urls.static працює лише з DEBUG=True. Тут файл віддається через
+FileResponse — Gunicorn передає його ядру (wsgi.file_wrapper → sendfile) без
+копіювання в Python. Якщо задано MEDIA_ACCEL_REDIRECT, застосунок лише
+перевіряє шлях і умовний запит, а сам файл віддає nginx (X-Accel-Redirect).
+Відповідь не залежить від користувача, тож сесія та база не зачіпаються.
+"""
+import mimetypes
+import os
+import stat
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .storage import get_image_storage
+
+
+def serve_media(request, path):
+    storage = get_image_storage()
+    if not isinstance(storage, FileSystemStorage):
+        raise Http404("Файли зберігаються не локально.")
+    try:
+        full_path = storage.path(path)
+        file_stat = os.stat(full_path)
+    except (SuspiciousFileOperation, FileNotFoundError, NotADirectoryError):
+        raise Http404("Файл не знайдено.")
+    if not stat.S_ISREG(file_stat.st_mode):
+        raise Http404("Файл не знайдено.")
+
+    etag = quote_etag(f"{file_stat.st_size:x}-{file_stat.st_mtime_ns:x}")
+    last_modified = int(file_stat.st_mtime)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        if settings.MEDIA_ACCEL_REDIRECT:
+            content_type, _ = mimetypes.guess_type(full_path)
+            response = HttpResponse(content_type=content_type or "application/octet-stream")
+            response["X-Accel-Redirect"] = settings.MEDIA_ACCEL_REDIRECT + path
+        else:
+            response = FileResponse(open(full_path, "rb"))
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+
+    patch_cache_control(response, **settings.VIEW_CACHE_CONTROL["media"])
+    return response
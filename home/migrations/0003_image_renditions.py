@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0002_rename_date_image_uploaded_at_alter_image_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='renditions',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:34
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def copy_uploaded_at(apps, schema_editor):
+    # Для наявних записів найближче наближення до часу створення — uploaded_at
+    Image = apps.get_model('home', 'Image')
+    Image.objects.update(created_at=models.F('uploaded_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0005_upload_queue'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='created_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.RunPython(copy_uploaded_at, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='image',
+            name='owner',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='images', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='image',
+            index=models.Index(fields=['status', '-id'], name='image_status_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='image',
+            index=models.Index(fields=['owner', '-id'], name='image_owner_id_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    from home.search import ensure_search_index
+
+    ensure_search_index(schema_editor.connection.alias)
+
+
+def remove_search_index(apps, schema_editor):
+    from home.search import drop_search_index
+
+    drop_search_index(schema_editor.connection.alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0006_image_indexes'),
+    ]
+
+    operations = [
+        # Лише для SQLite; на інших базах пошук працює без FTS (див. home.search)
+        migrations.RunPython(create_search_index, remove_search_index),
+    ]
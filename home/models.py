@@ -1,11 +1,98 @@
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 from cloudinary.models import CloudinaryField
 
 
 # Create your models here.
 
 
+class ImageQuerySet(models.QuerySet):
+    def ready(self):
+        """Лише повністю оброблені зображення, які можна показувати в галереї."""
+        return self.filter(status=Image.Status.READY)
+
+    def created_between(self, start=None, end=None):
+        """Зображення, додані в інтервалі [start, end); межі необов'язкові."""
+        queryset = self
+        if start is not None:
+            queryset = queryset.filter(created_at__gte=start)
+        if end is not None:
+            queryset = queryset.filter(created_at__lt=end)
+        return queryset
+
+
 class Image(models.Model):
+    class Status(models.TextChoices):
+        PENDING = "pending", "В обробці"
+        READY = "ready", "Готове"
+        FAILED = "failed", "Помилка"
+
     title = models.CharField(max_length=100)
-    image = CloudinaryField('image')
+    # Окремий індекс за owner не потрібен — його покриває композитний (owner, -id)
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+                              related_name="images", db_index=False)
+    # Порожнє, поки фоновий воркер не завантажив файл у сховище
+    image = CloudinaryField('image', blank=True)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.READY)
+    # Похідні версії для srcset: [{"width": 320, "format": "webp"}, ...]
+    renditions = models.JSONField(default=list, blank=True)
+
+    # Метадані, що обчислюються один раз під час завантаження: шаблон резервує місце
+    # під картку та малює плейсхолдер без додаткових запитів
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    bytes = models.PositiveBigIntegerField(null=True, blank=True)
+    format = models.CharField(max_length=10, blank=True)
+    dominant_color = models.CharField(max_length=7, blank=True)
+    placeholder = models.TextField(blank=True)
+
+    # sha256 вмісту — повторне завантаження того самого файлу не створює нового запису
+    # (унікальність лише серед не failed, див. Meta). phash — перцептивний dHash для
+    # пошуку майже дублікатів, duplicate_of — найстаріше зображення, схоже на це (home/duplicates.py)
+    sha256 = models.CharField(max_length=64, null=True, blank=True, editable=False)
+    phash = models.BigIntegerField(null=True, blank=True, db_index=True, editable=False)
+    duplicate_of = models.ForeignKey("self", on_delete=models.SET_NULL, null=True, blank=True,
+                                     related_name="near_duplicates")
+    # Час створення не змінюється після вставки; uploaded_at (auto_now) оновлюється
+    # при кожному збереженні і слугує лише валідатором для кешу та ETag
+    created_at = models.DateTimeField(default=timezone.now, editable=False, db_index=True)
     uploaded_at = models.DateTimeField(auto_now=True)
+
+    objects = ImageQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Сторінка галереї: WHERE status = 'ready' AND id < ? ORDER BY id DESC
+            models.Index(fields=["status", "-id"], name="image_status_id_idx"),
+            # Майбутні вибірки "мої зображення" з тією ж keyset-пагінацією
+            models.Index(fields=["owner", "-id"], name="image_owner_id_idx"),
+        ]
+        constraints = [
+            # Невдале завантаження не заважає повторити спробу з тим самим файлом
+            models.UniqueConstraint(fields=["sha256"], condition=~models.Q(status="failed"),
+                                    name="image_unique_sha256"),
+        ]
+
+
+class UploadJob(models.Model):
+    """
+    Задача фонової обробки: файл уже лежить у локальному спул-каталозі,
+    воркер має завантажити його у сховище та згенерувати рендишени.
+    Таблиця в базі замінює зовнішній брокер черги.
+    """
+    image = models.OneToOneField(Image, on_delete=models.CASCADE, related_name="upload_job")
+    spool_path = models.CharField(max_length=500)
+    filename = models.CharField(max_length=255)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    # Час, коли воркер узяв задачу; "завислі" блокування знімаються після UPLOAD_QUEUE_LOCK_TIMEOUT
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["run_after"], name="uploadjob_run_after_idx")]
+
+    def __str__(self):
+        return f"{self.filename} (спроба {self.attempts})"
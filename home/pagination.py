@@ -0,0 +1,34 @@
+from django.conf import settings
+
+
+def parse_cursor(value):
+    """
+    Перетворює значення курсора з query-параметра на id.
+    Некоректний або відсутній курсор означає першу сторінку.
+    """
+    try:
+        cursor = int(value)
+    except (TypeError, ValueError):
+        return None
+    return cursor if cursor > 0 else None
+
+
+def keyset_page(queryset, cursor=None, page_size=None):
+    """
+    Keyset-пагінація за спаданням id: замість OFFSET беремо записи з id < cursor,
+    тому вартість запиту не залежить від того, наскільки далеко гортає користувач.
+
+    Повертає (список об'єктів, курсор наступної сторінки або None).
+    """
+    page_size = page_size or settings.GALLERY_PAGE_SIZE
+    queryset = queryset.order_by("-id")
+    if cursor is not None:
+        queryset = queryset.filter(id__lt=cursor)
+
+    # Беремо на один запис більше, щоб дізнатися, чи є наступна сторінка,
+    # без окремого COUNT(*)
+    items = list(queryset[:page_size + 1])
+    if len(items) > page_size:
+        items = items[:page_size]
+        return items, items[-1].id
+    return items, None
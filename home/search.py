@@ -0,0 +1,184 @@
+"""
+Повнотекстовий пошук зображень.
+
+На SQLite використовується віртуальна таблиця FTS5 з зовнішнім вмістом
+(content=home_image): індекс зберігає лише токени, а тригери на home_image
+синхронізують його при вставці, зміні назви та видаленні. Токенізатор unicode61
+зводить регістр (і діакритику латиниці: "Café" знаходиться за "cafe"), а
+префіксні індекси (prefix='2 3') роблять пошук за початком слова ("кот*")
+дешевим. Результати впорядковуються за релевантністю bm25.
+
+Сторінка пошуку займає кілька мілісекунд і на 100 тис. зображень: ранжування
+обмежене вікном найновіших збігів (SEARCH_RANK_WINDOW). Старіші збіги не
+губляться — вони йдуть після ранжованих, від новіших до старіших.
+
+Щоб додати до пошуку нові поля (теги, опис), потрібно розширити SEARCH_COLUMNS
+і перебудувати індекс: drop_search_index() + ensure_search_index().
+"""
+import re
+
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models import Q
+
+from .models import Image
+
+SEARCH_TABLE = "home_image_fts"
+SEARCH_COLUMNS = ("title",)
+SEARCH_TRIGGERS = (f"{SEARCH_TABLE}_ai", f"{SEARCH_TABLE}_ad", f"{SEARCH_TABLE}_au")
+
+# Більше слів у запиті лише сповільнює MATCH і майже не змінює результат
+MAX_SEARCH_TERMS = 8
+
+_TERM_RE = re.compile(r"\w+")
+
+
+def search_terms(text):
+    return _TERM_RE.findall(text or "")[:MAX_SEARCH_TERMS]
+
+
+def match_expression(terms):
+    """
+    Будує вираз MATCH: кожне слово береться в лапки (синтаксис FTS5 у запиті
+    користувача не інтерпретується) і шукається як префікс; слова об'єднуються через AND.
+    """
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def _search_index_sql(table):
+    columns = ", ".join(SEARCH_COLUMNS)
+    new_values = ", ".join(f"new.{column}" for column in SEARCH_COLUMNS)
+    old_values = ", ".join(f"old.{column}" for column in SEARCH_COLUMNS)
+    delete_old = (
+        f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old_values});"
+    )
+    insert_new = f"INSERT INTO {SEARCH_TABLE}(rowid, {columns}) VALUES (new.id, {new_values});"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5({columns}, "
+        f"content='{table}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        f"CREATE TRIGGER IF NOT EXISTS {SEARCH_TRIGGERS[0]} AFTER INSERT ON {table} BEGIN {insert_new} END",
+        f"CREATE TRIGGER IF NOT EXISTS {SEARCH_TRIGGERS[1]} AFTER DELETE ON {table} BEGIN {delete_old} END",
+        f"CREATE TRIGGER IF NOT EXISTS {SEARCH_TRIGGERS[2]} AFTER UPDATE OF {columns} ON {table} "
+        f"BEGIN {delete_old} {insert_new} END",
+    ]
+
+
+def ensure_search_index(using="default"):
+    """
+    Створює FTS-таблицю і тригери, якщо їх немає, та перебудовує індекс.
+
+    Django на SQLite змінює схему, перестворюючи таблицю (_remake_table),
+    і тригери зникають разом зі старою таблицею, тому функція викликається
+    і з міграції, і після кожного migrate (див. HomeConfig.ready).
+    """
+    conn = connections[using]
+    table = Image._meta.db_table
+    if conn.vendor != "sqlite" or table not in conn.introspection.table_names():
+        return False
+
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE name IN (%s, %s, %s, %s)",
+            [SEARCH_TABLE, *SEARCH_TRIGGERS],
+        )
+        if len(cursor.fetchall()) == 1 + len(SEARCH_TRIGGERS):
+            return False
+        for statement in _search_index_sql(table):
+            cursor.execute(statement)
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')")
+    return True
+
+
+def drop_search_index(using="default"):
+    conn = connections[using]
+    if conn.vendor != "sqlite":
+        return
+    with conn.cursor() as cursor:
+        for trigger in SEARCH_TRIGGERS:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        cursor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+
+def search_images(text, page=1, page_size=None):
+    """
+    Повертає (список готових зображень сторінки page, чи є наступна сторінка).
+
+    Пагінація посторінкова: порядок за релевантністю не має монотонного ключа
+    для keyset, а глибоко в результати пошуку гортають рідко.
+    """
+    page_size = page_size or settings.GALLERY_PAGE_SIZE
+    terms = search_terms(text)
+    if not terms:
+        return [], False
+
+    offset = (page - 1) * page_size
+    if connection.vendor == "sqlite":
+        ids = _fts_search(terms, page_size + 1, offset)
+        images = Image.objects.in_bulk(ids)
+        items = [images[pk] for pk in ids if pk in images]
+    else:
+        # Інші бази не мають FTS5; запасний варіант для розробки на PostgreSQL
+        condition = Q()
+        for term in terms:
+            condition &= Q(title__icontains=term)
+        items = list(Image.objects.ready().filter(condition).order_by("-id")[offset:offset + page_size + 1])
+
+    return items[:page_size], len(items) > page_size
+
+
+def _fts_search(terms, limit, offset):
+    """
+    bm25 рахується для кожного збігу, тож широкий префікс ("ка*") на великій
+    галереї коштував би сотні мілісекунд. Ранжуємо лише SEARCH_RANK_WINDOW
+    найновіших збігів: для вибіркових запитів це всі збіги, а для широких
+    вартість обмежена. Збіги, старіші за вікно, йдуть після ранжованих у
+    порядку rowid DESC — його FTS5 віддає з індексу без ранжування.
+    """
+    match = match_expression(terms)
+    with connection.cursor() as cursor:
+        cutoff = _rank_window_cutoff(cursor, match)
+        ids = _fts_query(cursor, match, f"{SEARCH_TABLE}.rowid >= %s", [cutoff],
+                         f"{SEARCH_TABLE}.rank, image.id DESC", limit, offset)
+        if len(ids) == limit or not cutoff:
+            return ids
+
+        # Вікно вичерпане на цій сторінці: решту добираємо зі старіших збігів
+        if ids:
+            older_offset = 0
+        else:
+            older_offset = offset - _fts_count(cursor, match, f"{SEARCH_TABLE}.rowid >= %s", [cutoff])
+        return ids + _fts_query(cursor, match, f"{SEARCH_TABLE}.rowid < %s", [cutoff],
+                                f"{SEARCH_TABLE}.rowid DESC", limit - len(ids), older_offset)
+
+
+def _rank_window_cutoff(cursor, match):
+    """Найменший rowid серед SEARCH_RANK_WINDOW найновіших збігів (0, якщо збігів немає)."""
+    cursor.execute(
+        f"SELECT coalesce(min(rowid), 0) FROM ("
+        f"  SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s ORDER BY rowid DESC LIMIT %s"
+        f")",
+        [match, settings.SEARCH_RANK_WINDOW],
+    )
+    return cursor.fetchone()[0]
+
+
+def _fts_query(cursor, match, condition, params, order_by, limit, offset):
+    cursor.execute(
+        f"SELECT image.id FROM {SEARCH_TABLE} "
+        f"JOIN {Image._meta.db_table} AS image ON image.id = {SEARCH_TABLE}.rowid "
+        f"WHERE {SEARCH_TABLE} MATCH %s AND image.status = %s AND {condition} "
+        f"ORDER BY {order_by} LIMIT %s OFFSET %s",
+        [match, Image.Status.READY, *params, limit, offset],
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _fts_count(cursor, match, condition, params):
+    cursor.execute(
+        f"SELECT count(*) FROM {SEARCH_TABLE} "
+        f"JOIN {Image._meta.db_table} AS image ON image.id = {SEARCH_TABLE}.rowid "
+        f"WHERE {SEARCH_TABLE} MATCH %s AND image.status = %s AND {condition}",
+        [match, Image.Status.READY, *params],
+    )
+    return cursor.fetchone()[0]
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidate_image
+from .models import Image
+
+
+@receiver(post_save, sender=Image)
+@receiver(post_delete, sender=Image)
+def invalidate_gallery_cache(sender, instance, **kwargs):
+    """Галерея змінюється лише при збереженні чи видаленні Image — тоді й скидаємо кеш."""
+    invalidate_image(instance)
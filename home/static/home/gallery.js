@@ -0,0 +1,144 @@
+// Модальне вікно перегляду (partials/image_modal.html, лише на десктопі) та нескінченна прокрутка галереї.
+
+// Глобальна змінна для відстеження поточного масштабу
+let currentZoom = 1.0;
+const MAX_ZOOM = 3.0;
+const MIN_ZOOM = 1.0;
+
+function changeZoom(delta) {
+  const modalImage = document.getElementById('modalImage');
+  const modalContent = document.getElementById('modalContent');
+  if (!modalImage || !modalContent) return;
+
+  let newZoom = currentZoom + delta;
+
+  if (newZoom < MIN_ZOOM) {
+    newZoom = MIN_ZOOM;
+  } else if (newZoom > MAX_ZOOM) {
+    newZoom = MAX_ZOOM;
+  }
+
+  // Застосовуємо новий масштаб
+  modalImage.style.transform = `scale(${newZoom})`;
+  currentZoom = newZoom;
+
+  // --- ЛОГІКА ПРОКРУТКИ ---
+  if (currentZoom > 1.0) {
+    // 1. Горизонтальне прокручування (по центру)
+    // Розраховуємо горизонтальне зміщення, щоб зображення було по центру
+    const scaledWidth = modalImage.offsetWidth * newZoom;
+    const scrollHorizontal = (scaledWidth - modalContent.clientWidth) / 2;
+    modalContent.scrollLeft = scrollHorizontal > 0 ? scrollHorizontal : 0;
+
+    // 2. Вертикальне прокручування
+    // Встановлюємо вертикальну прокрутку в нуль (верхній край),
+    // оскільки transform-origin: 0 0 вже зафіксував верхній край
+    modalContent.scrollTop = 0;
+
+  } else {
+    // Якщо мінімальний масштаб, скидаємо прокрутку
+    modalContent.scrollLeft = 0;
+    modalContent.scrollTop = 0;
+  }
+}
+
+function openModal(imageUrl, imageTitle) {
+  const modal = document.getElementById('imageModal');
+  const modalImage = document.getElementById('modalImage');
+  const overlay = document.getElementById('modalOverlay');
+  // На мобільних модального вікна немає (див. is_desktop)
+  if (!modal) return;
+
+  // Скидаємо масштаб та прокрутку при відкритті
+  currentZoom = 1.0;
+  modalImage.style.transform = `scale(${currentZoom})`;
+  const modalContent = document.getElementById('modalContent');
+  modalContent.scrollLeft = 0;
+  modalContent.scrollTop = 0;
+
+  // Встановлюємо зображення
+  modalImage.src = imageUrl;
+  modalImage.alt = imageTitle;
+
+  // Показуємо модальне вікно
+  modal.style.display = 'block';
+  modal.classList.add('show');
+
+
+ // Блокуємо прокрутку body
+  document.body.style.overflow = 'hidden';
+
+  // Закриття при кліку на overlay
+  overlay.onclick = function() {
+    closeModal();
+  };
+}
+
+function closeModal() {
+  const modal = document.getElementById('imageModal');
+  const modalImage = document.getElementById('modalImage');
+
+  // Ховаємо модальне вікно
+  modal.style.display = 'none';
+  modal.classList.remove('show');
+
+  // Скидаємо масштаб та прокрутку при закритті
+  modalImage.style.transform = 'scale(1)';
+  currentZoom = 1.0;
+  const modalContent = document.getElementById('modalContent');
+  modalContent.scrollLeft = 0;
+  modalContent.scrollTop = 0;
+
+
+  // Відновлюємо прокрутку body
+  document.body.style.overflow = '';
+}
+
+// Закриття модального вікна при натисканні Escape
+document.addEventListener('keydown', function(event) {
+  if (event.key === 'Escape') {
+    const modal = document.getElementById('imageModal');
+    if (modal && modal.style.display === 'block') {
+      closeModal();
+    }
+  }
+});
+
+// Нескінченна прокрутка: коли посилання "Наступна сторінка" з'являється у видимій
+// області, підвантажуємо наступний фрагмент карток. Без JS посилання працює як звичайна пагінація.
+(function () {
+  const nextLink = document.getElementById('nextPage');
+  const gallery = document.getElementById('gallery');
+  if (!nextLink || !gallery || !('IntersectionObserver' in window)) return;
+
+  let loading = false;
+  const observer = new IntersectionObserver(function (entries) {
+    if (!entries[0].isIntersecting || loading) return;
+    loading = true;
+
+    fetch(nextLink.dataset.feedUrl + '?before=' + nextLink.dataset.cursor)
+      .then(function (response) {
+        if (!response.ok) throw new Error(response.status);
+        const cursor = response.headers.get('X-Next-Cursor');
+        return response.text().then(function (html) {
+          gallery.insertAdjacentHTML('beforeend', html);
+          if (cursor) {
+            nextLink.dataset.cursor = cursor;
+            nextLink.href = '?before=' + cursor;
+          } else {
+            observer.disconnect();
+            nextLink.remove();
+          }
+        });
+      })
+      .catch(function () {
+        // Залишаємо звичайне посилання як запасний варіант
+        observer.disconnect();
+      })
+      .finally(function () {
+        loading = false;
+      });
+  }, {rootMargin: '600px'});
+
+  observer.observe(nextLink);
+})();
@@ -0,0 +1,457 @@
+"""
+Сховища для файлів зображень галереї.
+
+Поле Image.image (CloudinaryField) зберігає в базі рядок виду
+"image/upload/v<version>/<public_id>.<format>", тому обидва бекенди повертають
+CloudinaryResource, а моделі та шаблони працюють однаково незалежно від того,
+де фізично лежить файл:
+
+* CloudinaryImageStorage — оригінали в Cloudinary, рендишени будуються
+  URL-трансформаціями CDN, нічого локально не генерується;
+* CachedCloudinaryStorage — Cloudinary з локальним кешем оригіналів на диску
+  (edge-кеш для проксі-скачувань і фонових задач);
+* LocalImageStorage — файли на локальному диску (розробка, CI, бенчмарки без мережі),
+  адресовані за вмістом; рендишени генеруються Pillow і зберігаються поруч з оригіналом.
+
+Активний бекенд задається в settings.STORAGES["images"] (змінна оточення IMAGE_STORAGE).
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from datetime import datetime, timezone
+
+import cloudinary
+import cloudinary.api
+import cloudinary.uploader
+import requests
+from cloudinary import CloudinaryResource
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, storages
+
+from django_images.metrics import instrument
+
+# Розширення файлів та формати Cloudinary для форматів рендишенів
+FORMAT_EXTENSIONS = {
+    "avif": "avif",
+    "webp": "webp",
+    "jpeg": "jpg",
+}
+
+# Admin API Cloudinary видаляє не більше 100 public_id за один виклик
+DELETE_BATCH_SIZE = 100
+
+FORMAT_MIME_TYPES = {
+    "avif": "image/avif",
+    "webp": "image/webp",
+    "jpeg": "image/jpeg",
+}
+
+
+def skip(stream, count, chunk_size=64 * 1024):
+    """Пропускає count байтів у потоці без підтримки seek(), не тримаючи їх у пам'яті."""
+    while count > 0:
+        chunk = stream.read(min(chunk_size, count))
+        if not chunk:
+            break
+        count -= len(chunk)
+
+
+def iter_chunks(stream, chunk_size=64 * 1024):
+    return iter(lambda: stream.read(chunk_size), b"")
+
+
+def write_atomically(path, chunks, mode=0o644):
+    """
+    Записує шматки в тимчасовий файл поруч з path і атомарно перейменовує його:
+    паралельні читачі ніколи не бачать недописаний файл.
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temporary = tempfile.mkstemp(dir=directory, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as output:
+            for chunk in chunks:
+                output.write(chunk)
+        os.chmod(temporary, mode)
+        os.replace(temporary, path)
+    except BaseException:
+        os.remove(temporary)
+        raise
+    return path
+
+
+def hashing(chunks, digest):
+    for chunk in chunks:
+        digest.update(chunk)
+        yield chunk
+
+
+def get_image_storage():
+    """Повертає налаштований бекенд сховища зображень."""
+    return storages["images"]
+
+
+class CloudinaryImageStorage:
+    """
+    Зберігає зображення в Cloudinary. Рендишени не генеруються на нашому боці:
+    CDN створює їх на льоту з параметрів трансформації в URL.
+    """
+
+    generates_renditions = False
+    # Акаунт Cloudinary може містити чужі файли: галерея завантажує лише в свою папку,
+    # і reconcile_storage за замовчуванням звіряє тільки її
+    folder = "gallery"
+
+    @instrument("storage")
+    def upload(self, content):
+        if hasattr(content, "seek"):
+            content.seek(0)
+        return cloudinary.uploader.upload_resource(content, type="upload", resource_type="image",
+                                                   folder=self.folder)
+
+    def image_url(self, resource, width=None, format=None):
+        options = {}
+        if width:
+            # c_limit ніколи не збільшує зображення, q_auto підбирає якість під формат
+            options.update(width=width, crop="limit", quality="auto")
+        if format:
+            options["format"] = FORMAT_EXTENSIONS[format]
+        return resource.build_url(**options)
+
+    @instrument("storage")
+    def open_original(self, resource, offset=0):
+        """
+        Потоковий файлоподібний об'єкт з оригіналом, завантаженим із CDN.
+        З offset запитуємо в CDN лише хвіст файлу (HTTP Range); якщо CDN
+        віддав увесь файл, зайві байти пропускаються тут.
+        """
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        response = requests.get(self.image_url(resource), headers=headers, stream=True, timeout=30)
+        if response.status_code == 404:
+            raise FileNotFoundError(resource.public_id)
+        response.raise_for_status()
+        response.raw.decode_content = True
+        if offset and response.status_code != 206:
+            skip(response.raw, offset)
+        return response.raw
+
+    @instrument("storage")
+    def original_size(self, resource):
+        response = requests.head(self.image_url(resource), timeout=30)
+        if response.status_code == 404:
+            raise FileNotFoundError(resource.public_id)
+        response.raise_for_status()
+        return int(response.headers["Content-Length"])
+
+    def download_url(self, resource, filename):
+        """Підписаний URL CDN, що віддає файл як вкладення (fl_attachment)."""
+        stem = os.path.splitext(filename)[0]
+        return resource.build_url(flags=f"attachment:{stem}", sign_url=True)
+
+    @instrument("storage")
+    def destroy(self, public_id):
+        return cloudinary.uploader.destroy(public_id)
+
+    @instrument("storage")
+    def destroy_many(self, public_ids):
+        """
+        Видаляє файли пакетами по DELETE_BATCH_SIZE через delete_resources,
+        до STORAGE_DELETE_WORKERS пакетів одночасно. Повертає
+        {public_id: "ok" | "not found" | текст помилки} — помилка одного пакета
+        не зупиняє інші.
+        """
+        public_ids = list(public_ids)
+        batches = [public_ids[i:i + DELETE_BATCH_SIZE] for i in range(0, len(public_ids), DELETE_BATCH_SIZE)]
+
+        def delete(batch):
+            try:
+                deleted = cloudinary.api.delete_resources(batch, type="upload", resource_type="image")["deleted"]
+            except Exception as exc:
+                return dict.fromkeys(batch, f"{type(exc).__name__}: {exc}")
+            return {public_id: "ok" if deleted.get(public_id) == "deleted" else "not found" for public_id in batch}
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=settings.STORAGE_DELETE_WORKERS,
+                                thread_name_prefix="storage-delete") as pool:
+            for outcome in pool.map(delete, batches):
+                results.update(outcome)
+        return results
+
+    def list_resources(self, prefix=None, page_size=500):
+        """Усі файли сховища посторінково: пари (public_id, час створення)."""
+        options = {"type": "upload", "resource_type": "image", "max_results": page_size}
+        if prefix:
+            options["prefix"] = prefix
+        while True:
+            page = cloudinary.api.resources(**options)
+            for resource in page["resources"]:
+                yield resource["public_id"], datetime.fromisoformat(resource["created_at"].replace("Z", "+00:00"))
+            if not page.get("next_cursor"):
+                return
+            options["next_cursor"] = page["next_cursor"]
+
+
+class CachedCloudinaryStorage(CloudinaryImageStorage):
+    """
+    Cloudinary з локальним кешем оригіналів (edge-кеш): файл, щойно завантажений
+    або раз отриманий з CDN, далі читається з диска — проксі-скачування віддаються
+    через sendfile, а backfill не ходить у мережу. URL для браузера лишаються адресами CDN.
+    Розмір кешу обмежений max_bytes: при переповненні видаляються найдавніше використані файли.
+
+    Зайняте місце рахується інкрементно, тож заповнення не сканує весь каталог.
+    Повне сканування (evict) відбувається лише при переповненні оцінки або раз на
+    RESCAN_INTERVAL секунд — файли додають і інші процеси, тож оцінка періодично
+    уточнюється, а max_bytes є м'якою межею.
+    """
+
+    RESCAN_INTERVAL = 60
+    # Після переповнення кеш чиститься до цієї частки max_bytes, щоб наступне
+    # сканування не знадобилося вже на наступному файлі
+    EVICT_TO = 0.9
+
+    def __init__(self, location, max_bytes=2 * 1024 ** 3):
+        self.location = os.fspath(location)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Оцінка зайнятого місця; None — каталог ще не сканувався
+        self._size = None
+        self._scanned_at = 0.0
+
+    def cache_path(self, resource):
+        # Версія в імені: файл, перезавантажений під тим самим public_id, не віддасться зі старого кешу
+        return os.path.join(self.location, f"{resource.public_id}.v{resource.version}.{resource.format}")
+
+    def fill(self, resource, stream):
+        path = write_atomically(self.cache_path(resource), iter_chunks(stream))
+        # Файл міг уже витіснити інший процес
+        with suppress(FileNotFoundError):
+            self._account(os.path.getsize(path))
+        with self._lock:
+            rescan = (self._size is None or self._size > self.max_bytes
+                      or time.monotonic() - self._scanned_at > self.RESCAN_INTERVAL)
+        if rescan:
+            self.evict()
+        return path
+
+    def _account(self, delta):
+        with self._lock:
+            if self._size is not None:
+                self._size += delta
+
+    def evict(self):
+        """Сканує каталог і, якщо кеш переповнений, видаляє найдавніше використані файли."""
+        entries = []
+        for root, _, names in os.walk(self.location):
+            for name in names:
+                path = os.path.join(root, name)
+                with suppress(FileNotFoundError):
+                    stat = os.stat(path)
+                    entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        if total > self.max_bytes:
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes * self.EVICT_TO:
+                    break
+                with suppress(FileNotFoundError):
+                    os.remove(path)
+                total -= size
+        with self._lock:
+            self._size = total
+            self._scanned_at = time.monotonic()
+
+    @instrument("storage")
+    def upload(self, content):
+        resource = super().upload(content)
+        content.seek(0)
+        self.fill(resource, content)
+        return resource
+
+    @instrument("storage")
+    def open_original(self, resource, offset=0):
+        path = self.cache_path(resource)
+        try:
+            original = open(path, "rb")
+            # Час зміни слугує позначкою останнього використання для evict()
+            os.utime(path)
+        except FileNotFoundError:
+            with super().open_original(resource) as remote:
+                self.fill(resource, remote)
+            try:
+                original = open(path, "rb")
+            except FileNotFoundError:
+                # Файл більший за весь кеш і вже витіснений
+                return super().open_original(resource, offset)
+        original.seek(offset)
+        return original
+
+    @instrument("storage")
+    def original_size(self, resource):
+        try:
+            return os.path.getsize(self.cache_path(resource))
+        except FileNotFoundError:
+            return super().original_size(resource)
+
+    def forget(self, public_id):
+        directory, basename = os.path.split(os.path.join(self.location, public_id))
+        if os.path.isdir(directory):
+            for entry in os.scandir(directory):
+                if entry.name.startswith(f"{basename}.v"):
+                    size = entry.stat().st_size
+                    os.remove(entry.path)
+                    self._account(-size)
+
+    @instrument("storage")
+    def destroy(self, public_id):
+        result = super().destroy(public_id)
+        self.forget(public_id)
+        return result
+
+    @instrument("storage")
+    def destroy_many(self, public_ids):
+        results = super().destroy_many(public_ids)
+        for public_id, result in results.items():
+            if result in ("ok", "not found"):
+                self.forget(public_id)
+        return results
+
+
+class LocalImageStorage(FileSystemStorage):
+    """
+    Локальний замінник Cloudinary: оригінал зберігається як "<public_id>.<format>",
+    рендишени — як "renditions/<public_id>/<width>.<ext>" у MEDIA_ROOT.
+
+    Вміст адресується за sha256: байти лежать один раз у "blobs/<aa>/<sha256>.<ext>",
+    а оригінал — жорстке посилання на блоб. Однакові файли займають місце на диску
+    один раз, кожне зображення має власний public_id і видаляється незалежно:
+    блоб зникає разом з останнім посиланням.
+    """
+
+    generates_renditions = True
+    folder = "gallery"
+    renditions_folder = "renditions"
+    blobs_folder = "blobs"
+
+    @instrument("storage")
+    def upload(self, content):
+        extension = os.path.splitext(getattr(content, "name", "") or "")[1].lstrip(".").lower()
+        extension = FORMAT_EXTENSIONS.get(extension, extension) or "jpg"
+        resource = CloudinaryResource(
+            f"{self.folder}/{uuid.uuid4().hex}",
+            format=extension,
+            version=str(int(time.time())),
+            type="upload",
+            resource_type="image",
+        )
+        if hasattr(content, "seek"):
+            content.seek(0)
+        digest = hashlib.sha256()
+        incoming = write_atomically(
+            self.path(f"{self.blobs_folder}/incoming/{uuid.uuid4().hex}"),
+            hashing(iter_chunks(content), digest),
+            self.file_permissions_mode or 0o644,
+        )
+        try:
+            self.link_blob(incoming, self.blob_name(digest.hexdigest(), extension), self.original_name(resource))
+        finally:
+            with suppress(FileNotFoundError):
+                os.remove(incoming)
+        return resource
+
+    def blob_name(self, digest, extension):
+        return f"{self.blobs_folder}/{digest[:2]}/{digest}.{extension}"
+
+    def link_blob(self, incoming, blob_name, original_name):
+        blob, original = self.path(blob_name), self.path(original_name)
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        os.makedirs(os.path.dirname(original), exist_ok=True)
+        try:
+            try:
+                # На відміну від replace, link не підмінить блоб, на який уже посилаються інші файли
+                os.link(incoming, blob)
+            except FileExistsError:
+                pass
+            os.link(blob, original)
+        except OSError:
+            # Файлова система без жорстких посилань: окрема копія без дедуплікації
+            os.replace(incoming, original)
+
+    def original_name(self, resource):
+        return f"{resource.public_id}.{resource.format}"
+
+    def rendition_name(self, resource, width, format):
+        return f"{self.renditions_folder}/{resource.public_id}/{width}.{FORMAT_EXTENSIONS[format]}"
+
+    def image_url(self, resource, width=None, format=None):
+        if width and format:
+            return self.url(self.rendition_name(resource, width, format))
+        return self.url(self.original_name(resource))
+
+    @instrument("storage")
+    def open_original(self, resource, offset=0):
+        original = self.open(self.original_name(resource))
+        original.seek(offset)
+        return original
+
+    @instrument("storage")
+    def original_size(self, resource):
+        return self.size(self.original_name(resource))
+
+    def download_url(self, resource, filename):
+        # Локальні файли віддає сам застосунок
+        return None
+
+    @instrument("storage")
+    def save_rendition(self, resource, width, format, content):
+        name = self.rendition_name(resource, width, format)
+        # Перезаписуємо рендишен замість створення копії з випадковим суфіксом
+        self.delete(name)
+        self.save(name, content)
+
+    @instrument("storage")
+    def destroy(self, public_id):
+        """Видаляє оригінал і всі рендишени; відповідь у форматі cloudinary.uploader.destroy."""
+        directory, basename = os.path.split(self.path(public_id))
+        originals = []
+        if os.path.isdir(directory):
+            originals = [entry for entry in os.scandir(directory)
+                         if os.path.splitext(entry.name)[0] == basename]
+        for entry in originals:
+            self.release_blob(entry)
+            os.remove(entry.path)
+        shutil.rmtree(self.path(f"{self.renditions_folder}/{public_id}"), ignore_errors=True)
+        return {"result": "ok" if originals else "not found"}
+
+    def release_blob(self, entry):
+        """Видаляє блоб, якщо entry — останнє посилання на нього."""
+        if entry.stat().st_nlink != 2:
+            return
+        with open(entry.path, "rb") as original:
+            digest = hashlib.file_digest(original, "sha256").hexdigest()
+        blob = self.path(self.blob_name(digest, os.path.splitext(entry.name)[1].lstrip(".")))
+        if os.path.exists(blob) and os.path.samefile(blob, entry.path):
+            os.remove(blob)
+
+    @instrument("storage")
+    def destroy_many(self, public_ids):
+        """Те саме, що CloudinaryImageStorage.destroy_many; локальний диск не потребує пакетів."""
+        return {public_id: self.destroy(public_id)["result"] for public_id in public_ids}
+
+    def list_resources(self, prefix=None):
+        """Оригінали на диску: пари (public_id, час зміни файлу)."""
+        root = self.path(self.folder)
+        for directory, _, names in os.walk(root):
+            for name in names:
+                if name.endswith(".part"):
+                    continue
+                path = os.path.join(directory, name)
+                public_id = os.path.splitext(os.path.relpath(path, self.location))[0].replace(os.sep, "/")
+                if prefix and not public_id.startswith(prefix):
+                    continue
+                with suppress(FileNotFoundError):
+                    yield public_id, datetime.fromtimestamp(os.path.getmtime(path), timezone.utc)
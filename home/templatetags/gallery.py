@@ -0,0 +1,58 @@
+from django import template
+from django.conf import settings
+from django.utils.safestring import mark_safe
+
+from home.cache import render_cards
+from home.storage import FORMAT_MIME_TYPES, get_image_storage
+
+register = template.Library()
+
+
+@register.filter
+def image_url(img, width=None):
+    """URL оригіналу (або рендишену заданої ширини у форматі jpeg)."""
+    if width:
+        return get_image_storage().image_url(img.image, width=int(width), format="jpeg")
+    return get_image_storage().image_url(img.image)
+
+
+@register.inclusion_tag("partials/responsive_image.html")
+def responsive_image(img, css_class=""):
+    """
+    Рендерить <picture> з джерелами srcset для кожного формату рендишенів.
+    Для записів без рендишенів повертає звичайний <img> з оригіналом.
+    """
+    storage = get_image_storage()
+    widths_by_format = {}
+    for rendition in img.renditions:
+        widths_by_format.setdefault(rendition["format"], []).append(rendition["width"])
+
+    sources = []
+    for fmt, widths in widths_by_format.items():
+        srcset = ", ".join(
+            f"{storage.image_url(img.image, width=width, format=fmt)} {width}w" for width in sorted(widths)
+        )
+        sources.append({"type": FORMAT_MIME_TYPES[fmt], "format": fmt, "srcset": srcset, "widths": widths})
+
+    # Останнім (запасним) джерелом має бути найсумісніший формат — jpeg
+    fallback = next((source for source in sources if source["format"] == "jpeg"), None)
+    if fallback:
+        sources.remove(fallback)
+        src = storage.image_url(img.image, width=max(fallback["widths"]), format="jpeg")
+    else:
+        src = storage.image_url(img.image)
+
+    return {
+        "img": img,
+        "sources": sources,
+        "fallback": fallback,
+        "src": src,
+        "sizes": settings.GALLERY_IMAGE_SIZES,
+        "css_class": css_class,
+    }
+
+
+@register.simple_tag(takes_context=True)
+def gallery_cards(context, images):
+    """Картки галереї з кешу фрагментів (див. home.cache.render_cards)."""
+    return mark_safe(render_cards(images, context["request"]))
@@ -1,3 +1,1246 @@
-from django.test import TestCase
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import random
+import zipfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from cloudinary import CloudinaryResource
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.templatetags.static import static
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image as PILImage
+
+from .management.commands.benchmark import compare
+from .checks import check_inline_assets
+from .devices import device_type, is_mobile_user_agent
+from .duplicates import BKTree, find_exact_duplicates, hamming, to_signed
+from .models import Image, UploadJob
+from django_images import metrics
+from django_images.assets import inline_asset_size, minify_asset, minify_css, minify_js
+
+from . import async_views, exports
+from .pagination import keyset_page, parse_cursor
+from .search import search_images
+from .storage import CachedCloudinaryStorage, CloudinaryImageStorage, get_image_storage
+from .uploads import claim_next_job, process_job, requeue_failed_jobs, run_worker
+from .urls import gallery_urlpatterns
+
+# URLconf з асинхронними view для AsyncViewTests (ROOT_URLCONF="home.tests")
+urlpatterns = gallery_urlpatterns(async_views)
+
+
+def make_image_file(width=1600, height=1000, name="photo.jpg", fmt="JPEG", color=(200, 80, 40)):
+    buffer = BytesIO()
+    PILImage.new("RGB", (width, height), color).save(buffer, fmt)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type=f"image/{fmt.lower()}")
+
+
+# Кеш у пам'яті для всіх тестів модуля: сигнали Image (bump_gallery_version) та
+# сесії не читають і не змінюють файловий кеш розробника в каталозі cache/
+_cache_override = override_settings(CACHES={
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "tests"},
+    "sessions": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "tests-sessions"},
+})
+
+
+def setUpModule():
+    _cache_override.enable()
+
+
+def tearDownModule():
+    _cache_override.disable()
+
+
+class LocalStorageMixin:
+    """
+    Підміняє сховище зображень локальним диском у тимчасовому каталозі
+    та обробляє чергу завантажень одразу в запиті.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls._media_root = tempfile.mkdtemp()
+        cls._storage_override = override_settings(
+            MEDIA_ROOT=cls._media_root,
+            UPLOAD_SPOOL_DIR=os.path.join(cls._media_root, "spool"),
+            UPLOAD_QUEUE_EAGER=True,
+            METRICS_DIR=os.path.join(cls._media_root, "metrics"),
+            STORAGES={**settings.STORAGES, "images": {"BACKEND": "home.storage.LocalImageStorage"}},
+        )
+        cls._storage_override.enable()
+        super().setUpClass()
+
+    def setUp(self):
+        cache.clear()
+        super().setUp()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls._storage_override.disable()
+        shutil.rmtree(cls._media_root, ignore_errors=True)
+
+
+def create_images(count):
+    return [
+        Image.objects.create(title=f"Image {i}", image=f"image/upload/v1/gallery/img{i}.jpg")
+        for i in range(count)
+    ]
+
+
+@override_settings(GALLERY_PAGE_SIZE=3)
+class GalleryPaginationTests(LocalStorageMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.images = create_images(7)
+
+    def test_keyset_page_walks_all_images_once(self):
+        seen = []
+        cursor = None
+        while True:
+            page, cursor = keyset_page(Image.objects.all(), cursor)
+            seen.extend(img.id for img in page)
+            if cursor is None:
+                break
+        self.assertEqual(seen, sorted((img.id for img in self.images), reverse=True))
+
+    def test_parse_cursor_ignores_garbage(self):
+        self.assertIsNone(parse_cursor("abc"))
+        self.assertIsNone(parse_cursor("-5"))
+        self.assertEqual(parse_cursor("42"), 42)
+
+    def test_index_renders_only_first_page(self):
+        response = self.client.get(reverse("index"))
+        self.assertEqual(len(response.context["images"]), 3)
+        self.assertEqual(response.context["next_cursor"], self.images[4].id)
+        self.assertContains(response, f'?before={self.images[4].id}')
+
+    def test_feed_returns_fragment_and_next_cursor(self):
+        response = self.client.get(reverse("gallery_feed"), {"before": self.images[4].id})
+        self.assertEqual([img.id for img in response.context["images"]],
+                         [self.images[3].id, self.images[2].id, self.images[1].id])
+        self.assertEqual(response["X-Next-Cursor"], str(self.images[1].id))
+        self.assertNotContains(response, "<html")
+
+        last = self.client.get(reverse("gallery_feed"), {"before": self.images[1].id})
+        self.assertNotIn("X-Next-Cursor", last)
+
+
+@override_settings(IMAGE_RENDITION_FORMATS=("webp", "jpeg"))
+class RenditionTests(LocalStorageMixin, TestCase):
+    def test_upload_generates_renditions_and_srcset(self):
+        self.client.post(reverse("upload"), {"title": "Sunset", "image": make_image_file(1600, 1000)})
+
+        image = Image.objects.get()
+        self.assertEqual(
+            image.renditions,
+            [{"width": w, "format": f} for w in (320, 640, 1280) for f in ("webp", "jpeg")],
+        )
+        storage = get_image_storage()
+        with storage.open(storage.rendition_name(image.image, 640, "webp")) as rendition:
+            self.assertEqual(PILImage.open(rendition).size, (640, 400))
+
+        response = self.client.get(reverse("index"))
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, "/640.webp 640w")
+        self.assertContains(response, 'loading="lazy"')
+
+    def test_small_image_keeps_original_width(self):
+        self.client.post(reverse("upload"), {"title": "Icon", "image": make_image_file(200, 100, "icon.png", "PNG")})
+        self.assertEqual({r["width"] for r in Image.objects.get().renditions}, {200})
+
+    def test_delete_removes_original_and_renditions(self):
+        self.client.post(reverse("upload"), {"title": "Sunset", "image": make_image_file(700, 500)})
+        image = Image.objects.get()
+        storage = get_image_storage()
+
+        self.assertEqual(storage.destroy(image.image.public_id), {"result": "ok"})
+        self.assertFalse(storage.exists(storage.original_name(image.image)))
+        self.assertFalse(storage.exists(storage.rendition_name(image.image, 640, "jpeg")))
+        self.assertEqual(storage.destroy(image.image.public_id), {"result": "not found"})
+
+
+class ImageMetadataTests(LocalStorageMixin, TestCase):
+    def test_upload_stores_metadata_and_template_reserves_space(self):
+        self.client.post(reverse("upload"), {"title": "Red", "image": make_image_file(800, 600, color=(200, 10, 10))})
+
+        image = Image.objects.get()
+        self.assertEqual((image.width, image.height, image.format), (800, 600, "jpeg"))
+        self.assertGreater(image.bytes, 0)
+        self.assertRegex(image.dominant_color, r"^#[0-9a-f]{6}$")
+        self.assertTrue(image.placeholder.startswith("data:image/webp;base64,"))
+
+        response = self.client.get(reverse("index"))
+        self.assertContains(response, 'width="800" height="600"')
+        self.assertContains(response, "aspect-ratio: 800 / 600")
+
+    def test_backfill_command_fills_existing_rows(self):
+        resource = get_image_storage().upload(make_image_file(500, 250, "legacy.png", "PNG"))
+        image = Image.objects.create(title="Legacy", image=resource)
+
+        call_command("backfill_image_metadata", stdout=StringIO(), stderr=StringIO())
+
+        image.refresh_from_db()
+        self.assertEqual((image.width, image.height, image.format), (500, 250, "png"))
+        self.assertTrue(image.placeholder)
+        self.assertTrue(image.renditions)
+
+    def test_backfill_invalidates_etags(self):
+        resource = get_image_storage().upload(make_image_file(500, 250, "legacy.png", "PNG"))
+        image = Image.objects.create(title="Legacy", image=resource)
+        urls = [reverse("index"), reverse("image_metadata", args=[image.id]),
+                reverse("api_image_detail", args=[image.id])]
+        etags = [self.client.get(url)["ETag"] for url in urls]
+
+        call_command("backfill_image_metadata", stdout=StringIO(), stderr=StringIO())
+
+        # uploaded_at не змінився, але сторінка й метадані вже інші: старий ETag не дає 304
+        for url, etag in zip(urls, etags):
+            response = self.client.get(url, headers={"if-none-match": etag})
+            self.assertEqual(response.status_code, 200, url)
+
+
+@override_settings(UPLOAD_QUEUE_EAGER=False, UPLOAD_QUEUE_MAX_ATTEMPTS=2)
+# Воркер працює в окремих потоках, тому потрібні справжні коміти, а не транзакція тесту
+class UploadQueueTests(LocalStorageMixin, TransactionTestCase):
+    def test_upload_is_acknowledged_before_processing(self):
+        response = self.client.post(reverse("upload"), {"title": "Queued", "image": make_image_file(640, 480)})
+        self.assertRedirects(response, reverse("index"))
+
+        image = Image.objects.get()
+        self.assertEqual(image.status, Image.Status.PENDING)
+        self.assertFalse(image.image)
+        self.assertNotIn(image, self.client.get(reverse("index")).context["images"])
+
+        run_worker(workers=2, once=True)
+
+        image.refresh_from_db()
+        self.assertEqual(image.status, Image.Status.READY)
+        self.assertEqual(image.width, 640)
+        self.assertTrue(get_image_storage().exists(get_image_storage().original_name(image.image)))
+        self.assertFalse(UploadJob.objects.exists())
+
+    def test_failed_job_is_retried_with_backoff_then_marked_failed(self):
+        self.client.post(reverse("upload"), {"title": "Broken", "image": SimpleUploadedFile("x.jpg", b"not an image")})
+
+        job = claim_next_job()
+        self.assertIsNone(claim_next_job())
+        self.assertFalse(process_job(job))
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 1)
+        self.assertIsNone(job.locked_at)
+        self.assertIsNone(claim_next_job())  # ще не минула затримка перед повтором
+
+        UploadJob.objects.update(run_after=job.created_at)
+        self.assertFalse(process_job(claim_next_job()))
+        self.assertEqual(Image.objects.get().status, Image.Status.FAILED)
+        self.assertIsNone(claim_next_job())
+        self.assertFalse(os.path.exists(job.spool_path))
+
+    def test_retry_failed_skips_content_uploaded_since(self):
+        payloads = [make_image_file(color=(10 * i, 90, 160)).read() for i in range(2)]
+        for i, payload in enumerate(payloads):
+            self.client.post(reverse("upload"), {"title": f"Failed {i}", "image": SimpleUploadedFile("x.jpg", payload)})
+        UploadJob.objects.update(attempts=settings.UPLOAD_QUEUE_MAX_ATTEMPTS)
+        Image.objects.update(status=Image.Status.FAILED)
+        # Тим часом той самий файл завантажили ще раз, і він уже готовий
+        self.client.post(reverse("upload"), {"title": "Again", "image": SimpleUploadedFile("x.jpg", payloads[0])})
+        run_worker(once=True)
+
+        self.assertEqual(requeue_failed_jobs(), 1)
+        self.assertFalse(Image.objects.filter(title="Failed 0").exists())
+        self.assertEqual(Image.objects.get(title="Failed 1").status, Image.Status.PENDING)
+        run_worker(once=True)
+        self.assertEqual(Image.objects.get(title="Failed 1").status, Image.Status.READY)
+
+
+class BulkUploadTests(LocalStorageMixin, TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user("editor"))
+
+    def make_zip(self, *names):
+        buffer = BytesIO()
+        with zipfile.ZipFile(buffer, "w") as archive:
+            for i, name in enumerate(names):
+                # Різний вміст, щоб файли не відкидалися як дублікати
+                archive.writestr(name, make_image_file(400, 300, color=(40 * i, 90, 160)).read())
+            archive.writestr("__MACOSX/._first.jpg", b"junk")
+            archive.writestr("notes.txt", b"not an image")
+        return SimpleUploadedFile("batch.zip", buffer.getvalue(), content_type="application/zip")
+
+    def test_files_and_zip_are_stored_with_per_file_results(self):
+        response = self.client.post(
+            reverse("bulk_upload"),
+            {"images": [make_image_file(500, 400, "single.jpg"), self.make_zip("first.jpg", "nested/second.jpg"),
+                        SimpleUploadedFile("broken.jpg", b"garbage")]},
+            HTTP_ACCEPT="application/json",
+        )
+
+        results = response.json()["results"]
+        self.assertEqual([r["name"] for r in results], ["single.jpg", "first.jpg", "second.jpg", "broken.jpg"])
+        self.assertEqual([r["status"] for r in results], ["ready", "ready", "ready", "failed"])
+        self.assertEqual(
+            sorted(Image.objects.values_list("title", flat=True)), ["first", "second", "single"]
+        )
+        self.assertEqual(Image.objects.get(title="first").width, 400)
+        self.assertEqual(set(Image.objects.values_list("owner__username", flat=True)), {"editor"})
+
+    @override_settings(UPLOAD_QUEUE_EAGER=False)
+    def test_queued_mode_creates_pending_rows_and_jobs(self):
+        self.client.post(reverse("bulk_upload"), {"images": [make_image_file(name=f"{i}.jpg", color=(40 * i, 90, 160)) for i in range(3)]})
+        self.assertEqual(Image.objects.filter(status=Image.Status.PENDING).count(), 3)
+        self.assertEqual(UploadJob.objects.count(), 3)
+
+    def test_concurrent_upload_of_same_content_is_reused(self):
+        payload = make_image_file().read()
+        original = Image.objects.create(title="Original", sha256=hashlib.sha256(payload).hexdigest(),
+                                        image="image/upload/v1/gallery/original.jpg")
+        lookups = []
+
+        def racing_lookup(digests):
+            # Перша перевірка ще не бачить паралельного завантаження
+            lookups.append(digests)
+            return {} if len(lookups) == 1 else find_exact_duplicates(digests)
+
+        for eager in (False, True):
+            lookups.clear()
+            with self.subTest(eager=eager), override_settings(UPLOAD_QUEUE_EAGER=eager), \
+                    mock.patch("home.uploads.find_exact_duplicates", side_effect=racing_lookup):
+                fresh = make_image_file(name="new.jpg", color=(30, 60 * (1 + eager), 90))
+                response = self.client.post(
+                    reverse("bulk_upload"), {"images": [SimpleUploadedFile("copy.jpg", payload), fresh]},
+                    HTTP_ACCEPT="application/json",
+                )
+                results = response.json()["results"]
+                self.assertEqual((results[0]["id"], results[0]["duplicate"]), (original.id, True))
+                self.assertFalse(results[1]["duplicate"])
+        self.assertEqual(Image.objects.count(), 3)
+
+    @override_settings(BULK_UPLOAD_MAX_FILES=2)
+    def test_too_many_files_are_rejected(self):
+        os.makedirs(settings.UPLOAD_SPOOL_DIR, exist_ok=True)
+        spooled_before = set(os.listdir(settings.UPLOAD_SPOOL_DIR))
+        response = self.client.post(
+            reverse("bulk_upload"), {"images": [self.make_zip("a.jpg", "b.jpg", "c.jpg")]},
+            HTTP_ACCEPT="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Image.objects.exists())
+        self.assertEqual(set(os.listdir(settings.UPLOAD_SPOOL_DIR)), spooled_before)
+
+
+class DownloadTests(LocalStorageMixin, TestCase):
+    def setUp(self):
+        self.client.post(reverse("upload"), {"title": "Sea view", "image": make_image_file(300, 200, "sea.png", "PNG")})
+        self.image = Image.objects.get()
+        self.url = reverse("download_image", args=[self.image.id])
+        with get_image_storage().open_original(self.image.image) as original:
+            self.original = original.read()
+
+    def test_full_download_is_streamed_as_attachment(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), self.original)
+        self.assertEqual(response["Content-Length"], str(len(self.original)))
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="sea-view.png"')
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+
+    def test_range_requests(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=10-19")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), self.original[10:20])
+        self.assertEqual(response["Content-Range"], f"bytes 10-19/{len(self.original)}")
+
+        suffix = self.client.get(self.url, HTTP_RANGE="bytes=-5")
+        self.assertEqual(b"".join(suffix.streaming_content), self.original[-5:])
+
+        stale = self.client.get(self.url, HTTP_RANGE="bytes=10-19", HTTP_IF_RANGE='"outdated"')
+        self.assertEqual(stale.status_code, 200)
+
+        beyond = self.client.get(self.url, HTTP_RANGE=f"bytes={len(self.original)}-")
+        self.assertEqual(beyond.status_code, 416)
+
+    def test_repeated_download_is_not_modified(self):
+        etag = self.client.get(self.url)["ETag"]
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+
+class GalleryCacheTests(LocalStorageMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.image = create_images(1)[0]
+
+    def test_anonymous_page_is_served_from_cache_until_gallery_changes(self):
+        self.client.get(reverse("index"))
+        # Лише агрегат для ETag, без вибірки зображень
+        with self.assertNumQueries(1):
+            cached = self.client.get(reverse("index"))
+        self.assertContains(cached, "Image 0")
+
+        self.image.title = "Renamed"
+        self.image.save()
+        self.assertContains(self.client.get(reverse("index")), "Renamed")
+
+        self.image.delete()
+        self.assertContains(self.client.get(reverse("index")), "Зображень ще не завантажено.")
+
+    def test_query_string_does_not_leak_into_cached_page(self):
+        self.assertNotContains(self.client.get(reverse("index"), {"q": "INJECTED TEXT"}), "INJECTED TEXT")
+        self.assertNotContains(self.client.get(reverse("index")), "INJECTED TEXT")
+        # На сторінці пошуку запит і далі показується в полі пошуку
+        self.assertContains(self.client.get(reverse("search"), {"q": "Image"}), 'value="Image"', count=2)
+
+    def test_authenticated_users_bypass_page_cache_but_reuse_cards(self):
+        self.client.force_login(User.objects.create_superuser("admin"))
+        self.client.get(reverse("index"))
+
+        # Сторінку рендеримо заново (сесія, користувач, вибірка), а картку — ні
+        with self.assertTemplateNotUsed("partials/image_card.html"):
+            response = self.client.get(reverse("index"))
+        self.assertContains(response, reverse("delete_image", args=[self.image.id]))
+
+
+class ConditionalGetTests(LocalStorageMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.image = create_images(1)[0]
+
+    def test_unchanged_gallery_returns_not_modified_without_rendering(self):
+        first = self.client.get(reverse("index"))
+        self.assertEqual(first["Cache-Control"], "max-age=0, must-revalidate")
+
+        with self.assertNumQueries(1), self.assertTemplateNotUsed("index.html"):
+            response = self.client.get(reverse("index"), HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+        create_images(1)
+        self.assertEqual(self.client.get(reverse("index"), HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 200)
+
+    def test_etag_differs_per_device_and_user(self):
+        desktop = self.client.get(reverse("index"), HTTP_USER_AGENT="Mozilla/5.0 (X11; Linux x86_64)")["ETag"]
+        mobile = self.client.get(reverse("index"), HTTP_USER_AGENT="Mozilla/5.0 (iPhone)")["ETag"]
+        self.assertNotEqual(desktop, mobile)
+
+        self.client.force_login(User.objects.create_superuser("admin"))
+        response = self.client.get(reverse("index"), HTTP_IF_NONE_MATCH=desktop)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("private", response["Cache-Control"])
+
+    @override_settings(VIEW_CACHE_CONTROL={"image_metadata": {"max_age": 42, "public": True}})
+    def test_metadata_endpoint_supports_conditional_get(self):
+        url = reverse("image_metadata", args=[self.image.id])
+        response = self.client.get(url)
+        self.assertEqual(response.json()["title"], "Image 0")
+        self.assertEqual(response["Cache-Control"], "max-age=42, public")
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+        self.assertEqual(self.client.get(reverse("image_metadata", args=[999])).status_code, 404)
+
+
+class SQLiteTuningTests(TestCase):
+    def test_connection_uses_wal_and_busy_timeout(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("SQLite only")
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_PRAGMAS["busy_timeout"])
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+
+    def test_loadtest_reports_both_profiles(self):
+        out = StringIO()
+        call_command("sqlite_loadtest", readers=2, writers=2, duration=0.2, rows=50, as_json=True, stdout=out)
+        results = json.loads(out.getvalue())
+        self.assertEqual(set(results), {"default", "tuned"})
+        self.assertGreater(results["tuned"]["writes_per_second"], 0)
+        self.assertEqual(results["tuned"]["lock_errors"], 0)
+
+
+class QueryPlanTests(TestCase):
+    """Гарячі запити галереї мають іти через індекси, без повного сканування та сортування."""
+
+    def setUp(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("EXPLAIN QUERY PLAN is SQLite-specific")
+
+    def query_plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            return " | ".join(row[-1] for row in cursor.fetchall())
+
+    def test_gallery_page_uses_status_id_index(self):
+        plan = self.query_plan(Image.objects.ready().filter(id__lt=100).order_by("-id")[:25])
+        self.assertIn("USING INDEX image_status_id_idx (status=? AND id<?)", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_date_range_uses_created_at_index(self):
+        start = timezone.now() - timedelta(days=7)
+        plan = self.query_plan(Image.objects.created_between(start, timezone.now()).order_by("-created_at"))
+        self.assertIn("created_at>? AND created_at<?", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_owner_listing_uses_composite_index(self):
+        plan = self.query_plan(Image.objects.filter(owner_id=1, id__lt=100).order_by("-id")[:25])
+        self.assertIn("USING INDEX image_owner_id_idx (owner_id=? AND id<?)", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_created_at_is_immutable(self):
+        image = create_images(1)[0]
+        created_at = image.created_at
+        image.title = "Renamed"
+        image.save()
+        image.refresh_from_db()
+        self.assertEqual(image.created_at, created_at)
+        self.assertGreater(image.uploaded_at, created_at)
+
+
+@override_settings(GALLERY_PAGE_SIZE=2)
+class SearchTests(LocalStorageMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        if connection.vendor != "sqlite":
+            self.skipTest("FTS5 is SQLite-specific")
+
+    def add(self, title, status=Image.Status.READY):
+        return Image.objects.create(title=title, status=status, image="image/upload/v1/gallery/x.jpg")
+
+    def test_prefix_case_and_diacritics_are_matched(self):
+        kyiv = self.add("Вечірній Київ")
+        self.add("Море")
+        self.assertEqual(search_images("київ")[0], [kyiv])
+        self.assertEqual(search_images("ВЕЧ")[0], [kyiv])
+        self.assertEqual(search_images("кафе")[0], [])
+        cafe = self.add("Café de Flore")
+        self.assertEqual(search_images("cafe")[0], [cafe])
+        self.assertEqual(search_images("")[0], [])
+
+    def test_index_follows_updates_deletes_and_status(self):
+        image = self.add("Старий млин")
+        self.add("Млин уночі", status=Image.Status.PENDING)
+        self.assertEqual(search_images("млин")[0], [image])
+
+        image.title = "Новий міст"
+        image.save()
+        self.assertEqual(search_images("млин")[0], [])
+        self.assertEqual(search_images("міст")[0], [image])
+
+        image.delete()
+        self.assertEqual(search_images("міст")[0], [])
+
+    def test_operators_in_query_are_treated_as_text(self):
+        image = self.add("Кіт NOT пес")
+        self.assertEqual(search_images('кіт" NOT (* ')[0], [image])
+
+    def test_results_are_ranked_and_paginated(self):
+        self.add("Ліс")
+        best = self.add("Ліс ліс ліс")
+        for i in range(3):
+            self.add(f"Осінній ліс та гори {i}")
+
+        first, has_next = search_images("ліс", page=1)
+        self.assertEqual(first[0], best)
+        self.assertTrue(has_next)
+        self.assertFalse(search_images("ліс", page=3)[1])
+
+        response = self.client.get(reverse("search"), {"q": "ліс", "page": 2})
+        self.assertContains(response, "page=3")
+        self.assertContains(response, "page=1")
+        self.assertTemplateUsed(response, "partials/image_card.html")
+
+    @override_settings(SEARCH_RANK_WINDOW=2)
+    def test_broad_queries_rank_only_recent_matches(self):
+        self.add("Ліс ліс ліс")
+        recent = [self.add("Ліс і річка"), self.add("Ліс і поле")]
+        self.assertEqual(sorted(search_images("ліс", page_size=5)[0][:2], key=lambda img: img.id), recent)
+
+    @override_settings(SEARCH_RANK_WINDOW=3)
+    def test_matches_older_than_rank_window_are_reachable(self):
+        older = [self.add(f"Ліс {i}") for i in range(4)]
+        self.add("Ліс чернетка", status=Image.Status.PENDING)
+        recent = [self.add(f"Ліс і річка {i}") for i in range(3)]
+
+        pages = [search_images("ліс", page=page, page_size=2) for page in range(1, 5)]
+        self.assertEqual([has_next for _, has_next in pages], [True, True, True, False])
+        found = [image for images, _ in pages for image in images]
+        # Спершу ранжоване вікно, далі решта збігів від новіших до старіших
+        self.assertCountEqual(found[:3], recent)
+        self.assertEqual(found[3:], older[::-1])
+
+    def test_query_plan_uses_fts_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN SELECT rowid FROM home_image_fts WHERE home_image_fts MATCH ?",
+                           ['"ліс"*'])
+            self.assertIn("VIRTUAL TABLE INDEX", cursor.fetchall()[0][-1])
+
+
+@override_settings(ROOT_URLCONF="home.tests", IMAGE_DOWNLOAD_MODE="proxy")
+class AsyncViewTests(LocalStorageMixin, TestCase):
+    async def upload(self, **extra):
+        return await self.async_client.post(
+            reverse("upload"), {"title": "Async", "image": make_image_file(640, 480)}, **extra,
+        )
+
+    async def test_index_renders_and_answers_not_modified(self):
+        await self.upload()
+        self.assertContains(await self.async_client.get(reverse("index")), "Uploaded Successfully!")
+        # Повідомлення показане, тепер сторінка отримує ETag
+        response = await self.async_client.get(reverse("index"))
+        self.assertContains(response, "Async")
+        self.assertEqual(response["Cache-Control"], "max-age=0, must-revalidate")
+
+        repeat = await self.async_client.get(reverse("index"), headers={"if-none-match": response["ETag"]})
+        self.assertEqual(repeat.status_code, 304)
+
+    async def test_upload_records_owner(self):
+        user = await User.objects.acreate(username="editor")
+        await self.async_client.aforce_login(user)
+        response = await self.upload()
+        self.assertRedirects(response, reverse("index"), fetch_redirect_response=False)
+        image = await Image.objects.select_related("owner").aget(title="Async")
+        self.assertEqual((image.status, image.owner), (Image.Status.READY, user))
+
+    async def test_download_streams_with_async_iterator(self):
+        await self.upload()
+        image = await Image.objects.aget(title="Async")
+
+        response = await self.async_client.get(reverse("download_image", args=[image.id]))
+        self.assertTrue(response.is_async)
+        body = b"".join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(len(body), image.bytes)
+
+        partial = await self.async_client.get(reverse("download_image", args=[image.id]),
+                                              headers={"range": "bytes=0-9"})
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(b"".join([chunk async for chunk in partial.streaming_content]), body[:10])
+
+    async def test_delete_removes_image_and_file(self):
+        await self.upload()
+        image = await Image.objects.aget(title="Async")
+        await self.async_client.aforce_login(await sync_to_async(User.objects.create_superuser)("admin"))
+
+        response = await self.async_client.get(reverse("delete_image", args=[image.id]))
+        self.assertRedirects(response, reverse("index"), fetch_redirect_response=False)
+        self.assertFalse(await Image.objects.filter(id=image.id).aexists())
+        self.assertFalse(await sync_to_async(get_image_storage().exists)(image.image.public_id))
+
+
+class ServerLauncherTests(TestCase):
+    def test_config_precedence_and_auto_values(self):
+        import run
+
+        with tempfile.NamedTemporaryFile("w", suffix=".toml", delete=False) as config_file:
+            config_file.write("workers = 6\nkeepalive = 2\npreload = true\n")
+        self.addCleanup(os.remove, config_file.name)
+
+        args = run.parse_args(["--config", config_file.name, "--keepalive", "9", "--asgi"])
+        config, sources = run.resolve_config(args, environ={"GUNICORN_MAX_REQUESTS": "500", "PORT": "9000"})
+        self.assertEqual(config["workers"], 6)
+        self.assertEqual((config["keepalive"], sources["keepalive"]), (9, "cli"))
+        self.assertEqual(config["bind"], "0.0.0.0:9000")
+        self.assertEqual((config["max_requests_jitter"], sources["max_requests_jitter"]), (50, "auto"))
+
+        command = run.build_command(config)
+        self.assertIn("--preload", command)
+        self.assertIn("uvicorn_worker.UvicornWorker", command)
+        self.assertNotIn("--worker-connections", command)
+
+        defaults, sources = run.resolve_config(run.parse_args([]), environ={})
+        self.assertEqual((defaults["workers"], sources["workers"]), (run.available_cpus(), "auto"))
+
+
+class MetricsTests(LocalStorageMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        # Реєстр метрик спільний для процесу, а інші тести теж виконують запити
+        metrics.registry.clear()
+        shutil.rmtree(settings.METRICS_DIR, ignore_errors=True)
+
+    def test_request_metrics_and_server_timing(self):
+        create_images(2)
+        response = self.client.get(reverse("index"))
+        timing = dict(part.split(";", 1) for part in response["Server-Timing"].split(", "))
+        self.assertEqual(set(timing), {"db", "tpl", "storage", "total"})
+        self.assertNotIn('desc="0 queries"', timing["db"])
+
+        body = self.client.get(reverse("metrics")).content.decode()
+        self.assertIn('django_http_request_duration_seconds_count{method="GET",view="index"} 1', body)
+        self.assertIn('django_http_responses_total{method="GET",status="200",view="index"} 1', body)
+        self.assertRegex(body, r'django_db_queries_total\{view="index"\} [1-9]')
+        self.assertRegex(body, r'django_template_render_seconds_total\{view="index"\} 0\.\d*[1-9]')
+
+    def test_storage_calls_are_timed(self):
+        self.client.post(reverse("upload"), {"title": "Timed", "image": make_image_file(400, 300)})
+        body = self.client.get(reverse("metrics")).content.decode()
+        self.assertIn('django_storage_call_duration_seconds_count{operation="upload"} 1', body)
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_metrics_require_token_and_merge_finished_workers(self):
+        # Файл процесу, якого вже не існує (воркер перезапущено після max_requests)
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        dead_pid = 2 ** 22 + 1
+        with open(os.path.join(settings.METRICS_DIR, f"{dead_pid}.json"), "w") as output:
+            json.dump({"counters": [["django_http_responses_total",
+                                     {"method": "GET", "status": "200", "view": "search"}, 5]],
+                       "histograms": []}, output)
+
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+        for _ in range(2):
+            body = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer secret").content.decode()
+            self.assertIn('django_http_responses_total{method="GET",status="200",view="search"} 5', body)
+        self.assertFalse(os.path.exists(os.path.join(settings.METRICS_DIR, f"{dead_pid}.json")))
+        self.assertTrue(os.path.exists(os.path.join(settings.METRICS_DIR, metrics.ARCHIVE_FILE)))
+
+
+class BenchmarkTests(TestCase):
+    def test_benchmark_runs_offline_in_isolated_database(self):
+        # Окремий процес: команда створює власну тимчасову базу, як і test runner
+        result = subprocess.run(
+            [sys.executable, "manage.py", "benchmark", "--json", "--sizes", "3", "8", "--requests", "2",
+             "--uploads", "6", "--concurrency", "2", "--downloads", "2", "--photo-size", "320x200"],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=120,
+            env={**os.environ, "CLOUDINARY_URL": "", "CACHE_BACKEND": "locmem"},
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        report = json.loads(result.stdout[result.stdout.index("{"):])
+
+        self.assertEqual(set(report["results"]["index"]), {"3", "8"})
+        self.assertGreater(report["results"]["index"]["8"]["queries"], 0)
+        self.assertEqual(report["results"]["upload"]["failures"], 0)
+        self.assertEqual(report["results"]["upload"]["skipped"], 0)
+        self.assertGreater(report["results"]["download"]["bytes"], 0)
+        self.assertFalse(Image.objects.exists())
+
+    def test_compare_accounts_for_metric_direction(self):
+        baseline = {"results": {"index": {"100": {"cold_ms": {"p50": 10.0, "n": 5}}},
+                                "upload": {"uploads_per_second": 4.0}}}
+        current = {"results": {"index": {"100": {"cold_ms": {"p50": 15.0, "n": 9}}},
+                               "upload": {"uploads_per_second": 2.0}}}
+        self.assertEqual(compare(baseline, current), [
+            ("index.100.cold_ms.p50", 10.0, 15.0, 50.0),
+            ("upload.uploads_per_second", 4.0, 2.0, 50.0),
+        ])
+
+
+class StorageBackendTests(LocalStorageMixin, TestCase):
+    def blobs(self):
+        root = get_image_storage().path("blobs")
+        return [os.path.join(d, name) for d, _, names in os.walk(root) for name in names]
+
+    def test_identical_uploads_share_one_blob_and_are_deleted_independently(self):
+        storage = get_image_storage()
+        first = storage.upload(make_image_file())
+        second = storage.upload(make_image_file())
+        self.assertNotEqual(first.public_id, second.public_id)
+        self.assertTrue(os.path.samefile(storage.path(storage.original_name(first)),
+                                         storage.path(storage.original_name(second))))
+        self.assertEqual(len(self.blobs()), 1)
+
+        self.assertEqual(storage.destroy(first.public_id), {"result": "ok"})
+        self.assertEqual(len(self.blobs()), 1)
+        with storage.open_original(second) as original:
+            self.assertEqual(original.read(2), b"\xff\xd8")
+
+        storage.destroy(second.public_id)
+        self.assertEqual(self.blobs(), [])
+
+    def test_media_is_served_with_validators_and_long_cache(self):
+        resource = get_image_storage().upload(make_image_file())
+        url = get_image_storage().image_url(resource)
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content)[:2], b"\xff\xd8")
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+
+        with self.settings(MEDIA_ACCEL_REDIRECT="/protected-media/"):
+            response = self.client.get(url)
+        self.assertEqual(response["X-Accel-Redirect"], "/protected-media/" + url.removeprefix("/media/"))
+        self.assertEqual(response.content, b"")
+
+        self.assertEqual(self.client.get("/media/../db.sqlite3").status_code, 404)
+        self.assertEqual(self.client.get("/media/gallery/").status_code, 404)
+
+    def test_edge_cache_fetches_from_cdn_once_and_evicts_least_recently_used(self):
+        storage = CachedCloudinaryStorage(location=os.path.join(self._media_root, "edge"), max_bytes=15)
+        first = CloudinaryResource("gallery/first", format="jpg", version="1")
+        second = CloudinaryResource("gallery/second", format="jpg", version="1")
+        with mock.patch.object(CloudinaryImageStorage, "open_original",
+                               side_effect=lambda resource, offset=0: BytesIO(b"0123456789")) as remote:
+            with storage.open_original(first, 4) as original:
+                self.assertEqual(original.read(), b"456789")
+            with storage.open_original(first) as original:
+                self.assertEqual(original.read(), b"0123456789")
+            self.assertEqual(remote.call_count, 1)
+            self.assertEqual(storage.original_size(first), 10)
+
+            # Два файли не вміщуються у 15 байтів: витісняється давніший
+            storage.open_original(second).close()
+            self.assertFalse(os.path.exists(storage.cache_path(first)))
+            self.assertTrue(os.path.exists(storage.cache_path(second)))
+
+    def test_edge_cache_fill_does_not_rescan_until_full(self):
+        storage = CachedCloudinaryStorage(location=os.path.join(self._media_root, "edge-rescan"), max_bytes=35)
+        resources = [CloudinaryResource(f"gallery/{i}", format="jpg", version="1") for i in range(4)]
+        with mock.patch.object(CloudinaryImageStorage, "open_original",
+                               side_effect=lambda resource, offset=0: BytesIO(b"0123456789")), \
+                mock.patch("home.storage.os.walk", wraps=os.walk) as walk:
+            for resource in resources[:3]:
+                storage.open_original(resource).close()
+            self.assertEqual(walk.call_count, 1)
+
+            # Четвертий файл переповнює оцінку: лише тоді каталог сканується знову
+            storage.open_original(resources[3]).close()
+            self.assertEqual(walk.call_count, 2)
+            self.assertEqual(sum(os.path.exists(storage.cache_path(resource)) for resource in resources), 3)
+
+
+def make_photo(width=640, height=480, name="photo.jpg", fmt="JPEG", quality=90, gradient="radial"):
+    """Неоднотонне зображення: у суцільної заливки перцептивний хеш нульовий."""
+    pattern = PILImage.radial_gradient("L") if gradient == "radial" else PILImage.linear_gradient("L")
+    picture = PILImage.merge("RGB", [pattern, pattern.rotate(90), pattern.rotate(45)]).resize((width, height))
+    buffer = BytesIO()
+    picture.save(buffer, fmt, quality=quality)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type=f"image/{fmt.lower()}")
+
+
+class DuplicateTests(LocalStorageMixin, TestCase):
+    def upload(self, photo, title="Фото"):
+        return self.client.post(reverse("upload"), {"title": title, "image": photo}, follow=True)
+
+    def test_identical_upload_reuses_existing_image_without_storing(self):
+        self.upload(make_photo())
+        with mock.patch.object(type(get_image_storage()), "upload") as storage_upload:
+            response = self.upload(make_photo(), title="Ще раз")
+        storage_upload.assert_not_called()
+        self.assertContains(response, "Таке зображення вже є в галереї.")
+        self.assertEqual(Image.objects.count(), 1)
+        self.assertEqual(len(Image.objects.get().sha256), 64)
+        self.assertEqual(os.listdir(settings.UPLOAD_SPOOL_DIR), [])
+
+    def test_failed_upload_does_not_block_retry(self):
+        self.upload(make_photo())
+        Image.objects.update(status=Image.Status.FAILED)
+        self.upload(make_photo())
+        self.assertEqual(Image.objects.filter(status=Image.Status.READY).count(), 1)
+
+    def test_recompressed_copy_is_flagged_as_near_duplicate(self):
+        self.upload(make_photo())
+        self.upload(make_photo(320, 240, "copy.webp", fmt="WEBP", quality=40))
+        self.upload(make_photo(gradient="linear"))
+        original, copy, other = Image.objects.order_by("id")
+        self.assertNotEqual(original.sha256, copy.sha256)
+        self.assertEqual(copy.duplicate_of, original)
+        self.assertIsNone(other.duplicate_of)
+
+    def test_bulk_upload_skips_duplicates_in_request_and_library(self):
+        self.client.force_login(User.objects.create_user("editor"))
+        self.upload(make_photo(name="old.jpg"))
+        response = self.client.post(
+            reverse("bulk_upload"),
+            {"images": [make_photo(name="a.jpg"), make_photo(name="b.jpg", gradient="linear"),
+                        make_photo(name="c.jpg", gradient="linear")]},
+            HTTP_ACCEPT="application/json",
+        )
+        results = response.json()["results"]
+        self.assertEqual([r["duplicate"] for r in results], [True, False, True])
+        self.assertEqual(results[0]["id"], Image.objects.get(title="Фото").id)
+        self.assertEqual(results[1]["id"], results[2]["id"])
+        self.assertEqual(Image.objects.count(), 2)
+
+    def test_backfill_links_legacy_exact_duplicates(self):
+        storage = get_image_storage()
+        first, second = (
+            Image.objects.create(title=f"Legacy {i}", image=storage.upload(make_photo())) for i in range(2)
+        )
+        call_command("backfill_image_metadata", stdout=StringIO())
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(len(first.sha256), 64)
+        self.assertIsNone(second.sha256)
+        self.assertEqual(second.duplicate_of, first)
+        self.assertIsNotNone(second.phash)
+
+    def test_bk_tree_matches_brute_force(self):
+        rng = random.Random(7)
+        hashes = [to_signed(rng.getrandbits(64)) for _ in range(300)]
+        # Кілька близьких варіантів, щоб радіус пошуку щось знаходив
+        hashes += [to_signed(hashes[i] ^ (1 << rng.randrange(64))) for i in range(30)]
+        tree = BKTree()
+        for index, value in enumerate(hashes):
+            tree.add(value, index)
+        for probe in hashes[::25]:
+            expected = {index for index, value in enumerate(hashes) if hamming(probe, value) <= 3}
+            self.assertEqual(set(tree.search(probe, 3)), expected)
+
+    def test_find_duplicates_command_clusters_and_marks(self):
+        base = 0x0F0F_F0F0_1234_5678
+        images = [
+            Image.objects.create(title=title, image=f"image/upload/v1/gallery/{title}.jpg", phash=to_signed(value))
+            for title, value in [("a", base), ("b", base ^ 0b11), ("c", base ^ 0b11111), ("far", ~base)]
+        ]
+        etag = self.client.get(reverse("api_image_detail", args=[images[2].id]))["ETag"]
+        out = StringIO()
+        call_command("find_duplicates", "--distance", "3", "--mark", "--json", stdout=out)
+        report = json.loads(out.getvalue())
+        response = self.client.get(reverse("api_image_detail", args=[images[2].id]), headers={"if-none-match": etag})
+        self.assertEqual(response.json()["duplicate_of"], images[0].id)
+        # c відрізняється від a на 5 бітів, але від b — на 3: кластер транзитивний
+        self.assertEqual(report["clusters"], [[images[0].id, images[1].id, images[2].id]])
+        self.assertEqual(report["marked"], 2)
+        self.assertEqual(Image.objects.get(title="c").duplicate_of_id, images[0].id)
+        self.assertIsNone(Image.objects.get(title="far").duplicate_of_id)
+
+
+class DeletionTests(LocalStorageMixin, TestCase):
+    def upload(self, title, color):
+        resource = get_image_storage().upload(make_image_file(64, 48, color=color))
+        return Image.objects.create(title=title, image=resource)
+
+    def test_bulk_delete_removes_files_and_keeps_rows_that_failed(self):
+        self.client.force_login(User.objects.create_superuser("admin"))
+        first, second, kept = self.upload("a", (10, 20, 30)), self.upload("b", (40, 50, 60)), self.upload("c", (1, 2, 3))
+        storage = get_image_storage()
+        path = storage.path(storage.original_name(first.image))
+
+        response = self.client.post(reverse("bulk_delete"), {"ids": [first.id, second.id]},
+                                    HTTP_ACCEPT="application/json")
+        self.assertEqual(response.json(), {"deleted": 2, "failed": []})
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(list(Image.objects.values_list("id", flat=True)), [kept.id])
+
+        with mock.patch.object(type(storage), "destroy_many", return_value={kept.image.public_id: "Timeout"}):
+            response = self.client.post(reverse("bulk_delete"), {"ids": [kept.id]}, HTTP_ACCEPT="application/json")
+        self.assertEqual(response.json(), {"deleted": 0, "failed": [{"id": kept.id, "error": "Timeout"}]})
+        self.assertTrue(Image.objects.filter(id=kept.id).exists())
+
+    def test_single_delete_keeps_row_when_storage_fails(self):
+        self.client.force_login(User.objects.create_superuser("admin"))
+        image = self.upload("a", (10, 20, 30))
+        storage = get_image_storage()
+        with mock.patch.object(type(storage), "destroy_many", return_value={image.image.public_id: "Timeout"}):
+            response = self.client.get(reverse("delete_image", args=[image.id]), follow=True)
+        self.assertContains(response, "зображення залишено: Timeout")
+        self.assertTrue(Image.objects.filter(id=image.id).exists())
+
+        self.client.get(reverse("delete_image", args=[image.id]))
+        self.assertFalse(Image.objects.filter(id=image.id).exists())
+        self.assertFalse(os.path.exists(storage.path(storage.original_name(image.image))))
+
+    def test_bulk_delete_requires_superuser(self):
+        image = self.upload("a", (10, 20, 30))
+        self.client.force_login(User.objects.create_user("editor"))
+        response = self.client.post(reverse("bulk_delete"), {"ids": [image.id]}, HTTP_ACCEPT="application/json")
+        self.assertEqual(response.status_code, 403)
+        self.assertTrue(Image.objects.filter(id=image.id).exists())
+
+    def test_admin_delete_action_removes_files(self):
+        self.client.force_login(User.objects.create_superuser("admin"))
+        image = self.upload("a", (10, 20, 30))
+        storage = get_image_storage()
+        path = storage.path(storage.original_name(image.image))
+        self.client.post(reverse("admin:home_image_changelist"),
+                         {"action": "delete_selected", "_selected_action": [image.id], "post": "yes"})
+        self.assertFalse(Image.objects.exists())
+        self.assertFalse(os.path.exists(path))
+
+    def test_cloudinary_destroy_many_batches_requests(self):
+        public_ids = [f"gallery/{i}" for i in range(250)]
+
+        def delete_resources(batch, **options):
+            if batch[0] == "gallery/100":
+                raise RuntimeError("rate limited")
+            return {"deleted": {public_id: "deleted" for public_id in batch if public_id != "gallery/0"}}
+
+        with mock.patch("cloudinary.api.delete_resources", side_effect=delete_resources) as api:
+            results = CloudinaryImageStorage().destroy_many(public_ids)
+        self.assertEqual(api.call_count, 3)
+        self.assertEqual(results["gallery/0"], "not found")
+        self.assertEqual(results["gallery/1"], "ok")
+        self.assertEqual(results["gallery/150"], "RuntimeError: rate limited")
+        self.assertEqual(results["gallery/249"], "ok")
+
+    def test_reconcile_reports_by_default_and_fixes_with_apply(self):
+        kept = self.upload("kept", (10, 20, 30))
+        storage = get_image_storage()
+        orphan = storage.upload(make_image_file(64, 48, color=(90, 90, 90)))
+        dangling = Image.objects.create(title="gone", image="image/upload/v1/gallery/gone.jpg")
+        Image.objects.update(created_at=timezone.now() - timedelta(days=2))
+        orphan_path = storage.path(storage.original_name(orphan))
+        past = (timezone.now() - timedelta(days=2)).timestamp()
+        for path in (orphan_path, storage.path(storage.original_name(kept.image))):
+            os.utime(path, (past, past))
+
+        out = StringIO()
+        call_command("reconcile_storage", stdout=out)
+        self.assertIn(orphan.public_id, out.getvalue())
+        self.assertIn(f"#{dangling.id}", out.getvalue())
+        self.assertTrue(os.path.exists(orphan_path))
+        self.assertEqual(Image.objects.count(), 2)
+
+        # Порожній префікс звіряв би весь акаунт сховища, разом із чужими файлами
+        with self.assertRaises(CommandError):
+            call_command("reconcile_storage", "--apply", "--prefix", "", stdout=StringIO())
+        self.assertTrue(os.path.exists(orphan_path))
+        with mock.patch("cloudinary.uploader.upload_resource") as upload:
+            CloudinaryImageStorage().upload(make_image_file(64, 48))
+        self.assertEqual(upload.call_args.kwargs["folder"], storage.folder)
+
+        # Свіжі файли (завантаження в процесі) не чіпаються
+        fresh = storage.upload(make_image_file(64, 48, color=(5, 5, 5)))
+        call_command("reconcile_storage", "--apply", stdout=StringIO())
+        self.assertFalse(os.path.exists(orphan_path))
+        self.assertTrue(os.path.exists(storage.path(storage.original_name(fresh))))
+        self.assertEqual(list(Image.objects.values_list("id", flat=True)), [kept.id])
+
+
+class ApiTests(LocalStorageMixin, TestCase):
+    def test_list_pages_with_cursor_and_sparse_fields(self):
+        images = create_images(5)
+        url = reverse("api_image_list")
+        first = self.client.get(url, {"limit": 2, "fields": "title,id"}).json()
+        self.assertEqual(first["results"], [{"id": images[4].id, "title": "Image 4"},
+                                            {"id": images[3].id, "title": "Image 3"}])
+        self.assertEqual(first["next_cursor"], images[3].id)
+
+        last = self.client.get(url, {"limit": 2, "fields": "id", "before": images[1].id}).json()
+        self.assertEqual(last, {"results": [{"id": images[0].id}], "next_cursor": None})
+
+        response = self.client.get(url, {"fields": "id,secret"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("secret", response.json()["error"])
+
+    def test_detail_has_rendition_urls_and_etag(self):
+        self.client.post(reverse("upload"), {"title": "Sea", "image": make_image_file(800, 500)})
+        image = Image.objects.get()
+        url = reverse("api_image_detail", args=[image.id])
+
+        response = self.client.get(url)
+        data = response.json()
+        self.assertEqual(data["url"], get_image_storage().image_url(image.image))
+        self.assertNotIn("placeholder", data)
+        self.assertEqual({r["width"] for r in data["renditions"]}, {320, 640})
+        self.assertTrue(all(self.client.get(r["url"]).status_code == 200 for r in data["renditions"]))
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+        image.title = "Sea view"
+        image.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 200)
+        self.assertEqual(self.client.get(reverse("api_image_detail", args=[image.id + 1])).status_code, 404)
+
+    def test_list_etag_changes_with_gallery_and_json_fallback(self):
+        create_images(2)
+        url = reverse("api_image_list")
+        response = self.client.get(url)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+
+        create_images(1)
+        with mock.patch("home.api.orjson", None):
+            fresh = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(fresh.status_code, 200)
+        self.assertEqual(len(fresh.json()["results"]), 3)
+
+
+class ExportTests(LocalStorageMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        for title, color in [("Sea", (10, 80, 200)), ("Sea", (200, 80, 10)), ("Forest", (20, 160, 40))]:
+            self.client.post(reverse("upload"), {"title": title, "image": make_image_file(120, 80, color=color)})
+        self.images = list(Image.objects.order_by("id"))
+
+    def originals(self):
+        storage = get_image_storage()
+        result = {}
+        for image in self.images:
+            with storage.open_original(image.image) as original:
+                result[image.id] = original.read()
+        return result
+
+    def test_export_streams_a_stored_zip_of_selected_images(self):
+        self.client.force_login(User.objects.create_superuser("admin"))
+        first, second, _ = self.images
+        response = self.client.get(reverse("export_images"), {"ids": [first.id, second.id]})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/zip")
+        self.assertIn("attachment", response["Content-Disposition"])
+
+        with zipfile.ZipFile(BytesIO(b"".join(response.streaming_content))) as archive:
+            infos = archive.infolist()
+            self.assertEqual([info.filename for info in infos], [f"sea-{first.id}.jpg", f"sea-{second.id}.jpg"])
+            self.assertTrue(all(info.compress_type == zipfile.ZIP_STORED for info in infos))
+            self.assertEqual(archive.read(infos[0]), self.originals()[first.id])
+
+    def test_export_requires_superuser(self):
+        self.client.force_login(User.objects.create_user("editor"))
+        response = self.client.get(reverse("export_images"))
+        self.assertFalse(getattr(response, "streaming", False))
+        self.assertRedirects(response, reverse("index"))
+
+    def test_command_writes_all_images_and_lists_failures(self):
+        path = os.path.join(self._media_root, "export.zip")
+        broken = self.images[2]
+        real_open = exports._open_original
+
+        def open_original(storage, image):
+            if image.id == broken.id:
+                raise OSError("storage unavailable")
+            return real_open(storage, image)
+
+        with mock.patch("home.exports._open_original", side_effect=open_original):
+            call_command("export_images", path, "--workers", "2", stdout=StringIO())
+        with zipfile.ZipFile(path) as archive:
+            self.assertEqual(len(archive.namelist()), 3)
+            self.assertIn("storage unavailable", archive.read("export-errors.txt").decode())
+            self.assertIsNone(archive.testzip())
+
+    def test_originals_are_copied_in_bounded_chunks(self):
+        originals = self.originals()
+        with mock.patch("home.exports.CHUNK_SIZE", 64):
+            chunks = list(exports.zip_stream(self.images, workers=2))
+        # Жоден шматок не містить цілого файлу: пам'ять не залежить від розміру оригіналу
+        self.assertLess(max(map(len, chunks)), 64 + 200)
+        self.assertGreater(min(map(len, originals.values())), 64 + 200)
+        with zipfile.ZipFile(BytesIO(b"".join(chunks))) as archive:
+            self.assertEqual([archive.read(name) for name in archive.namelist()], list(originals.values()))
+
+
+class StaticAssetTests(TestCase):
+    def test_gallery_assets_are_hashed_compressed_and_immutable(self):
+        response = self.client.get("/")
+        self.assertNotContains(response, "<style>")
+        url = static("home/gallery.js")
+        self.assertRegex(url, r"gallery\.[0-9a-f]{12}\.js$")
+        self.assertContains(response, f'<script src="{url}" defer></script>', html=False)
+
+        asset = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(asset.status_code, 200)
+        self.assertEqual(asset["Content-Encoding"], "gzip")
+        self.assertIn("immutable", asset["Cache-Control"])
+
+        # Хеш у назві рахується від мінімізованих байтів, які справді віддаються
+        for name in ("home/gallery.js", "home/gallery.css"):
+            url = static(name)
+            body = b"".join(self.client.get(url).streaming_content)
+            self.assertIn(f".{hashlib.md5(body).hexdigest()[:12]}.", url)
+            self.assertNotIn(b"console.log", body)
+
+    def test_minifiers(self):
+        self.assertEqual(minify_css("/* note */\na > b {\n  color: red;\n  margin: 0 auto;\n}\n"),
+                         "a>b{color:red;margin:0 auto}\n")
+        self.assertEqual(
+            minify_css('a::before {\n  content: "x: y ; } /* z */";\n  background: url(a b.png) , url( \'c: d\' );\n}\n'),
+            'a::before{content:"x: y ; } /* z */";background:url(a b.png),url( \'c: d\' )}\n',
+        )
+        self.assertEqual(minify_js("// note\nfunction f() {\n    return `x ${1}`; \n}\n\n"),
+                         "function f() {\nreturn `x ${1}`;\n}\n")
+        self.assertIsNone(minify_asset("admin/js/core.js", "x"))
+
+    def test_check_fails_on_inline_assets_over_budget(self):
+        self.assertEqual(inline_asset_size('<script src="a.js"></script><!-- <style>x</style> -->'), 0)
+        self.assertEqual(inline_asset_size("<style>\n.a{}\n</style><script type='module'>f()</script>"), 7)
+        self.assertEqual(check_inline_assets(None), [])
+
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, "page.html"), "w") as template:
+                template.write("<script>" + "console.log(1);" * 40 + "</script>")
+            with mock.patch("home.checks.project_template_dirs", return_value=[Path(directory)]):
+                errors = check_inline_assets(None)
+        self.assertEqual([error.id for error in errors], ["home.E001"])
+
+
+class DeviceTests(LocalStorageMixin, TestCase):
+    IPHONE = "Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) Mobile/15E148"
+    ANDROID = "Mozilla/5.0 (Linux; Android 14; Pixel 8) Mobile Safari/537.36"
+    LINUX = "Mozilla/5.0 (X11; Linux x86_64) Chrome/126.0"
+
+    def setUp(self):
+        super().setUp()
+        create_images(2)
+
+    def test_client_hint_takes_precedence_over_user_agent(self):
+        factory = RequestFactory()
+        self.assertEqual(device_type(factory.get("/", HTTP_USER_AGENT=self.IPHONE)), "mobile")
+        self.assertEqual(device_type(factory.get("/", HTTP_USER_AGENT=self.IPHONE, HTTP_SEC_CH_UA_MOBILE="?0")),
+                         "desktop")
+        self.assertEqual(device_type(factory.get("/", HTTP_USER_AGENT=self.LINUX, HTTP_SEC_CH_UA_MOBILE="?1")),
+                         "mobile")
+        self.assertEqual(device_type(factory.get("/")), "desktop")
+
+        is_mobile_user_agent.cache_clear()
+        for _ in range(3):
+            device_type(factory.get("/", HTTP_USER_AGENT=self.ANDROID))
+        self.assertEqual(is_mobile_user_agent.cache_info().hits, 2)
+
+    def test_device_pages_vary_and_share_cached_variant(self):
+        desktop = self.client.get(reverse("index"), HTTP_USER_AGENT=self.LINUX)
+        self.assertContains(desktop, 'id="imageModal"')
+        self.assertTrue({"Sec-CH-UA-Mobile", "User-Agent"} <= set(desktop["Vary"].split(", ")))
+
+        mobile = self.client.get(reverse("index"), HTTP_USER_AGENT=self.IPHONE)
+        self.assertNotContains(mobile, 'id="imageModal"')
+        # Інший мобільний User-Agent отримує ту саму закешовану сторінку: лише агрегат для ETag
+        with self.assertNumQueries(1):
+            other = self.client.get(reverse("index"), HTTP_USER_AGENT=self.ANDROID)
+        self.assertEqual(other.content, mobile.content)
+        self.assertIn("User-Agent", other["Vary"])
+
+        self.assertNotIn("User-Agent", self.client.get(reverse("login_page")).get("Vary", ""))
+
+
+class SessionProfileTests(LocalStorageMixin, TestCase):
+    def index_queries(self, client):
+        client.get(reverse("index"))
+        with CaptureQueriesContext(connection) as queries:
+            client.get(reverse("index"))
+        return [query["sql"] for query in queries]
+
+    def test_anonymous_visitors_get_no_session_and_messages_use_a_cookie(self):
+        create_images(1)
+        response = self.client.get(reverse("index"))
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+
+        self.client.force_login(User.objects.create_user("editor"))
+        response = self.client.get(reverse("logout_page"))
+        self.assertIn("messages", response.cookies)
+        self.assertFalse(Session.objects.exists())
+
+        # Повідомлення читається з cookie: лише вибірка карток, без таблиць сесій і користувачів
+        with self.assertNumQueries(1):
+            page = self.client.get(reverse("index"))
+        self.assertContains(page, "Logged Out Successfully!")
+
+    def test_cached_sessions_save_a_query_per_authenticated_hit(self):
+        create_images(1)
+        user = User.objects.create_user("editor")
+        counts = {}
+        for engine in ("django.contrib.sessions.backends.db", "django.contrib.sessions.backends.cached_db"):
+            with self.settings(SESSION_ENGINE=engine):
+                client = Client()
+                client.force_login(user)
+                queries = self.index_queries(client)
+                counts[engine.rsplit(".", 1)[-1]] = len(queries)
+                if engine.endswith("cached_db"):
+                    self.assertFalse(any("django_session" in sql for sql in queries))
+        self.assertEqual(counts["cached_db"], counts["db"] - 1)
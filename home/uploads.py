@@ -0,0 +1,424 @@
+"""
+Фонова обробка завантажень.
+
+Запит на завантаження лише зберігає файл у локальний спул-каталог і створює
+UploadJob, тож відповідь повертається одразу. Пул воркерів
+(manage.py run_upload_worker) забирає задачі з таблиці, завантажує файли у
+сховище, рахує метадані та рендишени і переводить Image у статус ready.
+Невдалі спроби повторюються з експоненційною затримкою.
+
+Масове завантаження (кілька файлів або zip-архів) створює всі записи одним
+bulk_create, а в режимі без воркера передає файли у сховище паралельно
+в обмеженому пулі потоків.
+
+Під час запису у спул рахується sha256 вмісту: файл, який уже є в галереї,
+у сховище не передається (див. home/duplicates.py).
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import DatabaseError, IntegrityError, close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .cache import bump_gallery_version
+from .duplicates import find_exact_duplicates, find_near_duplicate
+from .images import build_renditions, extract_metadata
+from .models import Image, UploadJob
+from .storage import get_image_storage, iter_chunks
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".avif", ".bmp", ".tif", ".tiff"}
+
+
+class BulkUploadError(Exception):
+    pass
+
+
+def spool_upload(uploaded_file, name=None):
+    """
+    Зберігає файл у спул-каталог частинами, не читаючи його в пам'ять цілком,
+    і заодно рахує sha256 вмісту. Повертає (шлях, sha256).
+    """
+    os.makedirs(settings.UPLOAD_SPOOL_DIR, exist_ok=True)
+    extension = os.path.splitext(name or uploaded_file.name)[1].lower()
+    path = os.path.join(settings.UPLOAD_SPOOL_DIR, uuid.uuid4().hex + extension)
+    digest = hashlib.sha256()
+    chunks = uploaded_file.chunks() if hasattr(uploaded_file, "chunks") else iter_chunks(uploaded_file)
+    with open(path, "wb") as destination:
+        for chunk in chunks:
+            digest.update(chunk)
+            destination.write(chunk)
+    return path, digest.hexdigest()
+
+
+def store_upload(content):
+    """
+    Завантажує файл у сховище та обчислює все, що потрібно для Image.
+    Повертає словник значень полів моделі.
+    """
+    storage = get_image_storage()
+    metadata = extract_metadata(content)
+    resource = storage.upload(content)
+    renditions = build_renditions(resource, content, storage)
+    return {"image": resource, "renditions": renditions, **metadata}
+
+
+def enqueue_upload(title, uploaded_file, owner=None):
+    """Створює Image у статусі pending та задачу для воркера."""
+    spool_path, sha256 = spool_upload(uploaded_file)
+    return enqueue_spooled(title, spool_path, uploaded_file.name, owner, sha256)
+
+
+def enqueue_spooled(title, spool_path, filename, owner=None, sha256=None):
+    """
+    Те саме для файлу, що вже лежить у спул-каталозі. Окремо від enqueue_upload,
+    щоб async view могли записувати файл на диск поза потоком роботи з базою.
+
+    Якщо файл з таким sha256 уже є в галереї (готовий чи ще в обробці), новий
+    запис не створюється: повертається наявне зображення з deduplicated=True.
+    """
+    existing = find_exact_duplicates([sha256]) if sha256 else {}
+    if sha256 in existing:
+        return _reuse_existing(existing[sha256], spool_path)
+    try:
+        with transaction.atomic():
+            image = Image.objects.create(title=title, owner=owner, status=Image.Status.PENDING, sha256=sha256)
+            job = UploadJob.objects.create(image=image, spool_path=spool_path, filename=filename)
+    except IntegrityError:
+        # Той самий файл щойно завантажили паралельним запитом
+        existing = find_exact_duplicates([sha256]) if sha256 else {}
+        if sha256 not in existing:
+            raise
+        return _reuse_existing(existing[sha256], spool_path)
+    image.deduplicated = False
+
+    if settings.UPLOAD_QUEUE_EAGER:
+        # Без окремого воркера (розробка, тести) обробляємо одразу в запиті
+        process_job(job)
+        image.refresh_from_db()
+    return image
+
+
+def _reuse_existing(image, spool_path):
+    logger.info("Duplicate upload of image %s skipped", image.pk)
+    _remove_spool_file(spool_path)
+    image.deduplicated = True
+    return image
+
+
+def claim_next_job():
+    """
+    Атомарно забирає наступну готову до виконання задачу.
+    UPDATE ... WHERE locked_at = <прочитане значення> гарантує, що одну задачу
+    не візьмуть два воркери, навіть у різних процесах.
+    """
+    now = timezone.now()
+    stale_before = now - timedelta(seconds=settings.UPLOAD_QUEUE_LOCK_TIMEOUT)
+    candidates = (
+        UploadJob.objects
+        .filter(run_after__lte=now, attempts__lt=settings.UPLOAD_QUEUE_MAX_ATTEMPTS)
+        .filter(Q(locked_at__isnull=True) | Q(locked_at__lt=stale_before))
+        .order_by("run_after", "id")
+    )
+    for job in candidates[:10]:
+        if UploadJob.objects.filter(pk=job.pk, locked_at=job.locked_at).update(locked_at=now):
+            job.locked_at = now
+            return job
+    return None
+
+
+def retry_delay(attempts):
+    """Експоненційна затримка: BACKOFF, 2×BACKOFF, 4×BACKOFF... але не більше години."""
+    return min(settings.UPLOAD_QUEUE_BACKOFF * 2 ** (attempts - 1), 3600)
+
+
+def process_job(job):
+    """Завантажує спул-файл у сховище та завершує обробку Image. Повертає True у разі успіху."""
+    image = job.image
+    try:
+        with open(job.spool_path, "rb") as spooled:
+            fields = store_upload(File(spooled, name=job.filename))
+    except Exception as exc:
+        job.attempts += 1
+        job.last_error = f"{type(exc).__name__}: {exc}"
+        job.locked_at = None
+        job.run_after = timezone.now() + timedelta(seconds=retry_delay(job.attempts))
+        job.save(update_fields=["attempts", "last_error", "locked_at", "run_after"])
+
+        if job.attempts >= settings.UPLOAD_QUEUE_MAX_ATTEMPTS:
+            image.status = Image.Status.FAILED
+            image.save(update_fields=["status", "uploaded_at"])
+            # Задача лишається з last_error для діагностики, а спул-файл уже нікому не потрібен
+            _remove_spool_file(job.spool_path)
+            logger.error("Upload job %s failed permanently: %s", job.pk, job.last_error)
+        else:
+            logger.warning("Upload job %s failed (attempt %s), retrying: %s", job.pk, job.attempts, job.last_error)
+        return False
+
+    for field, value in fields.items():
+        setattr(image, field, value)
+    image.duplicate_of = find_near_duplicate(image.phash, before=image.pk)
+    image.status = Image.Status.READY
+    try:
+        with transaction.atomic():
+            # force_update не дасть "воскресити" зображення, видалене під час обробки
+            image.save(force_update=True)
+            job.delete()
+    except DatabaseError:
+        logger.info("Image %s was deleted while processing, discarding upload", image.pk)
+        get_image_storage().destroy(image.image.public_id)
+    _remove_spool_file(job.spool_path)
+    return True
+
+
+def iter_bulk_files(uploaded_files):
+    """
+    Розгортає список завантажених файлів: zip-архіви замінюються їхніми
+    зображеннями. Повертає пари (ім'я файлу, файлоподібний об'єкт); вміст
+    архівів читається потоково, без розпакування в пам'ять.
+    """
+    for uploaded_file in uploaded_files:
+        if os.path.splitext(uploaded_file.name)[1].lower() != ".zip":
+            yield uploaded_file.name, uploaded_file
+            continue
+
+        try:
+            archive = zipfile.ZipFile(uploaded_file)
+        except zipfile.BadZipFile:
+            raise BulkUploadError(f"{uploaded_file.name}: пошкоджений zip-архів")
+        with archive:
+            for info in archive.infolist():
+                name = os.path.basename(info.filename)
+                if (info.is_dir() or name.startswith(".") or info.filename.startswith("__MACOSX/")
+                        or os.path.splitext(name)[1].lower() not in IMAGE_EXTENSIONS):
+                    continue
+                # Захист від zip-бомб: розмір після розпакування відомий заздалегідь
+                if info.file_size > settings.BULK_UPLOAD_MAX_FILE_SIZE:
+                    raise BulkUploadError(f"{name}: файл завеликий")
+                with archive.open(info) as member:
+                    yield name, member
+
+
+def title_from_filename(name):
+    return os.path.splitext(os.path.basename(name))[0][:100]
+
+
+def _store_spooled(path, name):
+    with open(path, "rb") as spooled:
+        return store_upload(File(spooled, name=name))
+
+
+def enqueue_bulk(uploaded_files, owner=None):
+    """
+    Приймає багато файлів за один запит і повертає результат для кожного:
+    [{"name": ..., "id": ..., "status": ..., "error": ..., "duplicate": ...}, ...].
+
+    Файли спочатку зберігаються у спул-каталог (локальний диск, швидко), після
+    чого записи Image створюються одним bulk_create. Без воркера (UPLOAD_QUEUE_EAGER)
+    файли передаються у сховище паралельно, до UPLOAD_QUEUE_WORKERS одночасно,
+    тож загальний час обмежений пропускною здатністю мережі, а не затримкою
+    кожного окремого запиту. Файли, вміст яких уже є в галереї або трапився
+    раніше в цьому ж запиті, не зберігаються вдруге (duplicate=True).
+    """
+    spooled = []
+    try:
+        for name, fileobj in iter_bulk_files(uploaded_files):
+            if len(spooled) >= settings.BULK_UPLOAD_MAX_FILES:
+                raise BulkUploadError(f"Не більше {settings.BULK_UPLOAD_MAX_FILES} файлів за раз")
+            spooled.append((name, *spool_upload(fileobj, name)))
+    except BulkUploadError:
+        for _, path, _ in spooled:
+            _remove_spool_file(path)
+        raise
+
+    existing = find_exact_duplicates(sha256 for _, _, sha256 in spooled)
+    fresh, seen = [], set(existing)
+    for name, path, sha256 in spooled:
+        if sha256 in seen:
+            _remove_spool_file(path)
+        else:
+            seen.add(sha256)
+            fresh.append((name, path, sha256))
+
+    if not settings.UPLOAD_QUEUE_EAGER:
+        def create_pending(fresh):
+            images = Image.objects.bulk_create(
+                Image(title=title_from_filename(name), owner=owner, status=Image.Status.PENDING, sha256=sha256)
+                for name, _, sha256 in fresh
+            )
+            UploadJob.objects.bulk_create(
+                UploadJob(image=image, spool_path=path, filename=name)
+                for image, (name, path, _) in zip(images, fresh)
+            )
+            return images
+
+        fresh, images = _bulk_create_deduplicated(
+            fresh, existing, create_pending, sha256_of=lambda item: item[2],
+            discard=lambda item: _remove_spool_file(item[1]),
+        )
+        outcomes = [(name, image, "") for image, (name, _, _) in zip(images, fresh)]
+        return _bulk_results(spooled, outcomes, existing)
+
+    with ThreadPoolExecutor(max_workers=settings.UPLOAD_QUEUE_WORKERS, thread_name_prefix="bulk-upload") as pool:
+        futures = [pool.submit(_store_spooled, path, name) for name, path, _ in fresh]
+
+    outcomes = []
+    for (name, path, sha256), future in zip(fresh, futures):
+        _remove_spool_file(path)
+        try:
+            fields = future.result()
+        except Exception as exc:
+            logger.warning("Bulk upload of %s failed: %s", name, exc)
+            outcomes.append((name, None, str(exc)))
+            continue
+        image = Image(title=title_from_filename(name), owner=owner, status=Image.Status.READY,
+                      sha256=sha256, duplicate_of=find_near_duplicate(fields["phash"]), **fields)
+        outcomes.append((name, image, ""))
+
+    outcomes, _ = _bulk_create_deduplicated(
+        outcomes, existing, lambda outcomes: Image.objects.bulk_create(image for _, image, _ in outcomes if image),
+        sha256_of=lambda item: item[1].sha256 if item[1] else None,
+        discard=lambda item: get_image_storage().destroy(item[1].image.public_id),
+    )
+    # bulk_create не надсилає post_save, тому скидаємо кеш галереї вручну
+    bump_gallery_version()
+    return _bulk_results(spooled, outcomes, existing)
+
+
+def _bulk_create_deduplicated(items, existing, create, sha256_of, discard):
+    """
+    Викликає create(items) в транзакції. Якщо паралельний запит тим часом зберіг
+    файл з тим самим sha256 (IntegrityError на image_unique_sha256), такі елементи
+    прибираються через discard, їхні оригінали додаються в existing, і спроба
+    повторюється без них. Повертає (елементи, що лишилися, результат create).
+    """
+    while True:
+        try:
+            with transaction.atomic():
+                return items, create(items)
+        except IntegrityError:
+            raced = find_exact_duplicates(sha256 for sha256 in map(sha256_of, items) if sha256)
+            if not raced:
+                raise
+            existing.update(raced)
+            for item in items:
+                if sha256_of(item) in raced:
+                    discard(item)
+            items = [item for item in items if sha256_of(item) not in raced]
+
+
+def _bulk_results(spooled, outcomes, existing):
+    """Результати у порядку файлів запиту; дублікат отримує результат свого оригіналу."""
+    by_sha256 = {sha256: (image, "") for sha256, image in existing.items()}
+    fresh = iter(outcomes)
+    results = []
+    for name, _, sha256 in spooled:
+        duplicate = sha256 in by_sha256
+        if not duplicate:
+            _, image, error = next(fresh)
+            by_sha256[sha256] = (image, error)
+        image, error = by_sha256[sha256]
+        results.append({
+            "name": name,
+            "id": image.id if image else None,
+            "status": image.status if image else Image.Status.FAILED,
+            "error": error,
+            "duplicate": duplicate,
+        })
+    return results
+
+
+def requeue_failed_jobs():
+    """
+    Повертає в чергу задачі, що вичерпали всі спроби, і повертає їх кількість.
+    Задачі без спул-файлу повторити нема з чим — вони пропускаються. Якщо той самий
+    вміст тим часом уже завантажили, невдалий запис видаляється замість повтору:
+    інакше він порушив би унікальність sha256.
+    """
+    requeued = 0
+    jobs = UploadJob.objects.filter(attempts__gte=settings.UPLOAD_QUEUE_MAX_ATTEMPTS).select_related("image")
+    for job in jobs:
+        image = job.image
+        if not os.path.exists(job.spool_path):
+            continue
+        if image.sha256 and image.sha256 in find_exact_duplicates([image.sha256]):
+            discard_pending_upload(image)
+            continue
+        try:
+            with transaction.atomic():
+                Image.objects.filter(pk=image.pk).update(status=Image.Status.PENDING)
+                UploadJob.objects.filter(pk=job.pk).update(attempts=0, locked_at=None)
+        except IntegrityError:
+            # Дублікат з'явився між перевіркою та оновленням
+            discard_pending_upload(image)
+            continue
+        requeued += 1
+    return requeued
+
+
+def discard_pending_upload(image):
+    """Видаляє ще не оброблене зображення разом зі спул-файлом."""
+    job = UploadJob.objects.filter(image=image).first()
+    image.delete()
+    if job:
+        _remove_spool_file(job.spool_path)
+
+
+def _remove_spool_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _run_claimed_job(job):
+    close_old_connections()
+    try:
+        process_job(job)
+    except Exception:
+        logger.exception("Unexpected error in upload job %s", job.pk)
+    finally:
+        close_old_connections()
+
+
+def run_worker(workers=None, once=False, stop_event=None):
+    """
+    Цикл воркера: тримає до `workers` задач у роботі одночасно в пулі потоків.
+    Завантаження у сховище — мережевий I/O, тому потоки тут достатні.
+    З once=True завершується, коли черга спорожніла.
+    """
+    workers = workers or settings.UPLOAD_QUEUE_WORKERS
+    stop_event = stop_event or threading.Event()
+    slots = threading.BoundedSemaphore(workers)
+    in_flight = []
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="upload-worker") as pool:
+        while not stop_event.is_set():
+            slots.acquire()
+            # Поки чекали на вільний потік, могла прийти зупинка: нову задачу вже не беремо
+            if stop_event.is_set():
+                slots.release()
+                break
+            job = claim_next_job()
+            if job is None:
+                slots.release()
+                in_flight = [future for future in in_flight if not future.done()]
+                if once and not in_flight:
+                    break
+                time.sleep(settings.UPLOAD_QUEUE_POLL_INTERVAL)
+                continue
+
+            future = pool.submit(_run_claimed_job, job)
+            future.add_done_callback(lambda _: slots.release())
+            in_flight.append(future)
@@ -1,18 +1,34 @@
 from django.contrib import admin
 from django.urls import include, path
 from django.conf import settings
-from . import views
-from django.conf.urls.static import static
+from . import api, async_views, media, views
 
-urlpatterns = [
-    path("", views.index, name="index"),
-    path('delete/<int:image_id>/', views.delete_image, name='delete_image'),
-    path('download/<int:image_id>/', views.download_image, name='download_image'),
-    path("upload/", views.upload, name="upload"),
-    path("signup/", views.signup, name="signup"),
-    path("logout_page/", views.logout_page, name="logout_page"),
-    path("login/", views.login_page, name="login_page"),
-]
 
+def gallery_urlpatterns(hot_views):
+    """
+    Маршрути застосунку. hot_views — модуль з index/upload/delete_image/download_image:
+    синхронні views або асинхронні async_views (див. settings.ASYNC_VIEWS).
+    """
+    return [
+        path("", hot_views.index, name="index"),
+        path("feed/", views.gallery_feed, name="gallery_feed"),
+        path("search/", views.search, name="search"),
+        path('delete/<int:image_id>/', hot_views.delete_image, name='delete_image'),
+        path("delete/bulk/", views.bulk_delete, name="bulk_delete"),
+        path("export/", views.export_images, name="export_images"),
+        path('download/<int:image_id>/', hot_views.download_image, name='download_image'),
+        path('image/<int:image_id>/meta/', views.image_metadata, name='image_metadata'),
+        path("api/images/", api.image_list, name="api_image_list"),
+        path("api/images/<int:image_id>/", api.image_detail, name="api_image_detail"),
+        path("upload/", hot_views.upload, name="upload"),
+        path("upload/bulk/", views.bulk_upload, name="bulk_upload"),
+        path("signup/", views.signup, name="signup"),
+        path("logout_page/", views.logout_page, name="logout_page"),
+        path("login/", views.login_page, name="login_page"),
+    ]
 
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+
+urlpatterns = gallery_urlpatterns(async_views if settings.ASYNC_VIEWS else views)
+
+# Локальне сховище зображень (IMAGE_STORAGE=local) — і в розробці, і в продакшні
+urlpatterns.append(path(f"{settings.MEDIA_URL.lstrip('/')}<path:path>", media.serve_media, name="media"))
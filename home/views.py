@@ -1,25 +1,101 @@
-import cloudinary
-from django.http import FileResponse, Http404
+import logging
+import os
+
+from django.conf import settings
+from django.http import Http404, JsonResponse
 from django.shortcuts import render, redirect, HttpResponse, get_object_or_404
+from .cache import cached_response, can_cache_page, page_cache_key
+from .conditional import (cache_control_for, gallery_etag, gallery_last_modified, get_ready_image,
+                          single_image_etag, single_image_last_modified)
+from .deletion import delete_images
+from .devices import device_type
+from .downloads import file_download_response, image_etag
+from .exports import export_response
 from .models import Image
+from .pagination import keyset_page, parse_cursor
+from .search import search_images
+from .storage import get_image_storage
+from .uploads import BulkUploadError, enqueue_bulk, enqueue_upload
 from django.contrib.auth.models import User
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import condition, require_POST
+from django.utils.text import slugify
+
+logger = logging.getLogger(__name__)
 
 
 # Create your views here.
+def index_etag(request):
+    return gallery_etag(request, device_type(request))
+
+
+@cache_control_for("index")
+@condition(etag_func=index_etag, last_modified_func=gallery_last_modified)
 def index(request):
-    images = Image.objects.all().order_by("-id")
+    return index_response(request)
+
+
+def index_response(request):
+    """Тіло сторінки галереї; спільне для sync-view та async-варіанта (home.async_views)."""
+    cursor = parse_cursor(request.GET.get("before"))
+
+    def build_response():
+        images, next_cursor = keyset_page(Image.objects.ready(), cursor)
+        context = {"images": images,
+                   "next_cursor": next_cursor,}
+        return render(request, "index.html", context)
+
+    # Анонімний трафік обслуговується з кешу, поки галерея не змінилася;
+    # варіантів сторінки лише два (за типом пристрою), а не по одному на User-Agent
+    if can_cache_page(request):
+        return cached_response(page_cache_key("page", cursor, device_type(request)), build_response)
+    return build_response()
+
+
+@cache_control_for("gallery_feed")
+@condition(etag_func=gallery_etag, last_modified_func=gallery_last_modified)
+def gallery_feed(request):
+    """
+    Фрагмент галереї для нескінченної прокрутки: лише картки наступної сторінки.
+    Курсор для подальшого запиту передається в заголовку X-Next-Cursor.
+    """
+    cursor = parse_cursor(request.GET.get("before"))
+
+    def build_response():
+        images, next_cursor = keyset_page(Image.objects.ready(), cursor)
+        response = render(request, "partials/gallery_cards.html", {"images": images})
+        if next_cursor:
+            response["X-Next-Cursor"] = str(next_cursor)
+        return response
+
+    if not request.user.is_authenticated:
+        return cached_response(page_cache_key("feed", cursor, "all"), build_response)
+    return build_response()
+
+
+def search_etag(request):
+    return gallery_etag(request, "search", request.GET.get("q", ""), request.GET.get("page", ""),
+                        device_type(request))
 
-    user_agent = request.META.get('HTTP_USER_AGENT', '').lower()
-    # Достатньо проста перевірка для мобільних пристроїв
-    is_mobile = any(
-        keyword in user_agent for keyword in ['android', 'iphone', 'ipad', 'ipod', 'mobile', 'windows phone'])
-    is_desktop = not is_mobile
-    context = {"images": images,
-               'is_desktop': is_desktop,}
-    return render(request, "index.html", context)
+
+@cache_control_for("search")
+@condition(etag_func=search_etag)
+def search(request):
+    """Повнотекстовий пошук за назвою; результати рендеряться тими ж картками, що й галерея."""
+    query = request.GET.get("q", "").strip()
+    page = parse_cursor(request.GET.get("page")) or 1
+    images, has_next = search_images(query, page)
+    context = {
+        "query": query,
+        "images": images,
+        "page": page,
+        "next_page": page + 1 if has_next else None,
+        "previous_page": page - 1 if page > 1 else None,
+    }
+    return render(request, "search.html", context)
 
 
 def signup(request):
@@ -57,15 +133,21 @@ def login_page(request):
 
 def upload(request):
     if request.method == "POST":
-        print("uploading...")
         image_title = request.POST.get("title")
         image_file = request.FILES.get("image")  # Змінено ім'я змінної, щоб не конфліктувало з моделлю
 
-        # CloudinaryField АВТОМАТИЧНО обробляє завантаження,
-        # коли об'єкт моделі зберігається в базі даних.
+        # Файл лише зберігається у спул-каталог, а у сховище його відправляє
+        # фоновий воркер — запит не чекає на Cloudinary.
         if image_file:
-            Image.objects.create(title=image_title, image=image_file)
-            messages.success(request, "Uploaded Successfully to Cloudinary!")
+            logger.debug("Upload received: %s (%d bytes)", image_file.name, image_file.size)
+            owner = request.user if request.user.is_authenticated else None
+            image = enqueue_upload(image_title, image_file, owner)
+            if image.deduplicated:
+                messages.info(request, "Таке зображення вже є в галереї.")
+            elif image.status == Image.Status.READY:
+                messages.success(request, "Uploaded Successfully!")
+            else:
+                messages.info(request, "Зображення прийнято, воно з'явиться в галереї після обробки.")
             return redirect("index")
         else:
             messages.error(request, "No image file provided.")
@@ -75,6 +157,45 @@ def upload(request):
     return render(request, "upload.html")
 
 
+@login_required
+def bulk_upload(request):
+    """
+    Масове завантаження: багато файлів та/або zip-архівів в одному POST.
+    Повертає результат для кожного файлу — JSON для API-клієнтів або таблицю на сторінці.
+    """
+    if request.method != "POST":
+        return redirect("upload")
+
+    wants_json = request.accepts("application/json") and not request.accepts("text/html")
+    files = request.FILES.getlist("images")
+    if not files:
+        error = "No image files provided."
+        if wants_json:
+            return JsonResponse({"error": error}, status=400)
+        messages.error(request, error)
+        return render(request, "upload.html")
+
+    try:
+        results = enqueue_bulk(files, request.user)
+    except BulkUploadError as exc:
+        if wants_json:
+            return JsonResponse({"error": str(exc)}, status=400)
+        messages.error(request, str(exc))
+        return render(request, "upload.html")
+
+    if wants_json:
+        return JsonResponse({"results": results})
+
+    failed = sum(result["status"] == Image.Status.FAILED for result in results)
+    duplicates = sum(result["duplicate"] for result in results)
+    messages.info(
+        request,
+        f"Прийнято файлів: {len(results) - failed - duplicates}, вже були в галереї: {duplicates}, "
+        f"з помилками: {failed}.",
+    )
+    return render(request, "upload.html", {"results": results})
+
+
 def logout_page(request):
     logout(request)
     messages.success(request, "Logged Out Successfully!")
@@ -91,54 +212,129 @@ def delete_image(request, image_id):
         return redirect('index')
 
     try:
-        # 1. ОТРИМАННЯ PUBLIC ID З CLOUDINARY FIELD
-        # CloudinaryField зберігає Public ID у властивості field.public_id
-        public_id = image_instance.image.public_id
+        # Той самий шлях, що й масове видалення: рядок видаляється лише після того,
+        # як сховище підтвердило видалення файлу (див. home/deletion.py)
+        _, failures = delete_images([image_instance])
+    except Exception as e:
+        messages.error(request, f"Виникла непередбачена помилка: {e}")
+    else:
+        if failures:
+            messages.error(request, f"Не вдалося видалити файл зі сховища, зображення залишено: {failures[0][1]}")
+        else:
+            messages.success(request, "Зображення видалено.")
 
-        # 2. ВИДАЛЕННЯ З CLOUDINARY
-        # Викликаємо функцію destroy() Cloudinary
-        response = cloudinary.uploader.destroy(public_id)
+    return redirect('index')
 
-        # Перевірка, чи Cloudinary успішно видалив файл
-        if response.get('result') == 'ok' or response.get('result') == 'not found':
 
-            # 3. ВИДАЛЕННЯ З БАЗИ ДАНИХ DJANGO
-            image_instance.delete()
-            messages.success(request, "Зображення та відповідний файл у Cloudinary успішно видалено!")
-        else:
-            # Обробка помилки Cloudinary (наприклад, якщо Public ID не знайдено)
-            messages.warning(request, f"Зображення видалено з бази даних, але виникла помилка при видаленні з Cloudinary: {response.get('result')}")
-            image_instance.delete() # Якщо Cloudinary видалив, але результат не 'ok', краще видалити і з бази
+@login_required
+@require_POST
+def bulk_delete(request):
+    """
+    Видаляє вибрані зображення (поле ids) одним пакетом: файли у сховищі —
+    пакетними викликами, рядки — лише для файлів, видалення яких підтверджено.
+    """
+    wants_json = request.accepts("application/json") and not request.accepts("text/html")
+    if not request.user.is_superuser:
+        if wants_json:
+            return JsonResponse({"error": "forbidden"}, status=403)
+        messages.error(request, "У вас немає дозволу на видалення зображень.")
+        return redirect("index")
 
-    except Exception as e:
-        messages.error(request, f"Виникла непередбачена помилка: {e}")
+    ids = [int(value) for value in request.POST.getlist("ids") if value.isdigit()]
+    deleted, failures = delete_images(Image.objects.filter(id__in=ids))
 
-    return redirect('index')
+    if wants_json:
+        return JsonResponse({
+            "deleted": deleted,
+            "failed": [{"id": image.id, "error": error} for image, error in failures],
+        })
+    if deleted:
+        messages.success(request, f"Видалено зображень: {deleted}.")
+    if failures:
+        messages.warning(request, f"Не вдалося видалити зі сховища: {len(failures)}, зображення залишено.")
+    if not deleted and not failures:
+        messages.info(request, "Не вибрано жодного зображення.")
+    return redirect("index")
 
 
-def download_image(request, image_id):
-    # 1. Отримуємо об'єкт зображення
-    image_obj = get_object_or_404(Image, id=image_id)
+@login_required
+def export_images(request):
+    """
+    ZIP-архів оригіналів: вибрані (?ids=1&ids=2) або всі готові зображення.
+    Архів передається потоком під час створення.
+    """
+    if not request.user.is_superuser:
+        messages.error(request, "У вас немає дозволу на експорт зображень.")
+        return redirect("index")
+    queryset = Image.objects.ready()
+    ids = [int(value) for value in request.GET.getlist("ids") if value.isdigit()]
+    if ids:
+        queryset = queryset.filter(id__in=ids)
+    return export_response(request, queryset)
+
+
+@cache_control_for("image_metadata")
+@condition(etag_func=single_image_etag, last_modified_func=single_image_last_modified)
+def image_metadata(request, image_id):
+    """Метадані зображення у JSON; повторний запит незміненого зображення отримує 304."""
+    image_obj = get_ready_image(request, image_id)
+    if image_obj is None:
+        raise Http404("Зображення не знайдено.")
+
+    return JsonResponse({
+        "id": image_obj.id,
+        "title": image_obj.title,
+        "url": get_image_storage().image_url(image_obj.image),
+        "width": image_obj.width,
+        "height": image_obj.height,
+        "bytes": image_obj.bytes,
+        "format": image_obj.format,
+        "dominant_color": image_obj.dominant_color,
+        "created_at": image_obj.created_at,
+        "uploaded_at": image_obj.uploaded_at,
+    })
 
-    # 2. Отримуємо шлях до файлу
-    file_path = image_obj.image.path
 
-    # 3. Визначаємо ім'я файлу, яке має бути на клієнті
+def download_filename(request, image_obj):
     # Використовуємо ім'я з параметрів, якщо воно є (для зручності)
-    client_filename = request.GET.get('filename')
+    client_filename = os.path.basename(request.GET.get('filename') or '')
     if not client_filename:
-        # Якщо ім'я не передано, використовуємо назву зображення
-        client_filename = f"{image_obj.title}.jpg"
+        # Якщо ім'я не передано, використовуємо назву зображення та справжнє розширення
+        client_filename = f"{slugify(image_obj.title) or 'image'}.{image_obj.image.format or 'jpg'}"
+    return client_filename
 
-    # 4. Створюємо відповідь FileResponse
+
+@cache_control_for("download_image")
+def download_image(request, image_id):
+    # 1. Отримуємо об'єкт зображення
+    image_obj = get_object_or_404(Image.objects.ready(), id=image_id)
+    storage = get_image_storage()
+
+    # 2. Визначаємо ім'я файлу, яке має бути на клієнті
+    client_filename = download_filename(request, image_obj)
+
+    # 3. CDN віддає файл сам (з Range, ETag та кешуванням) — перенаправляємо на підписаний URL
+    if settings.IMAGE_DOWNLOAD_MODE == "redirect":
+        cdn_url = storage.download_url(image_obj.image, client_filename)
+        if cdn_url:
+            return redirect(cdn_url)
+
+    # 4. Повторне завантаження незміненого файлу: 304 без читання файлу
+    etag = image_etag(image_obj)
+    conditional = get_conditional_response(request, etag=etag, last_modified=int(image_obj.uploaded_at.timestamp()))
+    if conditional is not None:
+        return conditional
+
+    # 5. Потокова віддача з підтримкою Range: пам'ять не залежить від розміру файлу
     try:
-        response = FileResponse(open(file_path, 'rb'))
+        size = image_obj.bytes or storage.original_size(image_obj.image)
+        return file_download_response(
+            request,
+            lambda offset: storage.open_original(image_obj.image, offset),
+            size=size,
+            filename=client_filename,
+            etag=etag,
+            last_modified=image_obj.uploaded_at,
+        )
     except FileNotFoundError:
         raise Http404("Файл не знайдено.")
-
-    # 5. ВСТАНОВЛЕННЯ ЗАГОЛОВКА, ЩО ПРИМУСОВО ВИКЛИКАЄ ВІКНО ЗБЕРЕЖЕННЯ
-    # Це КЛЮЧОВИЙ момент для коректної роботи на ПК та Android
-    response['Content-Type'] = 'application/octet-stream'  # Загальний тип для завантаження
-    response['Content-Disposition'] = f'attachment; filename="{client_filename}"'
-
-    return response
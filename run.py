@@ -1,48 +1,222 @@
+"""
+Запуск Django-галереї через Gunicorn.
+
+Параметри беруться (у порядку зростання пріоритету) зі значень за замовчуванням,
+TOML-файлу (--config або RUN_CONFIG), змінних оточення GUNICORN_<НАЗВА>
+(а також стандартних WEB_CONCURRENCY та PORT) і прапорців командного рядка:
+
+    python run.py --workers 8 --max-requests 2000
+    GUNICORN_KEEPALIVE=10 python run.py --asgi
+    python run.py --config server.toml --profile   # лише показати ефективні налаштування
+
+Приклад server.toml:
+
+    bind = "0.0.0.0:8000"
+    workers = 6
+    max_requests = 2000
+    preload = true
+
+Плавний перезапуск воркерів (нові воркери піднімаються до зупинки старих):
+kill -HUP <pid run.py> — сигнал передається майстру Gunicorn.
+"""
+import argparse
+import glob
+import os
+import signal
 import subprocess
 import sys
-import os
+import tomllib
+
+# Назва: (тип, значення за замовчуванням, опис). None — обчислюється з інших параметрів.
+OPTIONS = {
+    "bind": (str, "0.0.0.0:8000", "Адреса прослуховування."),
+    "workers": (int, None, "Кількість процесів (за замовчуванням — за кількістю доступних CPU)."),
+    "worker_connections": (int, 1000, "Максимум одночасних з'єднань на воркер gevent."),
+    "timeout": (int, 60, "Секунд без відповіді, після яких воркер перезапускається."),
+    "graceful_timeout": (int, 30, "Секунд на завершення поточних запитів при перезапуску."),
+    "keepalive": (int, 5, "Секунд тримати keep-alive з'єднання (за nginx чи балансувальником)."),
+    "max_requests": (int, 1000, "Перезапускати воркер після стількох запитів (0 — ніколи)."),
+    "max_requests_jitter": (int, None, "Випадкова добавка до max_requests (за замовчуванням 10%)."),
+    "preload": (bool, False, "Завантажити застосунок у майстрі до fork (спільна пам'ять copy-on-write)."),
+    "asgi": (bool, False, "ASGI-режим: UvicornWorker та асинхронні view замість WSGI з gevent."),
+}
+
+# Сигнали, які майстер Gunicorn обробляє сам: HUP — плавний перезапуск воркерів,
+# TTIN/TTOU — додати/прибрати воркер, USR2 — заміна бінарника без простою
+FORWARDED_SIGNALS = (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGTTIN, signal.SIGTTOU, signal.SIGUSR2)
+
 
-def run_gunicorn():
+def available_cpus():
+    """Кількість CPU, доступних процесу (з урахуванням taskset/cgroup affinity)."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("1", "true", "yes", "on")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Запуск Django-галереї через Gunicorn.")
+    parser.add_argument("--config", default=os.getenv("RUN_CONFIG"), help="TOML-файл з налаштуваннями.")
+    parser.add_argument("--profile", action="store_true", help="Показати ефективні налаштування та вийти.")
+    for name, (kind, _, help_text) in OPTIONS.items():
+        flag = "--" + name.replace("_", "-")
+        if kind is bool:
+            parser.add_argument(flag, action=argparse.BooleanOptionalAction, default=None, help=help_text)
+        else:
+            parser.add_argument(flag, type=kind, default=None, help=help_text)
+    return parser.parse_args(argv)
+
+
+def resolve_config(args, environ=os.environ):
     """
-    Запускає Gunicorn із визначеними аргументами.
-    Використовує gevent як клас воркера для кращої асинхронної обробки.
+    Повертає (налаштування, джерела): для кожного параметра — значення
+    і звідки воно взялося (default, файл, змінна оточення, cli, auto).
     """
-    # Перевіряємо, чи встановлений gevent, оскільки він зазначений у параметрі --worker-class
+    config = {name: default for name, (_, default, _) in OPTIONS.items()}
+    sources = dict.fromkeys(OPTIONS, "default")
+
+    def apply(name, value, source):
+        kind = OPTIONS[name][0]
+        config[name] = parse_bool(value) if kind is bool else kind(value)
+        sources[name] = source
+
+    if args.config:
+        with open(args.config, "rb") as config_file:
+            for name, value in tomllib.load(config_file).items():
+                if name not in OPTIONS:
+                    raise SystemExit(f"Помилка: невідомий параметр '{name}' у {args.config}")
+                apply(name, value, args.config)
+
+    if "PORT" in environ:
+        apply("bind", f"0.0.0.0:{environ['PORT']}", "env PORT")
+    if "WEB_CONCURRENCY" in environ:
+        apply("workers", environ["WEB_CONCURRENCY"], "env WEB_CONCURRENCY")
+    for name in OPTIONS:
+        variable = f"GUNICORN_{name.upper()}"
+        if variable in environ:
+            apply(name, environ[variable], f"env {variable}")
+
+    for name in OPTIONS:
+        value = getattr(args, name)
+        if value is not None:
+            apply(name, value, "cli")
+
+    if config["workers"] is None:
+        # gevent та uvicorn обслуговують багато з'єднань в одному процесі, тож
+        # достатньо процесу на ядро; більше — лише зайва пам'ять і з'єднання з базою
+        config["workers"] = available_cpus()
+        sources["workers"] = "auto"
+    if config["max_requests_jitter"] is None:
+        # Розкид не дає всім воркерам перезапуститися одночасно
+        config["max_requests_jitter"] = config["max_requests"] // 10
+        sources["max_requests_jitter"] = "auto"
+    return config, sources
+
+
+def require(module, package):
+    """Завершує роботу з підказкою, якщо потрібний клас воркера не встановлений."""
     try:
-        import gevent
+        __import__(module)
     except ImportError:
-        print("Помилка: Необхідна бібліотека 'gevent' не встановлена.", file=sys.stderr)
-        print("Будь ласка, виконайте: pip install gevent", file=sys.stderr)
+        print(f"Помилка: Необхідна бібліотека '{package}' не встановлена.", file=sys.stderr)
+        print(f"Будь ласка, виконайте: pip install {package}", file=sys.stderr)
         sys.exit(1)
 
-    # Команда Gunicorn, розбита на список аргументів
+
+def build_command(config):
+    """
+    Команда Gunicorn для обраного режиму:
+    WSGI — воркери gevent; ASGI — UvicornWorker з асинхронними view (home.async_views).
+    """
+    if config["asgi"]:
+        application, worker_class = "django_images.asgi:application", "uvicorn_worker.UvicornWorker"
+    else:
+        application, worker_class = "django_images.wsgi:application", "gevent"
+
     command = [
         'gunicorn',
-        'django_images.wsgi:application',
-        '--bind', '0.0.0.0:8000',
-        '--workers', '4',
-        '--timeout', '60',
-        '--worker-class', 'gevent'
+        application,
+        '--bind', config["bind"],
+        '--workers', str(config["workers"]),
+        '--worker-class', worker_class,
+        '--timeout', str(config["timeout"]),
+        '--graceful-timeout', str(config["graceful_timeout"]),
+        '--keep-alive', str(config["keepalive"]),
+        '--max-requests', str(config["max_requests"]),
+        '--max-requests-jitter', str(config["max_requests_jitter"]),
     ]
+    if not config["asgi"]:
+        # UvicornWorker цей параметр ігнорує
+        command += ['--worker-connections', str(config["worker_connections"])]
+    if config["preload"]:
+        command.append('--preload')
+    return command
+
+
+def print_profile(config, sources, command):
+    width = max(map(len, OPTIONS))
+    for name in OPTIONS:
+        print(f"{name:<{width}}  {config[name]!s:<22} ({sources[name]})")
+    print(f"{'cpus':<{width}}  {available_cpus()}")
+    print()
+    print(" ".join(command))
+
+
+def run_gunicorn(config):
+    """
+    Запускає Gunicorn як дочірній процес і передає йому сигнали керування,
+    тож kill -HUP для run.py плавно перезапускає воркери.
+    """
+    if config["asgi"]:
+        # Під ASGI повільні клієнти та виклики Cloudinary лише очікують у циклі подій
+        require("uvicorn_worker", "uvicorn-worker")
+    else:
+        # Перевіряємо, чи встановлений gevent, оскільки він зазначений у параметрі --worker-class
+        require("gevent", "gevent")
+
+    command = build_command(config)
+    env = os.environ.copy()
+    if not config["asgi"]:
+        # Воркер gevent обробляє кожен запит в окремому greenlet, тож постійні
+        # з'єднання з базою не перевикористовуються і лише накопичуються
+        env.setdefault("DB_CONN_MAX_AGE", "0")
+
+    # Метрики попереднього запуску не мають змішуватися з новими (django_images/metrics.py)
+    metrics_dir = os.getenv("METRICS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "metrics"))
+    for path in glob.glob(os.path.join(metrics_dir, "*.json")):
+        os.remove(path)
 
     print(f"Запуск Gunicorn з командою: {' '.join(command)}")
-    print("Натисніть Ctrl+C для зупинки.")
+    print("Натисніть Ctrl+C для зупинки, kill -HUP для плавного перезапуску воркерів.")
 
     try:
-        # Запускаємо команду. check=True змусить Python згенерувати виняток,
-        # якщо Gunicorn завершиться з помилкою.
-        subprocess.run(command, check=True)
-
-    except subprocess.CalledProcessError as e:
-        print(f"Помилка: Gunicorn завершився з кодом помилки {e.returncode}", file=sys.stderr)
-        sys.exit(e.returncode)
-    except KeyboardInterrupt:
-        # Обробка Ctrl+C для коректного виходу
-        print("\nСервер зупинено...")
-        sys.exit(0)
+        process = subprocess.Popen(command, env=env)
     except FileNotFoundError:
         print("Помилка: Команда 'gunicorn' не знайдена. Переконайтеся, що ви активували ваше віртуальне середовище (.venv) і Gunicorn встановлений.", file=sys.stderr)
         sys.exit(1)
 
+    def forward(signum, frame):
+        process.send_signal(signum)
+
+    for signum in FORWARDED_SIGNALS:
+        signal.signal(signum, forward)
+
+    returncode = process.wait()
+    if returncode not in (0, -signal.SIGINT, -signal.SIGTERM):
+        print(f"Помилка: Gunicorn завершився з кодом помилки {returncode}", file=sys.stderr)
+        sys.exit(returncode)
+    print("\nСервер зупинено...")
+
+
 if __name__ == "__main__":
-    run_gunicorn()
+    args = parse_args()
+    config, sources = resolve_config(args)
+    if args.profile:
+        print_profile(config, sources, build_command(config))
+    else:
+        run_gunicorn(config)
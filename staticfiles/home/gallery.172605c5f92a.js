@@ -0,0 +1,96 @@
+let currentZoom = 1.0;
+const MAX_ZOOM = 3.0;
+const MIN_ZOOM = 1.0;
+function changeZoom(delta) {
+const modalImage = document.getElementById('modalImage');
+const modalContent = document.getElementById('modalContent');
+if (!modalImage || !modalContent) return;
+let newZoom = currentZoom + delta;
+if (newZoom < MIN_ZOOM) {
+newZoom = MIN_ZOOM;
+} else if (newZoom > MAX_ZOOM) {
+newZoom = MAX_ZOOM;
+}
+modalImage.style.transform = `scale(${newZoom})`;
+currentZoom = newZoom;
+if (currentZoom > 1.0) {
+const scaledWidth = modalImage.offsetWidth * newZoom;
+const scrollHorizontal = (scaledWidth - modalContent.clientWidth) / 2;
+modalContent.scrollLeft = scrollHorizontal > 0 ? scrollHorizontal : 0;
+modalContent.scrollTop = 0;
+} else {
+modalContent.scrollLeft = 0;
+modalContent.scrollTop = 0;
+}
+}
+function openModal(imageUrl, imageTitle) {
+const modal = document.getElementById('imageModal');
+const modalImage = document.getElementById('modalImage');
+const overlay = document.getElementById('modalOverlay');
+if (!modal) return;
+currentZoom = 1.0;
+modalImage.style.transform = `scale(${currentZoom})`;
+const modalContent = document.getElementById('modalContent');
+modalContent.scrollLeft = 0;
+modalContent.scrollTop = 0;
+modalImage.src = imageUrl;
+modalImage.alt = imageTitle;
+modal.style.display = 'block';
+modal.classList.add('show');
+document.body.style.overflow = 'hidden';
+overlay.onclick = function() {
+closeModal();
+};
+}
+function closeModal() {
+const modal = document.getElementById('imageModal');
+const modalImage = document.getElementById('modalImage');
+modal.style.display = 'none';
+modal.classList.remove('show');
+modalImage.style.transform = 'scale(1)';
+currentZoom = 1.0;
+const modalContent = document.getElementById('modalContent');
+modalContent.scrollLeft = 0;
+modalContent.scrollTop = 0;
+document.body.style.overflow = '';
+}
+document.addEventListener('keydown', function(event) {
+if (event.key === 'Escape') {
+const modal = document.getElementById('imageModal');
+if (modal && modal.style.display === 'block') {
+closeModal();
+}
+}
+});
+(function () {
+const nextLink = document.getElementById('nextPage');
+const gallery = document.getElementById('gallery');
+if (!nextLink || !gallery || !('IntersectionObserver' in window)) return;
+let loading = false;
+const observer = new IntersectionObserver(function (entries) {
+if (!entries[0].isIntersecting || loading) return;
+loading = true;
+fetch(nextLink.dataset.feedUrl + '?before=' + nextLink.dataset.cursor)
+.then(function (response) {
+if (!response.ok) throw new Error(response.status);
+const cursor = response.headers.get('X-Next-Cursor');
+return response.text().then(function (html) {
+gallery.insertAdjacentHTML('beforeend', html);
+if (cursor) {
+nextLink.dataset.cursor = cursor;
+nextLink.href = '?before=' + cursor;
+} else {
+observer.disconnect();
+nextLink.remove();
+}
+});
+})
+.catch(function () {
+observer.disconnect();
+})
+.finally(function () {
+loading = false;
+});
+}, {rootMargin: '600px'});
+observer.observe(nextLink);
+})();